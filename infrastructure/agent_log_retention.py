@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Retention for the workflow log database.
+
+Moves old runs out of the hot `agent_logs.db` tables into compressed archive
+files (still readable through AgentWorkflowLogger) and reclaims the freed
+space, so hot-table queries stay fast however long the history gets.
+"""
+
+import sys
+import json
+import argparse
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+
+from agent_workflow_logger import AgentWorkflowLogger
+
+
+class RetentionPolicy:
+    """Which runs to archive: older than max_age_days, optionally by status/project/workflow."""
+    
+    def __init__(
+        self,
+        max_age_days: float,
+        statuses: Optional[List[str]] = None,
+        project_name: Optional[str] = None,
+        workflow_name: Optional[str] = None
+    ):
+        if max_age_days < 0:
+            raise ValueError(f"max_age_days must be >= 0: {max_age_days}")
+        self.max_age_days = max_age_days
+        self.statuses = statuses
+        self.project_name = project_name
+        self.workflow_name = workflow_name
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RetentionPolicy":
+        """Build a policy from a JSON policy-file entry."""
+        return cls(
+            max_age_days=float(data["max_age_days"]),
+            statuses=data.get("statuses"),
+            project_name=data.get("project"),
+            workflow_name=data.get("workflow")
+        )
+    
+    def cutoff(self, now: Optional[datetime] = None) -> str:
+        """ISO timestamp before which runs are archived (UTC, like the logger)."""
+        now = now or datetime.utcnow()
+        return (now - timedelta(days=self.max_age_days)).isoformat()
+    
+    def describe(self) -> str:
+        parts = [f"older than {self.max_age_days:g}d"]
+        if self.statuses:
+            parts.append(f"status in {self.statuses}")
+        if self.project_name:
+            parts.append(f"project={self.project_name}")
+        if self.workflow_name:
+            parts.append(f"workflow={self.workflow_name}")
+        return ", ".join(parts)
+
+
+def apply_retention(
+    logger: AgentWorkflowLogger,
+    policies: List[RetentionPolicy],
+    archive_dir: str,
+    batch_size: int = 1000,
+    dry_run: bool = False,
+    vacuum: bool = True
+) -> Dict[str, Any]:
+    """
+    Archive every run matched by any policy, then vacuum.
+
+    Runs are archived in batches of batch_size (one archive file per batch)
+    so each transaction stays short.
+
+    Returns:
+        Summary with per-policy counts and the archive files written
+    """
+    summary = {"policies": [], "archived_runs": 0, "archive_files": []}
+    
+    for policy in policies:
+        criteria = dict(
+            started_before=policy.cutoff(),
+            statuses=policy.statuses,
+            project_name=policy.project_name,
+            workflow_name=policy.workflow_name
+        )
+        archived = 0
+        if dry_run:
+            # LIMIT -1: no limit in SQLite
+            archived = len(logger.find_runs(**criteria, limit=-1))
+        
+        while not dry_run:
+            run_ids = logger.find_runs(**criteria, limit=batch_size)
+            if not run_ids:
+                break
+            archive_path = logger.archive_runs(run_ids, archive_dir)
+            if archive_path is None:
+                break
+            summary["archive_files"].append(archive_path)
+            archived += len(run_ids)
+        
+        summary["policies"].append({"policy": policy.describe(), "runs": archived})
+        summary["archived_runs"] += archived
+    
+    if vacuum and not dry_run and summary["archived_runs"]:
+        logger.vacuum()
+    
+    return summary
+
+
+def main():
+    """CLI for log retention."""
+    parser = argparse.ArgumentParser(description="Archive old workflow runs out of agent_logs.db")
+    parser.add_argument("--db", default="/Users/cstein/code/activation_function_agent/agent_logs.db",
+                        help="Workflow log database")
+    parser.add_argument("--archive-dir", required=True, help="Directory for archive files")
+    parser.add_argument("--max-age-days", type=float, help="Archive runs started more than N days ago")
+    parser.add_argument("--status", action="append", help="Only archive runs with this status (repeatable)")
+    parser.add_argument("--project", help="Only archive runs of this project")
+    parser.add_argument("--workflow", help="Only archive runs of this workflow")
+    parser.add_argument("--policy-file", help="JSON list of policies "
+                        '([{"max_age_days": 30, "statuses": ["failed"], "project": "..."}])')
+    parser.add_argument("--batch-size", type=int, default=1000, help="Runs per archive file")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be archived")
+    parser.add_argument("--no-vacuum", action="store_true", help="Skip vacuuming after archiving")
+    
+    args = parser.parse_args()
+    
+    policies = []
+    if args.policy_file:
+        policies.extend(RetentionPolicy.from_dict(p) for p in json.loads(Path(args.policy_file).read_text()))
+    if args.max_age_days is not None:
+        policies.append(RetentionPolicy(
+            args.max_age_days,
+            statuses=args.status,
+            project_name=args.project,
+            workflow_name=args.workflow
+        ))
+    if not policies:
+        parser.error("Give --max-age-days or --policy-file")
+    
+    print(f"🗄️  Applying {len(policies)} retention policies to {args.db}...", file=sys.stderr)
+    
+    logger = AgentWorkflowLogger(db_path=args.db)
+    summary = apply_retention(
+        logger,
+        policies,
+        args.archive_dir,
+        batch_size=args.batch_size,
+        dry_run=args.dry_run,
+        vacuum=not args.no_vacuum
+    )
+    logger.close()
+    
+    for entry in summary["policies"]:
+        print(f"   {entry['policy']}: {entry['runs']} runs", file=sys.stderr)
+    verb = "Would archive" if args.dry_run else "Archived"
+    print(f"✅ {verb} {summary['archived_runs']} runs into {len(summary['archive_files'])} files",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+"""
+Client for the agent status server (agent_status_server.py).
+
+Writes (register / update_status / heartbeat / complete) never block on the
+network: they are buffered and sent together through `POST /agents/bulk`
+every `flush_interval` seconds over a keep-alive connection. Rapid
+`update_status` calls for the same agent are coalesced while buffered
+(later fields win), so an agent reporting progress hundreds of times a
+second costs one small operation per flush. Registered agents get
+heartbeats automatically while they have nothing else to report. Batches
+that fail in transport or with a 5xx are kept and retried; a batch the
+server rejects with a 4xx, or answers with a body that can't be read, is
+dropped and counted in stats()["rejected"].
+
+`AgentStatusClient` flushes from a background thread; `AsyncAgentStatusClient`
+does the same from an asyncio task. Both are context managers.
+"""
+
+import sys
+import json
+import time
+import asyncio
+import argparse
+import threading
+from typing import Optional, Dict, Any, List
+
+import httpx
+
+
+DEFAULT_URL = "http://127.0.0.1:8082"
+
+
+class _StatusBuffer:
+    """
+    Pending operations plus heartbeat bookkeeping, shared by both clients.
+
+    Thread-safe; every public write method only takes a lock and touches
+    a few dicts.
+    """
+
+    def __init__(self, flush_interval: float, heartbeat_interval: Optional[float],
+                 batch_size: int, max_pending: int):
+        self.flush_interval = flush_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._pending: List[Dict[str, Any]] = []
+        self._open_update: Dict[str, Dict[str, Any]] = {}  # agent_id -> coalescible op
+        self._last_sent: Dict[str, float] = {}  # agents we heartbeat -> last activity
+        self._stats = {
+            "operations": 0,
+            "coalesced": 0,
+            "sent": 0,
+            "requests": 0,
+            "failed": 0,
+            "rejected": 0,
+            "dropped": 0,
+            "errors": 0
+        }
+    
+    # ------------------------------------------------------------------
+    # Writes (buffered)
+    # ------------------------------------------------------------------
+    
+    def register(self, agent_id: str, agent_type: str = "cursor-agent",
+                 workflow: str = "unknown", project: str = "unknown",
+                 metadata: Optional[Dict] = None, heartbeat: bool = True) -> None:
+        """Register an agent; with heartbeat, keep it alive until completed."""
+        self._add({
+            "op": "register",
+            "agent_id": agent_id,
+            "agent_type": agent_type,
+            "workflow": workflow,
+            "project": project,
+            "metadata": metadata
+        })
+        if heartbeat and self.heartbeat_interval:
+            with self._lock:
+                self._last_sent[agent_id] = time.monotonic()
+    
+    def update_status(self, agent_id: str, status: str = "running",
+                      current_task: Optional[str] = None,
+                      progress: Optional[Dict] = None) -> None:
+        """Report status/progress; merged into any still-unsent update."""
+        fields = {"status": status}
+        if current_task is not None:
+            fields["current_task"] = current_task
+        if progress is not None:
+            fields["progress"] = progress
+        
+        with self._lock:
+            self._stats["operations"] += 1
+            if agent_id in self._last_sent:
+                self._last_sent[agent_id] = time.monotonic()
+            op = self._open_update.get(agent_id)
+            if op is not None:
+                op.update(fields)
+                self._stats["coalesced"] += 1
+                return
+            op = {"op": "update", "agent_id": agent_id, **fields}
+            self._open_update[agent_id] = op
+            self._append(op)
+    
+    def heartbeat(self, agent_id: str) -> None:
+        """Queue a heartbeat (not needed for agents registered with heartbeat=True)."""
+        self._add({"op": "heartbeat", "agent_id": agent_id})
+    
+    def complete(self, agent_id: str, status: str = "completed",
+                 result_summary: Optional[str] = None,
+                 error: Optional[str] = None) -> None:
+        """Mark an agent finished and stop its heartbeats."""
+        self._add({
+            "op": "complete",
+            "agent_id": agent_id,
+            "status": status,
+            "result_summary": result_summary,
+            "error": error
+        })
+        with self._lock:
+            self._last_sent.pop(agent_id, None)
+    
+    def stats(self) -> Dict[str, int]:
+        """Counters: operations submitted/coalesced/sent/rejected, requests, failures."""
+        with self._lock:
+            return dict(self._stats, pending=len(self._pending))
+    
+    def _add(self, op: Dict[str, Any]) -> None:
+        with self._lock:
+            self._stats["operations"] += 1
+            # Updates after this op must not be merged into one before it
+            self._open_update.pop(op["agent_id"], None)
+            if op["op"] in ("register", "update") and op["agent_id"] in self._last_sent:
+                self._last_sent[op["agent_id"]] = time.monotonic()
+            self._append(op)
+    
+    def _append(self, op: Dict[str, Any]) -> None:
+        """Append under the lock, dropping the oldest op when over max_pending."""
+        self._pending.append(op)
+        if len(self._pending) > self.max_pending:
+            dropped = self._pending.pop(0)
+            if self._open_update.get(dropped["agent_id"]) is dropped:
+                del self._open_update[dropped["agent_id"]]
+            self._stats["dropped"] += 1
+    
+    # ------------------------------------------------------------------
+    # Flushing (called by the client's background loop)
+    # ------------------------------------------------------------------
+    
+    def _take(self) -> List[Dict[str, Any]]:
+        """Take everything pending, adding heartbeats for quiet agents."""
+        now = time.monotonic()
+        with self._lock:
+            if self.heartbeat_interval:
+                for agent_id, last in self._last_sent.items():
+                    if now - last >= self.heartbeat_interval:
+                        self._pending.append({"op": "heartbeat", "agent_id": agent_id})
+                        self._last_sent[agent_id] = now
+            ops, self._pending = self._pending, []
+            self._open_update.clear()
+        return ops
+    
+    def _requeue(self, ops: List[Dict[str, Any]]) -> None:
+        """Put ops that could not be sent back in front of newer ones."""
+        with self._lock:
+            self._stats["errors"] += 1
+            self._pending[:0] = ops
+            overflow = len(self._pending) - self.max_pending
+            if overflow > 0:
+                del self._pending[:overflow]
+                self._stats["dropped"] += overflow
+            self._open_update.clear()
+    
+    def _reject(self, ops: List[Dict[str, Any]], reason: str) -> None:
+        """
+        Drop a chunk the server refused (4xx) or answered unreadably: resending
+        it would fail again, or repeat operations the server already applied.
+        """
+        print(f"⚠️  Status server rejected {len(ops)} operations: {reason}", file=sys.stderr)
+        with self._lock:
+            self._stats["rejected"] += len(ops)
+    
+    def _record(self, ops: List[Dict[str, Any]], results: List[Dict[str, Any]]) -> None:
+        """Account for a successful bulk request."""
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["sent"] += len(ops)
+            for result in results:
+                if result.get("ok"):
+                    continue
+                self._stats["failed"] += 1
+                if result.get("op") == "heartbeat":
+                    # Finished or reaped elsewhere: stop heartbeating it
+                    self._last_sent.pop(result.get("agent_id"), None)
+    
+    def _chunks(self, ops: List[Dict[str, Any]]):
+        """(start index, chunk) pairs of at most batch_size ops."""
+        for start in range(0, len(ops), self.batch_size):
+            yield start, ops[start:start + self.batch_size]
+    
+    @staticmethod
+    def _results(response: httpx.Response) -> List[Dict[str, Any]]:
+        """Per-operation results of a bulk response; ValueError if malformed."""
+        body = response.json()  # JSONDecodeError is a ValueError
+        results = body.get("results", []) if isinstance(body, dict) else None
+        if not isinstance(results, list) or not all(isinstance(r, dict) for r in results):
+            raise ValueError(f"unexpected body {response.text[:200]!r}")
+        return results
+    
+    @staticmethod
+    def _payload(ops: List[Dict[str, Any]]) -> Dict[str, Any]:
+        # Drop unset optional fields so the server applies its defaults
+        return {"operations": [{k: v for k, v in op.items() if v is not None} for op in ops]}
+
+
+class AgentStatusClient(_StatusBuffer):
+    """Status server client flushing from a background thread."""
+    
+    def __init__(self, base_url: str = DEFAULT_URL, flush_interval: float = 0.5,
+                 heartbeat_interval: Optional[float] = 60.0, batch_size: int = 1000,
+                 max_pending: int = 100000, timeout: float = 10.0):
+        """
+        Args:
+            base_url: Status server URL
+            flush_interval: Seconds between flushes (the coalescing window)
+            heartbeat_interval: Seconds of quiet before a registered agent
+                gets a heartbeat (None: no automatic heartbeats)
+            batch_size: Max operations per bulk request
+            max_pending: Buffered operations kept while the server is
+                unreachable; the oldest are dropped beyond that
+            timeout: HTTP timeout in seconds
+        """
+        super().__init__(flush_interval, heartbeat_interval, batch_size, max_pending)
+        self.http = httpx.Client(
+            base_url=base_url,
+            timeout=timeout,
+            limits=httpx.Limits(max_keepalive_connections=4, keepalive_expiry=60.0)
+        )
+        self._send_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._flush_loop, name="agent-status-flush", daemon=True)
+        self._thread.start()
+    
+    def flush(self) -> None:
+        """Send everything buffered now."""
+        with self._send_lock:
+            ops = self._take()
+            for start, chunk in self._chunks(ops):
+                try:
+                    response = self.http.post("/agents/bulk", json=self._payload(chunk))
+                    response.raise_for_status()
+                    results = self._results(response)
+                except httpx.HTTPStatusError as e:
+                    if e.response.status_code < 500:
+                        self._reject(chunk, f"{e.response.status_code} {e.response.text[:200]}")
+                        continue
+                    print(f"⚠️  Status server flush failed: {e}", file=sys.stderr)
+                    self._requeue(ops[start:])
+                    return
+                except httpx.HTTPError as e:
+                    print(f"⚠️  Status server flush failed: {e}", file=sys.stderr)
+                    self._requeue(ops[start:])
+                    return
+                except ValueError as e:
+                    # The server took the batch (2xx): don't apply it twice
+                    self._reject(chunk, f"unreadable response ({e})")
+                    continue
+                self._record(chunk, results)
+    
+    def _flush_loop(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+    
+    def close(self) -> None:
+        """Stop the background thread, send what is left, close connections."""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._thread.join()
+        self.flush()
+        self.http.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+    
+    # Reads go straight to the server
+    
+    def get_agent(self, agent_id: str) -> Optional[Dict]:
+        response = self.http.get(f"/agents/{agent_id}")
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()["agent"]
+    
+    def get_active_agents(self) -> List[Dict]:
+        response = self.http.get("/agents/active")
+        response.raise_for_status()
+        return response.json()["agents"]
+    
+    def get_all_agents(self, limit: int = 100, **filters) -> Dict[str, Any]:
+        """One page of /agents/all (filters: before, after, workflow, project, status)."""
+        params = {"limit": limit, **{k: v for k, v in filters.items() if v is not None}}
+        response = self.http.get("/agents/all", params=params)
+        response.raise_for_status()
+        return response.json()
+
+
+class AsyncAgentStatusClient(_StatusBuffer):
+    """
+    asyncio status server client flushing from a background task.
+
+    Buffered writes are plain (non-async) methods since they never wait;
+    flush, close and reads are coroutines. Create it inside a running loop.
+    """
+
+    def __init__(self, base_url: str = DEFAULT_URL, flush_interval: float = 0.5,
+                 heartbeat_interval: Optional[float] = 60.0, batch_size: int = 1000,
+                 max_pending: int = 100000, timeout: float = 10.0):
+        """Arguments as for AgentStatusClient."""
+        super().__init__(flush_interval, heartbeat_interval, batch_size, max_pending)
+        self.http = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=timeout,
+            limits=httpx.Limits(max_keepalive_connections=4, keepalive_expiry=60.0)
+        )
+        self._send_lock = asyncio.Lock()
+        self._task = asyncio.get_running_loop().create_task(self._flush_loop())
+    
+    async def flush(self) -> None:
+        """Send everything buffered now."""
+        async with self._send_lock:
+            ops = self._take()
+            for start, chunk in self._chunks(ops):
+                try:
+                    response = await self.http.post("/agents/bulk", json=self._payload(chunk))
+                    response.raise_for_status()
+                    results = self._results(response)
+                except httpx.HTTPStatusError as e:
+                    if e.response.status_code < 500:
+                        self._reject(chunk, f"{e.response.status_code} {e.response.text[:200]}")
+                        continue
+                    print(f"⚠️  Status server flush failed: {e}", file=sys.stderr)
+                    self._requeue(ops[start:])
+                    return
+                except httpx.HTTPError as e:
+                    print(f"⚠️  Status server flush failed: {e}", file=sys.stderr)
+                    self._requeue(ops[start:])
+                    return
+                except ValueError as e:
+                    # The server took the batch (2xx): don't apply it twice
+                    self._reject(chunk, f"unreadable response ({e})")
+                    continue
+                self._record(chunk, results)
+    
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+    
+    async def close(self) -> None:
+        """Stop the background task, send what is left, close connections."""
+        if self._task.done():
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        await self.flush()
+        await self.http.aclose()
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+    
+    async def get_agent(self, agent_id: str) -> Optional[Dict]:
+        response = await self.http.get(f"/agents/{agent_id}")
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()["agent"]
+    
+    async def get_active_agents(self) -> List[Dict]:
+        response = await self.http.get("/agents/active")
+        response.raise_for_status()
+        return response.json()["agents"]
+    
+    async def get_all_agents(self, limit: int = 100, **filters) -> Dict[str, Any]:
+        """One page of /agents/all (filters: before, after, workflow, project, status)."""
+        params = {"limit": limit, **{k: v for k, v in filters.items() if v is not None}}
+        response = await self.http.get("/agents/all", params=params)
+        response.raise_for_status()
+        return response.json()
+
+
+def main():
+    """CLI for shell scripts (one operation per invocation, sent immediately)."""
+    parser = argparse.ArgumentParser(description="Report agent status to the status server")
+    parser.add_argument("--url", default=DEFAULT_URL, help="Status server URL")
+    sub = parser.add_subparsers(dest="command", required=True)
+    
+    register = sub.add_parser("register", help="Register an agent")
+    register.add_argument("agent_id")
+    register.add_argument("--agent-type", default="cursor-agent")
+    register.add_argument("--workflow", default="unknown")
+    register.add_argument("--project", default="unknown")
+    register.add_argument("--metadata", help="JSON object")
+    
+    update = sub.add_parser("update", help="Update an agent's status")
+    update.add_argument("agent_id")
+    update.add_argument("--status", default="running")
+    update.add_argument("--task", help="Current task")
+    update.add_argument("--progress", help="JSON object")
+    
+    heartbeat = sub.add_parser("heartbeat", help="Refresh an agent's heartbeat")
+    heartbeat.add_argument("agent_id")
+    
+    complete = sub.add_parser("complete", help="Mark an agent finished")
+    complete.add_argument("agent_id")
+    complete.add_argument("--status", default="completed")
+    complete.add_argument("--summary", help="Result summary")
+    complete.add_argument("--error", help="Error message")
+    
+    sub.add_parser("active", help="List active agents")
+    
+    args = parser.parse_args()
+    
+    client = AgentStatusClient(args.url, heartbeat_interval=None)
+    try:
+        if args.command == "active":
+            print(json.dumps(client.get_active_agents(), indent=2))
+            return
+        if args.command == "register":
+            client.register(
+                args.agent_id,
+                agent_type=args.agent_type,
+                workflow=args.workflow,
+                project=args.project,
+                metadata=json.loads(args.metadata) if args.metadata else None,
+                heartbeat=False
+            )
+        elif args.command == "update":
+            client.update_status(
+                args.agent_id,
+                status=args.status,
+                current_task=args.task,
+                progress=json.loads(args.progress) if args.progress else None
+            )
+        elif args.command == "heartbeat":
+            client.heartbeat(args.agent_id)
+        elif args.command == "complete":
+            client.complete(args.agent_id, status=args.status,
+                            result_summary=args.summary, error=args.error)
+    finally:
+        client.close()
+    
+    stats = client.stats()
+    if stats["pending"] or stats["failed"] or stats["rejected"]:
+        print(f"❌ {args.command} failed for {args.agent_id}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,38 +1,393 @@
 """
 Agent status tracking server using Redis (reuses ncl_agents cursor service infrastructure).
 Tracks what agents are running, what they're doing, and their status.
+
+Besides one hash per agent, the tracker maintains sorted-set indexes scored
+by started_at: one over all agents and one per workflow, project and status.
+Listing recent agents is a range query on one of them (O(log n + page)).
+
+Active agents also sit in a heartbeat sorted set scored by their last
+heartbeat. A background reaper moves agents whose heartbeat is older than
+the TTL to the `lost` state, so crashed agents drop out of the active set.
+
+Every register/update/complete/lost change is appended to a capped Redis
+stream and published on a channel. Each server process holds a single
+subscription and fans events out to SSE and WebSocket viewers, so viewer
+count does not add Redis load; the stream lets viewers resume by event id.
+
+With a cold store configured (--cold-db / AGENT_STATUS_COLD_DB), Redis only
+holds the live working set: finished (completed or lost) agents are queued,
+flushed in batches into the SQLite store kept by AgentWorkflowLogger (the
+cold tier), dropped from the indexes and left to expire. Single-agent and
+listing reads go through both tiers. Without one, finished agents are
+dropped from the indexes the same way and expire unsaved.
+
+GET /metrics exposes Prometheus metrics: per-endpoint request counts and
+latency histograms, per-Redis-command and per-tracker-method latencies,
+agent gauges for both tiers and Redis connection pool stats.
+
+Serving: `agent_status_server.py --workers 4 --pool-size 50` runs several
+uvicorn worker processes, each with its own bounded Redis connection pool.
+Responses are serialized with orjson when it is installed and large ones
+are gzip-compressed. Settings can also come from AGENT_STATUS_* environment
+variables (see main()).
+
+/agents/active and /agents/all are served from a short-TTL in-process cache
+that is invalidated by writes (local ones and events from other processes);
+concurrent identical queries share one Redis fetch, so Redis read load does
+not grow with the number of dashboards.
+
+Each status update is also appended to a per-agent progress stream capped by
+length and age (and expired with the agent), so GET /agents/{id}/progress
+can return recent history with a throughput and ETA estimate.
+
+Backends: Redis (AgentStatusTracker below) by default; `--backend memory://`
+or `--backend sqlite:///status.db` use EmbeddedStatusTracker instead, which
+keeps everything in the server process (no Redis needed, single worker).
 """
 
+import argparse
 import asyncio
+import functools
 import json
-from datetime import datetime
-from typing import Optional, Dict, Any, List
+import os
+import time
+from contextlib import aclosing, asynccontextmanager
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List, Union, AsyncIterator, Tuple, Callable, Awaitable, Hashable
 import redis.asyncio as redis
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 import uvicorn
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from agent_workflow_logger import AgentWorkflowLogger
+from status_metrics import MetricsRegistry
+from status_tracker import (
+    StatusTracker, timed, timestamp_score, event_id_key,
+    HEARTBEAT_TTL, EVENT_STREAM_MAXLEN, COMPLETED_TTL, PROGRESS_MAXLEN, PROGRESS_MAX_AGE
+)
+from embedded_status_tracker import EmbeddedStatusTracker
+
+
+REAP_INTERVAL = 30.0  # seconds between reaper passes
+# Numeric progress fields treated as "units done", in order of preference
+PROGRESS_COUNTER_FIELDS = ("completed", "done", "current", "step", "percent")
+FLUSH_INTERVAL = 5.0  # seconds between cold-tier flushes
+MAX_BULK_OPERATIONS = 5000  # per /agents/bulk request
+COLD_STORE_DB = os.environ.get("AGENT_STATUS_COLD_DB") or None  # SQLite DB for finished agents; unset = Redis only
+REDIS_URL = os.environ.get("AGENT_STATUS_REDIS_URL", "redis://localhost:6379/0")
+# redis://... (shared), memory:// or sqlite:///path.db (embedded, single process)
+BACKEND_URL = os.environ.get("AGENT_STATUS_BACKEND", REDIS_URL)
+REDIS_POOL_SIZE = int(os.environ.get("AGENT_STATUS_REDIS_POOL_SIZE", "50"))  # connections per worker
+GZIP_MIN_SIZE = int(os.environ.get("AGENT_STATUS_GZIP_MIN_SIZE", "2048"))  # bytes; 0 disables gzip
+SHUTDOWN_FLUSH_TIMEOUT = 10.0  # seconds spent flushing finished agents on shutdown
+CACHE_TTL = float(os.environ.get("AGENT_STATUS_CACHE_TTL", "0.5"))  # seconds; 0 disables the read cache
+
+# Moves an agent between status indexes. Runs before the hash is updated so
+# it can read the previous status; the status index score is the agent's
+# started_at score from the global index. Statuses ever indexed are kept in
+# the `statuses` set so they can be counted without scanning keys.
+# KEYS[1] = agent hash; ARGV = prefix, agent_id, new status
+MOVE_STATUS_SCRIPT = """
+local old = redis.call('HGET', KEYS[1], 'status')
+if old and old ~= ARGV[3] then
+    redis.call('ZREM', ARGV[1] .. 'index:status:' .. old, ARGV[2])
+end
+local started = redis.call('ZSCORE', ARGV[1] .. 'index:started', ARGV[2])
+if started then
+    redis.call('ZADD', ARGV[1] .. 'index:status:' .. ARGV[3], started, ARGV[2])
+    redis.call('SADD', ARGV[1] .. 'statuses', ARGV[3])
+end
+return old
+"""
+
+# Moves every agent whose last heartbeat is older than the cutoff to "lost"
+# in one atomic step, so a concurrent update can't be half-applied.
+# ARGV = prefix, cutoff score, now (ISO), max agents per call
+REAP_STALE_SCRIPT = """
+local prefix = ARGV[1]
+local stale = redis.call('ZRANGEBYSCORE', prefix .. 'heartbeats', '-inf', ARGV[2],
+                         'LIMIT', 0, tonumber(ARGV[4]))
+for _, agent_id in ipairs(stale) do
+    local key = prefix .. 'agent:' .. agent_id
+    local old = redis.call('HGET', key, 'status')
+    if old then
+        redis.call('ZREM', prefix .. 'index:status:' .. old, agent_id)
+    end
+    local started = redis.call('ZSCORE', prefix .. 'index:started', agent_id)
+    if started then
+        redis.call('ZADD', prefix .. 'index:status:lost', started, agent_id)
+        redis.call('SADD', prefix .. 'statuses', 'lost')
+    end
+    redis.call('HSET', key, 'status', 'lost', 'completed_at', ARGV[3],
+               'error', 'heartbeat expired')
+    redis.call('ZREM', prefix .. 'heartbeats', agent_id)
+    redis.call('SREM', prefix .. 'active', agent_id)
+    redis.call('RPUSH', prefix .. 'flush_queue', agent_id)
+end
+if #stale > 0 then
+    redis.call('HINCRBY', prefix .. 'stats', 'reaped_total', #stale)
+end
+return stale
+"""
+
+# Appends an event to the stream and publishes it (with its stream id) in one
+# step. Queued after the hash write, so project/status are the new values.
+# KEYS[1] = event stream, KEYS[2] = agent hash
+# ARGV = channel, maxlen, event type, agent_id, data (JSON)
+PUBLISH_EVENT_SCRIPT = """
+local project = redis.call('HGET', KEYS[2], 'project') or ''
+local status = redis.call('HGET', KEYS[2], 'status') or ''
+local id = redis.call('XADD', KEYS[1], 'MAXLEN', '~', ARGV[2], '*',
+                      'type', ARGV[3], 'agent_id', ARGV[4], 'project', project,
+                      'status', status, 'data', ARGV[5])
+redis.call('PUBLISH', ARGV[1], cjson.encode({
+    id = id, type = ARGV[3], agent_id = ARGV[4], project = project,
+    status = status, data = ARGV[5]
+}))
+return id
+"""
+
+# Drops flushed agents from the indexes and sets them to expire, skipping any
+# re-registered since they were read (active again, or a different run
+# under the same id). Atomic, so a concurrent register can't be unindexed.
+# ARGV = prefix, ttl, then agent_id, started_at pairs
+RETIRE_FLUSHED_SCRIPT = """
+local prefix = ARGV[1]
+local retired = 0
+for i = 3, #ARGV, 2 do
+    local agent_id = ARGV[i]
+    local key = prefix .. 'agent:' .. agent_id
+    if redis.call('SISMEMBER', prefix .. 'active', agent_id) == 0
+            and redis.call('HGET', key, 'started_at') == ARGV[i + 1] then
+        local fields = redis.call('HMGET', key, 'workflow', 'project', 'status')
+        redis.call('EXPIRE', key, ARGV[2])
+        redis.call('EXPIRE', prefix .. 'progress:' .. agent_id, ARGV[2])
+        redis.call('ZREM', prefix .. 'index:started', agent_id)
+        for j, kind in ipairs({'workflow', 'project', 'status'}) do
+            if fields[j] then
+                redis.call('ZREM', prefix .. 'index:' .. kind .. ':' .. fields[j], agent_id)
+            end
+        end
+        retired = retired + 1
+    end
+end
+return retired
+"""
+
+
+def estimate_progress(history: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Throughput and ETA from a progress history (oldest first).
+    
+    Uses the first numeric counter among PROGRESS_COUNTER_FIELDS in the
+    progress dicts, and "total" (100 for "percent") as the target.
+    
+    Returns:
+        Dict with field, current, total, rate_per_sec, eta_seconds
+        (None where there is not enough data)
+    """
+    samples = [h for h in history if isinstance(h.get("progress"), dict)]
+    estimate = {"field": None, "current": None, "total": None, "rate_per_sec": None, "eta_seconds": None}
+    if not samples:
+        return estimate
+    
+    latest = samples[-1]["progress"]
+    field = next((f for f in PROGRESS_COUNTER_FIELDS
+                  if isinstance(latest.get(f), (int, float)) and not isinstance(latest.get(f), bool)), None)
+    if field is None:
+        return estimate
+    total = latest.get("total")
+    if not isinstance(total, (int, float)):
+        total = 100 if field == "percent" else None
+    estimate.update(field=field, current=latest[field], total=total)
+    
+    points = [(h["ts"], h["progress"][field]) for h in samples
+              if isinstance(h["progress"].get(field), (int, float))]
+    # Only the run since the counter last went backwards (e.g. a restarted phase)
+    start = 0
+    for i in range(1, len(points)):
+        if points[i][1] < points[i - 1][1]:
+            start = i
+    points = points[start:]
+    if len(points) < 2 or points[-1][0] <= points[0][0]:
+        return estimate
+    
+    rate = (points[-1][1] - points[0][1]) / (points[-1][0] - points[0][0])
+    estimate["rate_per_sec"] = rate
+    if total is not None and rate > 0:
+        estimate["eta_seconds"] = max(total - points[-1][1], 0) / rate
+    return estimate
+
+
+def dumps(obj: Any) -> str:
+    """JSON text, via orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(obj).decode('utf-8')
+    return json.dumps(obj)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson when it is installed."""
+    
+    def render(self, content: Any) -> bytes:
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+def is_embedded_backend(url: str) -> bool:
+    """Whether a backend URL selects the in-process (embedded) tracker."""
+    return url.startswith(("memory:", "sqlite:///"))
+
+
+def create_tracker(url: str = BACKEND_URL) -> StatusTracker:
+    """
+    Tracker for a backend URL.
+    
+    memory:// keeps agents in this process; sqlite:///path.db does too and
+    persists live agents to that file (sqlite:////abs/path.db for an
+    absolute path). Anything else is a Redis URL.
+    """
+    if url.startswith("memory:"):
+        return EmbeddedStatusTracker()
+    if url.startswith("sqlite:///"):
+        return EmbeddedStatusTracker(db_path=url[len("sqlite:///"):])
+    return AgentStatusTracker(redis_url=url)
+
 
-class AgentStatusTracker:
+class AgentStatusTracker(StatusTracker):
     """Track agent status using Redis (compatible with ncl_agents cursor service)."""
     
-    def __init__(self, redis_url: str = "redis://localhost:6379/0"):
+    def __init__(self, redis_url: str = REDIS_URL,
+                 pool_size: int = REDIS_POOL_SIZE,
+                 heartbeat_ttl: float = HEARTBEAT_TTL,
+                 cold_store: Optional[AgentWorkflowLogger] = None,
+                 completed_ttl: float = COMPLETED_TTL,
+                 metrics: Optional[MetricsRegistry] = None):
+        """
+        Args:
+            redis_url: Redis connection URL
+            pool_size: Max Redis connections; requests wait for a free
+                connection instead of opening more
+            heartbeat_ttl: Seconds without a heartbeat before the reaper
+                marks an active agent as lost
+            cold_store: Logger whose database keeps finished agents
+                (None: finished agents stay in Redis)
+            completed_ttl: Seconds a finished agent's hash is kept in Redis
+                after it has been flushed to the cold store
+            metrics: Registry for latency metrics (a private one if None)
+        """
+        super().__init__(heartbeat_ttl, cold_store, completed_ttl, metrics)
         self.redis_url = redis_url
+        self.pool_size = pool_size
+        self.pool: Optional[redis.BlockingConnectionPool] = None
         self.client: Optional[redis.Redis] = None
         self.prefix = "activation_agent:"
+        self._move_status = None
+        self._reap_stale = None
+        self._publish_event = None
+        self._retire_flushed = None
+        
+        self.redis_seconds = self.metrics.histogram(
+            "agent_status_redis_command_seconds",
+            "Redis round-trip latency by command (MULTI/PIPELINE for batches)", ("command",)
+        )
     
     async def connect(self):
         """Connect to Redis."""
         if self.client is None:
-            self.client = await redis.from_url(self.redis_url)
+            self.pool = redis.BlockingConnectionPool.from_url(
+                self.redis_url, max_connections=self.pool_size, timeout=10
+            )
+            self.client = self.instrument(redis.Redis(connection_pool=self.pool))
             await self.client.ping()
     
+    def instrument(self, client: redis.Redis) -> redis.Redis:
+        """
+        Time every Redis round trip made through client.
+        
+        Wraps the client's execute_command (one command per call) and the
+        execute of pipelines it creates (one round trip per batch).
+        """
+        execute_command = client.execute_command
+        pipeline = client.pipeline
+        histogram = self.redis_seconds
+        
+        async def timed_execute_command(*args, **options):
+            start = time.perf_counter()
+            try:
+                return await execute_command(*args, **options)
+            finally:
+                histogram.observe(time.perf_counter() - start, str(args[0]).upper())
+        
+        def timed_pipeline(transaction: bool = True, shard_hint: Optional[str] = None):
+            pipe = pipeline(transaction=transaction, shard_hint=shard_hint)
+            execute = pipe.execute
+            label = "MULTI" if transaction else "PIPELINE"
+            
+            async def timed_execute(raise_on_error: bool = True):
+                start = time.perf_counter()
+                try:
+                    return await execute(raise_on_error=raise_on_error)
+                finally:
+                    histogram.observe(time.perf_counter() - start, label)
+            
+            pipe.execute = timed_execute
+            return pipe
+        
+        client.execute_command = timed_execute_command
+        client.pipeline = timed_pipeline
+        return client
+    
+    def _index_key(self, kind: Optional[str] = None, value: Optional[str] = None) -> str:
+        """Sorted-set index key: global when kind is None, else per workflow/project/status."""
+        if kind is None:
+            return f"{self.prefix}index:started"
+        return f"{self.prefix}index:{kind}:{value}"
+    
+    async def _queue_move_status(self, pipe, agent_id: str, status: str) -> None:
+        """Queue the status-index update on a pipeline (before the hash write)."""
+        if self._move_status is None:
+            self._move_status = self.client.register_script(MOVE_STATUS_SCRIPT)
+        await self._move_status(
+            keys=[f"{self.prefix}agent:{agent_id}"],
+            args=[self.prefix, agent_id, status],
+            client=pipe
+        )
+    
+    async def _queue_event(self, pipe, event_type: str, agent_id: str, data: Dict[str, Any]) -> None:
+        """Queue appending + publishing an event on a pipeline (after the hash write)."""
+        if self._publish_event is None:
+            self._publish_event = self.client.register_script(PUBLISH_EVENT_SCRIPT)
+        await self._publish_event(
+            keys=[f"{self.prefix}events", f"{self.prefix}agent:{agent_id}"],
+            args=[f"{self.prefix}events", EVENT_STREAM_MAXLEN, event_type, agent_id,
+                  json.dumps(data)],
+            client=pipe
+        )
+    
+    def _queue_heartbeat(self, pipe, agent_id: str, now: datetime, only_active: bool = True) -> None:
+        """Queue a heartbeat refresh; only_active leaves finished/lost agents alone."""
+        pipe.zadd(f"{self.prefix}heartbeats", {agent_id: timestamp_score(now.isoformat())},
+                  xx=only_active)
+    
     async def disconnect(self):
         """Disconnect from Redis."""
         if self.client:
-            await self.client.close()
+            await self.client.aclose()
             self.client = None
+        if self.pool is not None:
+            await self.pool.disconnect()
+            self.pool = None
     
+    @timed
     async def register_agent(self, agent_id: str, agent_type: str, 
                             workflow: str, project: str, 
                             metadata: Optional[Dict] = None) -> None:
@@ -40,34 +395,75 @@ class AgentStatusTracker:
         if not self.client:
             await self.connect()
         
+        pipe = self.client.pipeline(transaction=True)
+        await self._queue_register(pipe, agent_id, agent_type, workflow, project, metadata)
+        await pipe.execute()
+        self._notify_write()
+    
+    async def _queue_register(self, pipe, agent_id: str, agent_type: str,
+                              workflow: str, project: str,
+                              metadata: Optional[Dict] = None) -> None:
+        """Queue the commands of register_agent on a pipeline."""
+        now = datetime.utcnow()
         agent_data = {
             "agent_id": agent_id,
             "agent_type": agent_type,
             "workflow": workflow,
             "project": project,
             "status": "starting",
-            "started_at": datetime.utcnow().isoformat(),
-            "last_heartbeat": datetime.utcnow().isoformat(),
+            "started_at": now.isoformat(),
+            "last_heartbeat": now.isoformat(),
             "metadata": json.dumps(metadata or {})
         }
         
         key = f"{self.prefix}agent:{agent_id}"
-        await self.client.hset(key, mapping=agent_data)
+        score = timestamp_score(agent_data["started_at"])
+        
+        pipe.zadd(self._index_key(), {agent_id: score})
+        pipe.zadd(self._index_key("workflow", workflow), {agent_id: score})
+        pipe.zadd(self._index_key("project", project), {agent_id: score})
+        await self._queue_move_status(pipe, agent_id, agent_data["status"])
+        pipe.hset(key, mapping=agent_data)
+        pipe.persist(key)  # an earlier run under this id may be expiring
+        pipe.delete(f"{self.prefix}progress:{agent_id}")
         
         # Add to active agents set
-        await self.client.sadd(f"{self.prefix}active", agent_id)
+        pipe.sadd(f"{self.prefix}active", agent_id)
+        self._queue_heartbeat(pipe, agent_id, now, only_active=False)
+        await self._queue_event(pipe, "register", agent_id, agent_data)
     
+    @timed
     async def update_status(self, agent_id: str, status: str, 
                            current_task: Optional[str] = None,
-                           progress: Optional[Dict] = None) -> None:
-        """Update agent status."""
+                           progress: Optional[Dict] = None) -> bool:
+        """
+        Update agent status.
+        
+        Returns:
+            False if the agent is unknown (never registered or expired);
+            nothing is written then
+        """
         if not self.client:
             await self.connect()
         
+        if not await self.client.exists(f"{self.prefix}agent:{agent_id}"):
+            return False
+        
+        pipe = self.client.pipeline(transaction=True)
+        await self._queue_update(pipe, agent_id, status, current_task, progress)
+        await pipe.execute()
+        self._notify_write()
+        return True
+    
+    async def _queue_update(self, pipe, agent_id: str, status: str,
+                            current_task: Optional[str] = None,
+                            progress: Optional[Dict] = None) -> None:
+        """Queue the commands of update_status on a pipeline."""
         key = f"{self.prefix}agent:{agent_id}"
+        now = datetime.utcnow()
         updates = {
             "status": status,
-            "last_heartbeat": datetime.utcnow().isoformat()
+            "last_heartbeat": now.isoformat()
         }
         
         if current_task:
@@ -75,15 +471,72 @@ class AgentStatusTracker:
         if progress:
             updates["progress"] = json.dumps(progress)
         
-        await self.client.hset(key, mapping=updates)
+        await self._queue_move_status(pipe, agent_id, status)
+        pipe.hset(key, mapping=updates)
+        self._queue_heartbeat(pipe, agent_id, now)
+        self._queue_progress(pipe, agent_id, updates)
+        await self._queue_event(pipe, "update", agent_id, updates)
+    
+    def _queue_progress(self, pipe, agent_id: str, updates: Dict[str, str]) -> None:
+        """Append an update to the agent's progress stream, capped by length and age."""
+        key = f"{self.prefix}progress:{agent_id}"
+        fields = {k: updates[k] for k in ("status", "current_task", "progress") if k in updates}
+        pipe.xadd(key, fields, maxlen=PROGRESS_MAXLEN, approximate=True)
+        min_ms = int((time.time() - PROGRESS_MAX_AGE) * 1000)
+        pipe.xtrim(key, minid=f"{min_ms}-0", approximate=True)
+    
+    @timed
+    async def heartbeat(self, agent_id: str) -> bool:
+        """
+        Refresh an agent's heartbeat without changing its status.
+        
+        Returns:
+            False if the agent is not active (finished, lost or unknown)
+        """
+        if not self.client:
+            await self.connect()
+        
+        if not await self.client.sismember(f"{self.prefix}active", agent_id):
+            return False
+        
+        pipe = self.client.pipeline(transaction=True)
+        self._queue_refresh_heartbeat(pipe, agent_id)
+        await pipe.execute()
+        return True
+    
+    def _queue_refresh_heartbeat(self, pipe, agent_id: str) -> None:
+        """Queue the commands of heartbeat (caller checks the agent is active)."""
+        now = datetime.utcnow()
+        pipe.hset(f"{self.prefix}agent:{agent_id}", "last_heartbeat", now.isoformat())
+        self._queue_heartbeat(pipe, agent_id, now)
     
+    @timed
     async def complete_agent(self, agent_id: str, status: str = "completed",
                             result_summary: Optional[str] = None,
-                            error: Optional[str] = None) -> None:
-        """Mark agent as completed."""
+                            error: Optional[str] = None) -> bool:
+        """
+        Mark agent as completed.
+        
+        Returns:
+            False if the agent is unknown (never registered or expired);
+            nothing is written then
+        """
         if not self.client:
             await self.connect()
         
+        if not await self.client.exists(f"{self.prefix}agent:{agent_id}"):
+            return False
+        
+        pipe = self.client.pipeline(transaction=True)
+        await self._queue_complete(pipe, agent_id, status, result_summary, error)
+        await pipe.execute()
+        self._notify_write()
+        return True
+    
+    async def _queue_complete(self, pipe, agent_id: str, status: str = "completed",
+                              result_summary: Optional[str] = None,
+                              error: Optional[str] = None) -> None:
+        """Queue the commands of complete_agent on a pipeline."""
         key = f"{self.prefix}agent:{agent_id}"
         updates = {
             "status": status,
@@ -96,19 +549,307 @@ class AgentStatusTracker:
         if error:
             updates["error"] = error
         
-        await self.client.hset(key, mapping=updates)
+        await self._queue_move_status(pipe, agent_id, status)
+        pipe.hset(key, mapping=updates)
         
         # Remove from active set
-        await self.client.srem(f"{self.prefix}active", agent_id)
+        pipe.srem(f"{self.prefix}active", agent_id)
+        pipe.zrem(f"{self.prefix}heartbeats", agent_id)
+        pipe.rpush(f"{self.prefix}flush_queue", agent_id)
+        await self._queue_event(pipe, "complete", agent_id, updates)
     
-    async def get_agent_status(self, agent_id: str) -> Optional[Dict]:
-        """Get status for a specific agent."""
+    @timed
+    async def apply_bulk(self, operations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Apply many register/update/heartbeat/complete operations in one
+        Redis transaction (a single round trip for the whole batch).
+        
+        Each operation is a dict with "op", "agent_id" and the same fields
+        the single-agent endpoints take, e.g.
+        {"op": "update", "agent_id": "a1", "status": "running", "current_task": "..."}.
+        
+        Returns:
+            One result per operation, in order: {"agent_id", "op", "ok"}
+            plus "error" when the operation was rejected or failed
+        """
         if not self.client:
             await self.connect()
         
-        key = f"{self.prefix}agent:{agent_id}"
-        data = await self.client.hgetall(key)
+        # Whether each heartbeat target is active, kept current as earlier
+        # operations in the batch register or complete it
+        heartbeat_ids = [
+            op.get("agent_id") for op in operations
+            if op.get("op") == "heartbeat" and op.get("agent_id")
+        ]
+        active = dict(zip(
+            heartbeat_ids,
+            await self.client.smismember(f"{self.prefix}active", heartbeat_ids) if heartbeat_ids else []
+        ))
+        # Updates and completes only apply to agents that exist (or are
+        # registered earlier in the batch)
+        write_ids = list({
+            op.get("agent_id") for op in operations
+            if op.get("op") in ("update", "complete") and op.get("agent_id")
+        })
+        known = set()
+        if write_ids:
+            check = self.client.pipeline(transaction=False)
+            for agent_id in write_ids:
+                check.exists(f"{self.prefix}agent:{agent_id}")
+            known = {i for i, exists in zip(write_ids, await check.execute()) if exists}
+        
+        pipe = self.client.pipeline(transaction=True)
+        results = []
+        spans = []
+        for op in operations:
+            agent_id = op.get("agent_id")
+            kind = op.get("op")
+            result = {"agent_id": agent_id, "op": kind, "ok": False}
+            results.append(result)
+            start = len(pipe)
+            
+            if not agent_id:
+                result["error"] = "agent_id required"
+            elif kind == "register":
+                await self._queue_register(
+                    pipe,
+                    agent_id,
+                    agent_type=op.get("agent_type", "cursor-agent"),
+                    workflow=op.get("workflow", "unknown"),
+                    project=op.get("project", "unknown"),
+                    metadata=op.get("metadata")
+                )
+                known.add(agent_id)
+                active[agent_id] = True
+            elif kind in ("update", "complete") and agent_id not in known:
+                result["error"] = "Agent not found"
+            elif kind == "update":
+                await self._queue_update(
+                    pipe,
+                    agent_id,
+                    status=op.get("status", "running"),
+                    current_task=op.get("current_task"),
+                    progress=op.get("progress")
+                )
+            elif kind == "heartbeat":
+                if active.get(agent_id):
+                    self._queue_refresh_heartbeat(pipe, agent_id)
+                else:
+                    result["error"] = "Agent not active"
+            elif kind == "complete":
+                await self._queue_complete(
+                    pipe,
+                    agent_id,
+                    status=op.get("status", "completed"),
+                    result_summary=op.get("result_summary"),
+                    error=op.get("error")
+                )
+                active[agent_id] = False
+            else:
+                result["error"] = f"unknown op: {kind}"
+            
+            spans.append((result, start, len(pipe)))
+        
+        replies = await pipe.execute(raise_on_error=False) if len(pipe) else []
+        
+        for result, start, end in spans:
+            if "error" in result:
+                continue
+            errors = [r for r in replies[start:end] if isinstance(r, Exception)]
+            result["ok"] = not errors
+            if errors:
+                result["error"] = str(errors[0])
+        
+        # Heartbeats don't change anything the listings show
+        if any(r["ok"] and r["op"] != "heartbeat" for r in results):
+            self._notify_write()
+        return results
+    
+    @timed
+    async def reap_stale_agents(self, batch_size: int = 500) -> List[str]:
+        """
+        Move active agents whose heartbeat is older than heartbeat_ttl to "lost".
+        
+        Args:
+            batch_size: Max agents moved per script call (keeps each call short)
+        
+        Returns:
+            IDs of the reaped agents
+        """
+        if not self.client:
+            await self.connect()
+        if self._reap_stale is None:
+            self._reap_stale = self.client.register_script(REAP_STALE_SCRIPT)
+        
+        now = datetime.utcnow()
+        cutoff = timestamp_score(now.isoformat()) - self.heartbeat_ttl
+        
+        reaped = []
+        while True:
+            ids = await self._reap_stale(
+                args=[self.prefix, cutoff, now.isoformat(), batch_size],
+                client=self.client
+            )
+            reaped.extend(i.decode('utf-8') for i in ids)
+            if len(ids) < batch_size:
+                break
+        
+        if reaped:
+            self._notify_write()
+            pipe = self.client.pipeline(transaction=False)
+            for agent_id in reaped:
+                await self._queue_event(pipe, "lost", agent_id, {"error": "heartbeat expired"})
+            await pipe.execute()
+        return reaped
+    
+    @staticmethod
+    def _decode_event(event_id: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+        """Event dict from a stream entry or a published message."""
+        fields = {
+            (k.decode('utf-8') if isinstance(k, bytes) else k): (v.decode('utf-8') if isinstance(v, bytes) else v)
+            for k, v in fields.items()
+        }
+        try:
+            data = json.loads(fields.get("data") or "{}")
+        except ValueError:
+            data = {}
+        return {
+            "id": event_id,
+            "type": fields.get("type"),
+            "agent_id": fields.get("agent_id"),
+            "project": fields.get("project") or None,
+            "status": fields.get("status") or None,
+            "data": data
+        }
+    
+    @timed
+    async def get_events_since(self, last_event_id: str, count: int = 1000) -> List[Dict[str, Any]]:
+        """Events after last_event_id still held in the stream, oldest first."""
+        if not self.client:
+            await self.connect()
+        
+        entries = await self.client.xrange(f"{self.prefix}events", min=f"({last_event_id}", count=count)
+        return [self._decode_event(i.decode('utf-8'), fields) for i, fields in entries]
+    
+    @timed
+    async def get_progress_history(self, agent_id: str, limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        Recent status updates of an agent, oldest first.
         
+        Returns:
+            List of dicts with id, ts (epoch seconds), timestamp, status,
+            current_task and progress
+        """
+        if not self.client:
+            await self.connect()
+        
+        entries = await self.client.xrevrange(f"{self.prefix}progress:{agent_id}", count=limit)
+        history = []
+        for entry_id, fields in reversed(entries):
+            entry_id = entry_id.decode('utf-8')
+            fields = {k.decode('utf-8'): v.decode('utf-8') for k, v in fields.items()}
+            ts = event_id_key(entry_id)[0] / 1000
+            try:
+                progress = json.loads(fields["progress"]) if "progress" in fields else None
+            except ValueError:
+                progress = None
+            history.append({
+                "id": entry_id,
+                "ts": ts,
+                "timestamp": datetime.fromtimestamp(ts, timezone.utc).replace(tzinfo=None).isoformat(),
+                "status": fields.get("status"),
+                "current_task": fields.get("current_task"),
+                "progress": progress
+            })
+        return history
+    
+    async def subscribe_events(self) -> AsyncIterator[Dict[str, Any]]:
+        """Yield events as they are published (one Redis subscription)."""
+        if not self.client:
+            await self.connect()
+        
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(f"{self.prefix}events")
+        try:
+            async for message in pubsub.listen():
+                if message.get("type") != "message":
+                    continue
+                try:
+                    fields = json.loads(message["data"])
+                except ValueError:
+                    continue
+                yield self._decode_event(fields.pop("id"), fields)
+        finally:
+            await pubsub.unsubscribe()
+            await pubsub.aclose()
+    
+    async def get_storage_stats(self) -> Dict[str, Any]:
+        """Sizes of the hot tier (what Redis currently holds)."""
+        if not self.client:
+            await self.connect()
+        
+        pipe = self.client.pipeline(transaction=False)
+        pipe.scard(f"{self.prefix}active")
+        pipe.zcard(self._index_key())
+        pipe.llen(f"{self.prefix}flush_queue")
+        active, indexed, pending_flush = await pipe.execute()
+        return {
+            "active": active,
+            "indexed": indexed,
+            "pending_flush": pending_flush,
+            "cold_store": self.cold_store.db_path if self.cold_store is not None else None
+        }
+    
+    async def get_pool_stats(self) -> Dict[str, int]:
+        """Connection pool usage of the Redis client."""
+        pool = getattr(self.client, "connection_pool", None)
+        if pool is None:
+            return {}
+        in_use = getattr(pool, "_in_use_connections", ())
+        available = getattr(pool, "_available_connections", ())
+        return {
+            "max": getattr(pool, "max_connections", 0) or 0,
+            "in_use": len(in_use),
+            "available": len(available),
+            "created": len(in_use) + len(available)
+        }
+    
+    async def get_status_counts(self) -> Dict[str, Dict[str, int]]:
+        """Agents per status in Redis (hot) and in the cold store."""
+        if not self.client:
+            await self.connect()
+        
+        statuses = sorted(s.decode('utf-8') for s in await self.client.smembers(f"{self.prefix}statuses"))
+        hot = {}
+        if statuses:
+            pipe = self.client.pipeline(transaction=False)
+            for status in statuses:
+                pipe.zcard(self._index_key("status", status))
+            hot = dict(zip(statuses, await pipe.execute()))
+        
+        cold = {}
+        if self.cold_store is not None:
+            cold = await asyncio.to_thread(self.cold_store.count_agent_statuses)
+        return {"hot": hot, "cold": cold}
+    
+    async def get_reaper_stats(self) -> Dict[str, Any]:
+        """Reaper counters (shared by every server on the same Redis)."""
+        if not self.client:
+            await self.connect()
+        
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hget(f"{self.prefix}stats", "reaped_total")
+        pipe.zcard(f"{self.prefix}heartbeats")
+        reaped_total, tracked = await pipe.execute()
+        return {
+            "reaped_total": int(reaped_total or 0),
+            "tracked_heartbeats": tracked,
+            "heartbeat_ttl": self.heartbeat_ttl
+        }
+    
+    @staticmethod
+    def _decode_agent(data: Dict[bytes, bytes]) -> Optional[Dict]:
+        """Decode a raw agent hash and parse its JSON fields."""
         if not data:
             return None
         
@@ -128,78 +869,546 @@ class AgentStatusTracker:
         
         return result
     
-    async def get_active_agents(self) -> List[Dict]:
-        """Get all active agents."""
+    @timed
+    async def get_agent_status(self, agent_id: str) -> Optional[Dict]:
+        """Get status for a specific agent."""
         if not self.client:
             await self.connect()
         
-        active_ids = await self.client.smembers(f"{self.prefix}active")
-        agents = []
+        key = f"{self.prefix}agent:{agent_id}"
+        data = await self.client.hgetall(key)
+        
+        agent = self._decode_agent(data)
+        if agent is None and self.cold_store is not None:
+            agent = await asyncio.to_thread(self.cold_store.get_agent_status, agent_id)
+        return agent
+    
+    @timed
+    async def get_agents(self, agent_ids: List[str]) -> List[Dict]:
+        """
+        Get status for many agents in a single round trip.
+        
+        All HGETALLs go out in one pipeline; agents whose hash no longer
+        exists are skipped. Order follows agent_ids.
+        """
+        if not agent_ids:
+            return []
+        if not self.client:
+            await self.connect()
         
-        for agent_id_bytes in active_ids:
-            agent_id = agent_id_bytes.decode('utf-8')
-            status = await self.get_agent_status(agent_id)
-            if status:
-                agents.append(status)
+        pipe = self.client.pipeline(transaction=False)
+        for agent_id in agent_ids:
+            pipe.hgetall(f"{self.prefix}agent:{agent_id}")
+        results = await pipe.execute()
         
+        agents = []
+        for data in results:
+            agent = self._decode_agent(data)
+            if agent:
+                agents.append(agent)
         return agents
     
-    async def get_all_agents(self, limit: int = 100) -> List[Dict]:
-        """Get all agents (active and completed)."""
+    @timed
+    async def get_active_agents(self) -> List[Dict]:
+        """Get all active agents (two round trips regardless of fleet size)."""
         if not self.client:
             await self.connect()
         
-        agents = []
-        cursor = 0
+        active_ids = await self.client.smembers(f"{self.prefix}active")
+        return await self.get_agents([a.decode('utf-8') for a in active_ids])
+    
+    @timed
+    async def get_all_agents(self, limit: int = 100,
+                             before: Optional[Union[str, float]] = None,
+                             after: Optional[Union[str, float]] = None,
+                             workflow: Optional[str] = None,
+                             project: Optional[str] = None,
+                             status: Optional[str] = None) -> List[Dict]:
+        """
+        Get agents (active and completed), newest first.
         
-        while True:
-            cursor, keys = await self.client.scan(
-                cursor=cursor,
-                match=f"{self.prefix}agent:*",
-                count=100
+        Args:
+            limit: Page size
+            before: Only agents started strictly before this time (ISO or epoch);
+                pass the previous page's last started_at to get the next page
+            after: Only agents started strictly after this time
+            workflow, project, status: Optional filters
+        
+        The most selective filter's index (status, then project, then
+        workflow, else the global index) drives a range scan; any other
+        filters are checked on the fetched hashes. The same page is read
+        from the cold store and the two are merged.
+        """
+        if not self.client:
+            await self.connect()
+        
+        filters = {"status": status, "project": project, "workflow": workflow}
+        driver_kind = next((kind for kind, value in filters.items() if value), None)
+        driver = self._index_key(driver_kind, filters.get(driver_kind))
+        remaining = {k: v for k, v in filters.items() if v and k != driver_kind}
+        
+        max_score = f"({timestamp_score(before)}" if before is not None else "+inf"
+        min_score = f"({timestamp_score(after)}" if after is not None else "-inf"
+        
+        agents = []
+        offset = 0
+        while len(agents) < limit:
+            page_size = limit - len(agents) if not remaining else max(limit, 50)
+            ids = await self.client.zrevrangebyscore(
+                driver, max_score, min_score, start=offset, num=page_size
             )
+            if not ids:
+                break
+            offset += len(ids)
             
-            for key in keys:
-                agent_id = key.decode('utf-8').replace(f"{self.prefix}agent:", '')
-                status = await self.get_agent_status(agent_id)
-                if status:
-                    agents.append(status)
+            for agent in await self.get_agents([i.decode('utf-8') for i in ids]):
+                if all(agent.get(k) == v for k, v in remaining.items()):
+                    agents.append(agent)
             
-            if cursor == 0 or len(agents) >= limit:
+            if len(ids) < page_size:
                 break
+        return await self._merge_cold(agents[:limit], limit, before, after, workflow, project, status)
+    
+    @timed
+    async def flush_completed(self, batch_size: int = 500) -> int:
+        """
+        Move one batch of finished agents to the cold store.
+        
+        Agents are taken off the flush queue, written to SQLite in one
+        transaction (skipped without a cold store), then removed from the
+        Redis indexes with their hash set to expire, unless they were
+        re-registered meanwhile. If the write fails they are put back on
+        the queue.
+        
+        Returns:
+            Number of agents taken off the queue
+        """
+        if not self.client:
+            await self.connect()
+        
+        queue_key = f"{self.prefix}flush_queue"
+        ids = await self.client.lpop(queue_key, batch_size)
+        if not ids:
+            return 0
+        ids = [i.decode('utf-8') for i in ids]
+        
+        # Skip agents whose hash is gone or that were re-registered meanwhile
+        active = await self.client.smismember(f"{self.prefix}active", ids)
+        agents = [
+            agent for agent in await self.get_agents([i for i, a in zip(ids, active) if not a])
+            if agent.get("agent_id") and agent.get("started_at")
+        ]
+        if self.cold_store is not None:
+            try:
+                await asyncio.to_thread(self._save_cold, agents)
+            except Exception:
+                await self.client.rpush(queue_key, *ids)
+                raise
+        
+        if agents:
+            if self._retire_flushed is None:
+                self._retire_flushed = self.client.register_script(RETIRE_FLUSHED_SCRIPT)
+            args = [self.prefix, int(self.completed_ttl)]
+            for agent in agents:
+                args.extend((agent["agent_id"], agent["started_at"]))
+            await self._retire_flushed(args=args, client=self.client)
+        return len(ids)
+    
+    async def ensure_indexes(self) -> int:
+        """
+        Backfill the sorted-set indexes from existing agent hashes.
+        
+        Only does work when the global index is missing (e.g. data written
+        before indexes existed), apart from registering the statuses of
+        existing status indexes once. Returns the number of agents indexed.
+        """
+        if not self.client:
+            await self.connect()
+        if await self.client.exists(self._index_key()):
+            if not await self.client.exists(f"{self.prefix}statuses"):
+                pattern = self._index_key("status", "*")
+                statuses = [key.decode('utf-8').rsplit(':', 1)[-1]
+                            async for key in self.client.scan_iter(match=pattern, count=500)]
+                if statuses:
+                    await self.client.sadd(f"{self.prefix}statuses", *statuses)
+            return 0
+        
+        indexed = 0
+        async for key in self.client.scan_iter(match=f"{self.prefix}agent:*", count=500):
+            agent = self._decode_agent(await self.client.hgetall(key))
+            if not agent or "started_at" not in agent:
+                continue
+            agent_id = key.decode('utf-8').replace(f"{self.prefix}agent:", '')
+            score = timestamp_score(agent["started_at"])
+            pipe = self.client.pipeline(transaction=False)
+            pipe.zadd(self._index_key(), {agent_id: score})
+            for kind in ("workflow", "project", "status"):
+                if agent.get(kind):
+                    pipe.zadd(self._index_key(kind, agent[kind]), {agent_id: score})
+            if agent.get("status"):
+                pipe.sadd(f"{self.prefix}statuses", agent["status"])
+            await pipe.execute()
+            indexed += 1
+        
+        return indexed
+    
+    async def ensure_heartbeats(self) -> int:
+        """
+        Track heartbeats for active agents that have none yet (e.g. agents
+        registered before heartbeat expiry existed), using their last_heartbeat.
+        
+        Returns the number of agents added.
+        """
+        if not self.client:
+            await self.connect()
         
-        # Sort by started_at desc
-        agents.sort(key=lambda x: x.get('started_at', ''), reverse=True)
-        return agents[:limit]
+        agents = await self.get_active_agents()
+        scores = {
+            a["agent_id"]: timestamp_score(a["last_heartbeat"])
+            for a in agents if a.get("agent_id") and a.get("last_heartbeat")
+        }
+        if not scores:
+            return 0
+        return await self.client.zadd(f"{self.prefix}heartbeats", scores, nx=True)
 
 
-# FastAPI app
-app = FastAPI(title="Activation Function Agent Status", version="0.1.0")
-tracker = AgentStatusTracker()
+class EventBroadcaster:
+    """
+    Fan out tracker events from a single subscription to any number of viewers.
+    
+    Each viewer gets its own bounded queue; a viewer that falls too far behind
+    is disconnected (it can reconnect with its last event id) rather than
+    slowing everyone else down.
+    """
+    
+    def __init__(self, tracker: StatusTracker, queue_size: int = 1000):
+        self.tracker = tracker
+        self.queue_size = queue_size
+        self.subscribers: Dict[asyncio.Queue, Dict[str, Optional[str]]] = {}
+        self.task: Optional[asyncio.Task] = None
+        self.events_received = 0
+        self.listeners: List[Callable[[Dict[str, Any]], None]] = []
+    
+    def start(self) -> None:
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+    
+    async def stop(self) -> None:
+        """Stop the subscription and end every viewer's stream."""
+        for queue in list(self.subscribers):
+            self.subscribers.pop(queue, None)
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(None)
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+    
+    async def _run(self) -> None:
+        """Consume the subscription, resubscribing with backoff on errors."""
+        backoff = 0.5
+        while True:
+            try:
+                async for event in self.tracker.subscribe_events():
+                    backoff = 0.5
+                    self.events_received += 1
+                    self._dispatch(event)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️  Event subscription failed: {e}", flush=True)
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 10.0)
+    
+    @staticmethod
+    def _matches(event: Dict[str, Any], filters: Dict[str, Optional[str]]) -> bool:
+        return all(not value or event.get(key) == value for key, value in filters.items())
+    
+    def _dispatch(self, event: Dict[str, Any]) -> None:
+        for listener in self.listeners:
+            listener(event)
+        for queue, filters in list(self.subscribers.items()):
+            if not self._matches(event, filters):
+                continue
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Too slow: drop the viewer, the None tells its stream to end
+                self.subscribers.pop(queue, None)
+                queue.get_nowait()
+                queue.put_nowait(None)
+    
+    async def subscribe(self, agent_id: Optional[str] = None, project: Optional[str] = None,
+                        last_event_id: Optional[str] = None) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """
+        Yield events matching the filters, replaying from the stream first
+        when last_event_id is given. Yields None as a keep-alive tick when
+        idle for 15s.
+        """
+        filters = {"agent_id": agent_id, "project": project}
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        # Subscribe before replaying so nothing published in between is lost
+        self.subscribers[queue] = filters
+        try:
+            last_key = (0, 0)
+            if last_event_id:
+                while True:
+                    backlog = await self.tracker.get_events_since(last_event_id)
+                    for event in backlog:
+                        if self._matches(event, filters):
+                            yield event
+                    if len(backlog) < 1000:
+                        break
+                    last_event_id = backlog[-1]["id"]
+                last_key = event_id_key(backlog[-1]["id"] if backlog else last_event_id)
+            
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=15.0)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if event is None:
+                    return
+                if event_id_key(event["id"]) <= last_key:
+                    continue  # already replayed
+                yield event
+        finally:
+            self.subscribers.pop(queue, None)
 
 
-@app.on_event("startup")
-async def startup():
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware counting HTTP requests and timing them per route.
+    
+    Routes are labelled by their path template (/agents/{agent_id}), so
+    label cardinality stays bounded. Streaming responses are timed until
+    the stream ends.
+    """
+    
+    def __init__(self, app, metrics: MetricsRegistry):
+        self.app = app
+        self.requests = metrics.counter(
+            "agent_status_http_requests_total", "HTTP requests", ("method", "path", "status")
+        )
+        self.latency = metrics.histogram(
+            "agent_status_http_request_seconds", "HTTP request latency", ("method", "path")
+        )
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        start = time.perf_counter()
+        status = [500]
+        
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            self.requests.inc(method, path, str(status[0]))
+            self.latency.observe(time.perf_counter() - start, method, path)
+
+
+class ResponseCache:
+    """
+    Short-TTL cache of rendered responses with request coalescing.
+    
+    Entries live for `ttl` seconds or until `invalidate()` (called on every
+    agent write). Concurrent requests for the same key while it is being
+    fetched wait for that one fetch instead of each hitting Redis. A fetch
+    that started before an invalidation is still returned to its waiters
+    but not cached.
+    """
+    
+    def __init__(self, ttl: float = CACHE_TTL, max_entries: int = 256,
+                 metrics: Optional[MetricsRegistry] = None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.generation = 0
+        self.entries: Dict[Hashable, Tuple[float, int, bytes]] = {}
+        self.inflight: Dict[Tuple[Hashable, int], asyncio.Future] = {}
+        self.lookups = (metrics or MetricsRegistry()).counter(
+            "agent_status_cache_lookups_total", "Read cache lookups by result", ("result",)
+        )
+    
+    def invalidate(self, *_) -> None:
+        self.generation += 1
+        self.entries.clear()
+    
+    async def get_or_fetch(self, key: Hashable, fetch: Callable[[], Awaitable[bytes]]) -> bytes:
+        if self.ttl <= 0:
+            return await fetch()
+        
+        now = time.monotonic()
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] > now and entry[1] == self.generation:
+            self.lookups.inc("hit")
+            return entry[2]
+        
+        generation = self.generation
+        pending = self.inflight.get((key, generation))
+        if pending is not None:
+            self.lookups.inc("coalesced")
+            return await asyncio.shield(pending)
+        
+        self.lookups.inc("miss")
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[(key, generation)] = future
+        try:
+            body = await fetch()
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody was waiting
+            raise
+        finally:
+            self.inflight.pop((key, generation), None)
+        
+        future.set_result(body)
+        if generation == self.generation:
+            if len(self.entries) >= self.max_entries:
+                self.entries.pop(next(iter(self.entries)))
+            self.entries[key] = (time.monotonic() + self.ttl, generation, body)
+        return body
+
+
+def render_json(content: Any) -> bytes:
+    return FastJSONResponse(content).body
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Connect and start background tasks; on shutdown drain them in order."""
     await tracker.connect()
+    await tracker.ensure_indexes()
+    await tracker.ensure_heartbeats()
+    if tracker.cold_store is None and COLD_STORE_DB:
+        try:
+            tracker.cold_store = await asyncio.to_thread(AgentWorkflowLogger, db_path=COLD_STORE_DB)
+        except Exception as e:
+            print(f"⚠️  Cold store {COLD_STORE_DB} unavailable, finished agents will not be kept: {e}",
+                  flush=True)
+    background = [
+        asyncio.create_task(reaper_loop()),
+        asyncio.create_task(flush_loop())
+    ]
+    broadcaster.start()
+    
+    try:
+        yield
+    finally:
+        await broadcaster.stop()
+        for task in background:
+            task.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
+        
+        # Hand finished agents to the cold tier before going away
+        try:
+            await asyncio.wait_for(_flush_all(), timeout=SHUTDOWN_FLUSH_TIMEOUT)
+        except Exception as e:
+            print(f"⚠️  Final cold-tier flush incomplete: {e}", flush=True)
+        
+        await tracker.disconnect()
+        if tracker.cold_store is not None:
+            await asyncio.to_thread(tracker.cold_store.close)
+
+
+# FastAPI app
+app = FastAPI(
+    title="Activation Function Agent Status",
+    version="0.1.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
+)
+tracker = create_tracker()
+app.add_middleware(RequestMetricsMiddleware, metrics=tracker.metrics)
+if GZIP_MIN_SIZE > 0:
+    # Skips text/event-stream, so SSE is not buffered
+    app.add_middleware(GZipMiddleware, minimum_size=GZIP_MIN_SIZE)
+broadcaster = EventBroadcaster(tracker)
+response_cache = ResponseCache(metrics=tracker.metrics)
+tracker.write_listeners.append(response_cache.invalidate)
+# Writes made by other workers/processes arrive as events
+broadcaster.listeners.append(response_cache.invalidate)
+reaper_stats = {"runs": 0, "reaped": 0, "errors": 0, "last_run_at": None, "last_reaped": []}
+flusher_stats = {"runs": 0, "flushed": 0, "errors": 0, "last_run_at": None}
+
+
+async def reaper_loop(interval: float = REAP_INTERVAL):
+    """Periodically mark agents with expired heartbeats as lost."""
+    while True:
+        try:
+            reaped = await tracker.reap_stale_agents()
+            reaper_stats["runs"] += 1
+            reaper_stats["reaped"] += len(reaped)
+            reaper_stats["last_run_at"] = datetime.utcnow().isoformat()
+            if reaped:
+                reaper_stats["last_reaped"] = reaped[-20:]
+                print(f"💀 Reaped {len(reaped)} stale agents", flush=True)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            reaper_stats["errors"] += 1
+            print(f"⚠️  Reaper failed: {e}", flush=True)
+        await asyncio.sleep(interval)
+
 
+async def _flush_all() -> None:
+    """Flush finished agents until the queue is empty."""
+    while True:
+        flushed = await tracker.flush_completed()
+        flusher_stats["flushed"] += flushed
+        if not flushed:
+            return
 
-@app.on_event("shutdown")
-async def shutdown():
-    await tracker.disconnect()
+
+async def flush_loop(interval: float = FLUSH_INTERVAL):
+    """Periodically move finished agents from Redis to the cold store."""
+    while True:
+        try:
+            await _flush_all()
+            flusher_stats["runs"] += 1
+            flusher_stats["last_run_at"] = datetime.utcnow().isoformat()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            flusher_stats["errors"] += 1
+            print(f"⚠️  Cold-tier flush failed: {e}", flush=True)
+        await asyncio.sleep(interval)
 
 
 @app.get("/")
 async def root():
-    return JSONResponse({
+    return FastJSONResponse({
         "service": "activation_function_agent_status",
         "version": "0.1.0",
         "endpoints": [
             {"path": "/agents/active", "method": "GET"},
             {"path": "/agents/all", "method": "GET"},
+            {"path": "/agents/events", "method": "GET"},
+            {"path": "/agents/ws", "method": "WEBSOCKET"},
             {"path": "/agents/{agent_id}", "method": "GET"},
+            {"path": "/agents/{agent_id}/progress", "method": "GET"},
             {"path": "/agents/register", "method": "POST"},
+            {"path": "/agents/bulk", "method": "POST"},
             {"path": "/agents/{agent_id}/status", "method": "PUT"},
-            {"path": "/agents/{agent_id}/complete", "method": "POST"}
+            {"path": "/agents/{agent_id}/heartbeat", "method": "POST"},
+            {"path": "/agents/{agent_id}/complete", "method": "POST"},
+            {"path": "/reaper", "method": "GET"},
+            {"path": "/storage", "method": "GET"},
+            {"path": "/metrics", "method": "GET"}
         ]
     })
 
@@ -207,23 +1416,103 @@ async def root():
 @app.get("/agents/active")
 async def get_active_agents():
     """Get all currently active agents."""
-    try:
+    async def fetch() -> bytes:
         agents = await tracker.get_active_agents()
-        return JSONResponse({"status": "ok", "count": len(agents), "agents": agents})
+        return render_json({"status": "ok", "count": len(agents), "agents": agents})
+    
+    try:
+        body = await response_cache.get_or_fetch(("active",), fetch)
+        return Response(body, media_type="application/json")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/agents/all")
-async def get_all_agents(limit: int = 100):
-    """Get all agents (active and completed)."""
+async def get_all_agents(limit: int = Query(100, ge=1, le=1000), before: Optional[str] = None,
+                         after: Optional[str] = None, workflow: Optional[str] = None,
+                         project: Optional[str] = None, status: Optional[str] = None):
+    """
+    Get all agents (active and completed), newest first.
+    
+    Paginate by passing the returned next_before as before.
+    """
+    for name, cursor in (("before", before), ("after", after)):
+        if cursor is not None:
+            try:
+                timestamp_score(cursor)
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"{name} must be an ISO timestamp or epoch seconds")
+    
+    async def fetch() -> bytes:
+        agents = await tracker.get_all_agents(
+            limit=limit,
+            before=before,
+            after=after,
+            workflow=workflow,
+            project=project,
+            status=status
+        )
+        next_before = agents[-1].get("started_at") if len(agents) == limit else None
+        return render_json({
+            "status": "ok",
+            "count": len(agents),
+            "agents": agents,
+            "next_before": next_before
+        })
+    
     try:
-        agents = await tracker.get_all_agents(limit=limit)
-        return JSONResponse({"status": "ok", "count": len(agents), "agents": agents})
+        key = ("all", limit, before, after, workflow, project, status)
+        body = await response_cache.get_or_fetch(key, fetch)
+        return Response(body, media_type="application/json")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/agents/events")
+async def stream_events(request: Request, agent_id: Optional[str] = None,
+                        project: Optional[str] = None, last_event_id: Optional[str] = None):
+    """
+    Server-Sent Events stream of agent changes.
+    
+    Resumes after last_event_id (query param or the Last-Event-ID header that
+    browsers send on reconnect) as long as the event is still in the stream.
+    """
+    last_event_id = last_event_id or request.headers.get("last-event-id")
+    
+    async def event_source():
+        async with aclosing(broadcaster.subscribe(agent_id, project, last_event_id)) as events:
+            async for event in events:
+                if await request.is_disconnected():
+                    break
+                if event is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"id: {event['id']}\nevent: {event['type']}\ndata: {dumps(event)}\n\n"
+    
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.websocket("/agents/ws")
+async def websocket_events(websocket: WebSocket, agent_id: Optional[str] = None,
+                           project: Optional[str] = None, last_event_id: Optional[str] = None):
+    """WebSocket stream of agent changes (same filters and resume as /agents/events)."""
+    await websocket.accept()
+    try:
+        async with aclosing(broadcaster.subscribe(agent_id, project, last_event_id)) as events:
+            async for event in events:
+                if event is None:
+                    await websocket.send_text('{"type": "keep-alive"}')
+                    continue
+                await websocket.send_text(dumps(event))
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+
+
 @app.get("/agents/{agent_id}")
 async def get_agent(agent_id: str):
     """Get status for a specific agent."""
@@ -231,7 +1520,33 @@ async def get_agent(agent_id: str):
         status = await tracker.get_agent_status(agent_id)
         if not status:
             raise HTTPException(status_code=404, detail="Agent not found")
-        return JSONResponse({"status": "ok", "agent": status})
+        return FastJSONResponse({"status": "ok", "agent": status})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/agents/{agent_id}/progress")
+async def get_agent_progress(agent_id: str, limit: int = 100):
+    """
+    Recent progress history of an agent with a throughput/ETA estimate.
+    
+    History is kept while the agent is live and for a short while after
+    it finishes.
+    """
+    try:
+        limit = max(1, min(limit, PROGRESS_MAXLEN))
+        history = await tracker.get_progress_history(agent_id, limit=limit)
+        if not history and not await tracker.get_agent_status(agent_id):
+            raise HTTPException(status_code=404, detail="Agent not found")
+        return FastJSONResponse({
+            "status": "ok",
+            "agent_id": agent_id,
+            "count": len(history),
+            "history": history,
+            "estimate": estimate_progress(history)
+        })
     except HTTPException:
         raise
     except Exception as e:
@@ -254,24 +1569,71 @@ async def register_agent(payload: Dict[str, Any]):
             metadata=payload.get("metadata")
         )
         
-        return JSONResponse({"status": "ok", "agent_id": agent_id})
+        return FastJSONResponse({"status": "ok", "agent_id": agent_id})
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/agents/bulk")
+async def bulk_agents(payload: Dict[str, Any]):
+    """
+    Apply a batch of operations in one Redis transaction.
+    
+    Body: {"operations": [{"op": "register" | "update" | "heartbeat" | "complete",
+    "agent_id": ..., <fields of the matching single-agent endpoint>}, ...]}
+    """
+    operations = payload.get("operations")
+    if not isinstance(operations, list):
+        raise HTTPException(status_code=400, detail="operations list required")
+    if len(operations) > MAX_BULK_OPERATIONS:
+        raise HTTPException(status_code=413,
+                            detail=f"at most {MAX_BULK_OPERATIONS} operations per request")
+    if not all(isinstance(op, dict) for op in operations):
+        raise HTTPException(status_code=400, detail="operations must be objects")
+    
+    try:
+        results = await tracker.apply_bulk(operations)
+        failed = sum(1 for r in results if not r["ok"])
+        return FastJSONResponse({
+            "status": "ok" if not failed else "partial",
+            "count": len(results),
+            "failed": failed,
+            "results": results
+        })
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.put("/agents/{agent_id}/status")
 async def update_agent_status(agent_id: str, payload: Dict[str, Any]):
     """Update agent status."""
     try:
-        await tracker.update_status(
+        updated = await tracker.update_status(
             agent_id=agent_id,
             status=payload.get("status", "running"),
             current_task=payload.get("current_task"),
             progress=payload.get("progress")
         )
-        return JSONResponse({"status": "ok", "agent_id": agent_id})
+        if not updated:
+            raise HTTPException(status_code=404, detail="Agent not found")
+        return FastJSONResponse({"status": "ok", "agent_id": agent_id})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/agents/{agent_id}/heartbeat")
+async def heartbeat_agent(agent_id: str):
+    """Refresh an agent's heartbeat (keeps it from being reaped)."""
+    try:
+        if not await tracker.heartbeat(agent_id):
+            raise HTTPException(status_code=404, detail="Agent not active")
+        return FastJSONResponse({"status": "ok", "agent_id": agent_id})
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -280,17 +1642,132 @@ async def update_agent_status(agent_id: str, payload: Dict[str, Any]):
 async def complete_agent(agent_id: str, payload: Dict[str, Any]):
     """Mark agent as completed."""
     try:
-        await tracker.complete_agent(
+        completed = await tracker.complete_agent(
             agent_id=agent_id,
             status=payload.get("status", "completed"),
             result_summary=payload.get("result_summary"),
             error=payload.get("error")
         )
-        return JSONResponse({"status": "ok", "agent_id": agent_id})
+        if not completed:
+            raise HTTPException(status_code=404, detail="Agent not found")
+        return FastJSONResponse({"status": "ok", "agent_id": agent_id})
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-if __name__ == "__main__":
-    uvicorn.run(app, host="127.0.0.1", port=8082, log_level="info")
+@app.get("/reaper")
+async def get_reaper_stats():
+    """Stale-agent reaper metrics."""
+    try:
+        stats = await tracker.get_reaper_stats()
+        stats.update(reaper_stats)
+        return FastJSONResponse({"status": "ok", "reaper": stats})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/storage")
+async def get_storage_stats():
+    """Hot/cold tier sizes and flusher metrics."""
+    try:
+        stats = await tracker.get_storage_stats()
+        stats["flusher"] = flusher_stats
+        return FastJSONResponse({"status": "ok", "storage": stats})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics (text exposition format)."""
+    try:
+        metrics = tracker.metrics
+        
+        storage = await tracker.get_storage_stats()
+        agents = metrics.gauge("agent_status_agents", "Agents held in Redis", ("set",))
+        agents.set(storage["active"], "active")
+        agents.set(storage["indexed"], "indexed")
+        agents.set(storage["pending_flush"], "pending_flush")
+        
+        by_status = metrics.gauge("agent_status_agents_by_status", "Agents per status and tier",
+                                  ("tier", "status"))
+        by_status.clear()
+        for tier, counts in (await tracker.get_status_counts()).items():
+            for status, count in counts.items():
+                by_status.set(count, tier, status)
+        
+        pool = metrics.gauge("agent_status_redis_pool_connections", "Redis connection pool", ("state",))
+        for state, count in (await tracker.get_pool_stats()).items():
+            pool.set(count, state)
+        
+        totals = metrics.counter("agent_status_background_total",
+                                 "Background task counters", ("task", "counter"))
+        for task, stats in (("reaper", reaper_stats), ("flusher", flusher_stats)):
+            for counter in ("runs", "errors", "reaped", "flushed"):
+                if counter in stats:
+                    totals.set_total(stats[counter], task, counter)
+        totals.set_total(broadcaster.events_received, "broadcaster", "events")
+        metrics.gauge("agent_status_event_subscribers", "Connected SSE/WebSocket viewers").set(
+            len(broadcaster.subscribers)
+        )
+        
+        return Response(metrics.render(), media_type=MetricsRegistry.CONTENT_TYPE)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def main():
+    """Run the status server (several worker processes with --workers)."""
+    parser = argparse.ArgumentParser(description="Agent status server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8082)
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes")
+    parser.add_argument("--redis-url", default=REDIS_URL, help="Redis URL (env AGENT_STATUS_REDIS_URL)")
+    parser.add_argument("--backend", default=os.environ.get("AGENT_STATUS_BACKEND"),
+                        help="memory:// or sqlite:///path.db for the embedded backend, "
+                             "or a Redis URL (default: --redis-url; env AGENT_STATUS_BACKEND)")
+    parser.add_argument("--pool-size", type=int, default=REDIS_POOL_SIZE,
+                        help="Redis connections per worker (env AGENT_STATUS_REDIS_POOL_SIZE)")
+    parser.add_argument("--cold-db", default=COLD_STORE_DB,
+                        help="SQLite DB finished agents are flushed to; unset lets them expire "
+                             "from the hot tier (env AGENT_STATUS_COLD_DB)")
+    parser.add_argument("--gzip-min-size", type=int, default=GZIP_MIN_SIZE,
+                        help="Compress responses larger than this many bytes, 0 to disable "
+                             "(env AGENT_STATUS_GZIP_MIN_SIZE)")
+    parser.add_argument("--cache-ttl", type=float, default=CACHE_TTL,
+                        help="Seconds /agents/active and /agents/all responses are cached, 0 to disable "
+                             "(env AGENT_STATUS_CACHE_TTL)")
+    parser.add_argument("--access-log", action="store_true", help="Log every request")
+    parser.add_argument("--log-level", default="info")
+    
+    args = parser.parse_args()
+    backend = args.backend or args.redis_url
+    if is_embedded_backend(backend) and args.workers > 1:
+        parser.error("the embedded backend lives in one process; use --workers 1 or Redis")
+    
+    # Workers import the module fresh, so settings travel via the environment
+    os.environ["AGENT_STATUS_REDIS_URL"] = args.redis_url
+    os.environ["AGENT_STATUS_BACKEND"] = backend
+    os.environ["AGENT_STATUS_REDIS_POOL_SIZE"] = str(args.pool_size)
+    if args.cold_db:
+        os.environ["AGENT_STATUS_COLD_DB"] = args.cold_db
+    os.environ["AGENT_STATUS_GZIP_MIN_SIZE"] = str(args.gzip_min_size)
+    os.environ["AGENT_STATUS_CACHE_TTL"] = str(args.cache_ttl)
+    
+    uvicorn.run(
+        "agent_status_server:app",
+        app_dir=os.path.dirname(os.path.abspath(__file__)),
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        log_level=args.log_level,
+        access_log=args.access_log,
+        # SSE/WebSocket viewers never finish on their own
+        timeout_graceful_shutdown=10
+    )
+
+
+if __name__ == "__main__":
+    main()
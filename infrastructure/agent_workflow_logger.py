@@ -1,24 +1,336 @@
 """
 Simple SQLite logger for cursor-agent and workflow calls.
 Tracks agent invocations, workflow runs, and outcomes.
+
+The logger keeps one long-lived WAL-mode connection and buffers writes in
+memory, so logging an event costs microseconds instead of an fsync. Buffered
+writes are committed in one transaction when `flush_size` writes are pending,
+when `flush_interval` seconds have passed, when a `batch()` block exits,
+before any read, and on `close()`.
+
+With `async_writes=True` the calling thread never touches SQLite: writes are
+put on a bounded queue and a dedicated writer thread drains it, so a database
+locked by another run cannot stall an orchestrator. When the queue is full the
+`overflow` policy decides whether to block, drop the new record or drop the
+oldest queued record; drops are counted in `stats()`.
+
+Prompts are stored once per distinct text in a content-addressed
+`prompt_blobs` table (SHA-256 key, zstd- or zlib-compressed); `agent_calls`
+rows reference them by hash and reads decompress transparently.
+
+Old runs can be moved out of the hot tables with `archive_runs()` (see
+agent_log_retention.py for policies). Archived rows live in compressed
+columnar files indexed by `archived_runs`; `get_run_details`,
+`get_workflow_runs(include_archived=True)` and `get_events` read through to
+them.
+
+Finished agents from the Redis status tracker (agent_status_server.py) are
+flushed into `agent_statuses`, the cold tier behind its live Redis data.
 """
 
+import atexit
+import functools
+import hashlib
+import os
+import sys
 import sqlite3
+import zlib
 import json
+import queue
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterator, List, Tuple
 from pathlib import Path
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+SYNCHRONOUS_LEVELS = ("OFF", "NORMAL", "FULL", "EXTRA")
+OVERFLOW_POLICIES = ("block", "drop_new", "drop_oldest")
+
+# Queue sentinel telling the writer thread to exit
+_STOP = object()
+
+# Statuses counted as success/failure in the analytics API
+SUCCESS_STATUSES = ("success", "completed")
+FAILURE_STATUSES = ("failed", "error")
+PERCENTILES = (50, 95, 99)
+
+# Marker used in place of SQL for agent call inserts: the prompt is hashed
+# and stored as a blob when the write is committed.
+_INSERT_AGENT_CALL = "-- insert agent call"
+
+# agent_calls columns in their original order, with the prompt resolved
+AGENT_CALL_COLUMNS = """
+    c.call_id, c.run_id, c.agent_type,
+    decompress_prompt(b.codec, b.data) AS prompt,
+    c.started_at, c.completed_at, c.status, c.model,
+    c.output_summary, c.error_message, c.duration_ms
+"""
+
+
+def prompt_hash(prompt: str) -> str:
+    """Content address of a prompt."""
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+def _compress(raw: bytes) -> Tuple[str, bytes]:
+    """Compress bytes, preferring zstd when available. Returns (codec, data)."""
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=10).compress(raw)
+    return "zlib", zlib.compress(raw, 9)
+
+
+def _decompress(codec: str, data: bytes) -> bytes:
+    if codec == "zlib":
+        return zlib.decompress(data)
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed data")
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError(f"Unknown codec: {codec}")
+
+
+def compress_prompt(prompt: str) -> Tuple[str, bytes]:
+    """Compress a prompt. Returns (codec, data)."""
+    return _compress(prompt.encode("utf-8"))
+
+
+def decompress_prompt(codec: Optional[str], data: Optional[bytes]) -> Optional[str]:
+    """Inverse of compress_prompt (registered as a SQL function on the connection)."""
+    if data is None:
+        return None
+    return _decompress(codec, data).decode("utf-8")
+
+
+# Archive files: a header line "<magic> <codec> <index size>", a compressed
+# JSON index, then one compressed frame per (run, table) holding that run's
+# rows column by column. The index maps each run to its frames' offsets, so
+# reading one run decompresses only that run. Version 1 files ("AWLA1", one
+# compressed document for all runs) are still readable.
+ARCHIVE_MAGIC = "AWLA2"
+ARCHIVE_MAGIC_V1 = "AWLA1"
+ARCHIVED_TABLES = ("workflow_runs", "agent_calls", "artifacts", "agent_events")
+
+
+def _encode_columns(rows: List[tuple], columns: List[str]) -> bytes:
+    data = [list(values) for values in zip(*rows)] if rows else [[] for _ in columns]
+    return json.dumps({"rows": len(rows), "data": data}, separators=(",", ":")).encode("utf-8")
+
+
+def _decode_columns(raw: bytes) -> List[tuple]:
+    doc = json.loads(raw)
+    return list(zip(*doc["data"])) if doc["rows"] else []
+
+
+def write_archive(path: str, tables: Dict[str, Tuple[List[str], List[tuple]]]) -> None:
+    """Write {table: (columns, rows)} to a compressed archive file, framed per run."""
+    by_run: Dict[str, Dict[str, List[tuple]]] = {}
+    for name, (columns, rows) in tables.items():
+        run_index = columns.index("run_id")
+        for row in rows:
+            by_run.setdefault(row[run_index], {}).setdefault(name, []).append(row)
+    
+    codec = None
+    frames = []
+    offset = 0
+    runs = {}
+    for run_id, run_tables in by_run.items():
+        runs[run_id] = {}
+        for name, rows in run_tables.items():
+            codec, frame = _compress(_encode_columns(rows, tables[name][0]))
+            runs[run_id][name] = [offset, len(frame)]
+            frames.append(frame)
+            offset += len(frame)
+    index = {"columns": {name: columns for name, (columns, _) in tables.items()}, "runs": runs}
+    codec, index_data = _compress(json.dumps(index, separators=(",", ":")).encode("utf-8"))
+    
+    # Write-then-rename so a crash never leaves a half-written archive
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(f"{ARCHIVE_MAGIC} {codec} {len(index_data)}\n".encode("ascii"))
+        f.write(index_data)
+        for frame in frames:
+            f.write(frame)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+@functools.lru_cache(maxsize=64)
+def _archive_index(path: str, mtime: float) -> Tuple[str, str, int, Dict[str, Any]]:
+    """(magic, codec, offset of the first frame, index) of an archive; indexes are small."""
+    with open(path, "rb") as f:
+        header = f.readline().decode("ascii").split()
+        if header[0] == ARCHIVE_MAGIC_V1:
+            return header[0], header[1], 0, {}
+        if header[0] != ARCHIVE_MAGIC:
+            raise ValueError(f"Not an agent log archive: {path}")
+        codec, index_size = header[1], int(header[2])
+        index = json.loads(_decompress(codec, f.read(index_size)))
+        return header[0], codec, f.tell(), index
+
+
+def _read_archive_v1(path: str) -> Dict[str, Tuple[List[str], List[tuple]]]:
+    with open(path, "rb") as f:
+        _, codec = f.readline().decode("ascii").split()
+        doc = json.loads(_decompress(codec, f.read()))
+    tables = {}
+    for name, table in doc["tables"].items():
+        rows = list(zip(*table["data"])) if table["rows"] else []
+        tables[name] = (table["columns"], rows)
+    return tables
+
+
+def read_archived_run(path: str, run_id: str,
+                      tables: Tuple[str, ...] = ARCHIVED_TABLES) -> Dict[str, Tuple[List[str], List[tuple]]]:
+    """
+    One run's rows from an archive: {table: (columns, rows)} for the given tables.
+    
+    Only that run's frames are read and decompressed.
+    """
+    magic, codec, data_start, index = _archive_index(path, os.path.getmtime(path))
+    if magic == ARCHIVE_MAGIC_V1:
+        result = {}
+        for name, (columns, rows) in _read_archive_v1(path).items():
+            if name in tables:
+                run_index = columns.index("run_id")
+                result[name] = (columns, [row for row in rows if row[run_index] == run_id])
+        return result
+    
+    frames = index["runs"].get(run_id, {})
+    result = {}
+    with open(path, "rb") as f:
+        for name in tables:
+            columns = index["columns"][name]
+            if name not in frames:
+                result[name] = (columns, [])
+                continue
+            offset, size = frames[name]
+            f.seek(data_start + offset)
+            result[name] = (columns, _decode_columns(_decompress(codec, f.read(size))))
+    return result
+
+
+def read_archive(path: str) -> Dict[str, Tuple[List[str], List[tuple]]]:
+    """Every run in an archive (for inspection; tools read single runs with read_archived_run)."""
+    magic, _, _, index = _archive_index(path, os.path.getmtime(path))
+    if magic == ARCHIVE_MAGIC_V1:
+        return _read_archive_v1(path)
+    tables = {name: (columns, []) for name, columns in index["columns"].items()}
+    for run_id in index["runs"]:
+        for name, (_, rows) in read_archived_run(path, run_id, tuple(tables)).items():
+            tables[name][1].extend(rows)
+    return tables
+
 
 class AgentWorkflowLogger:
-    def __init__(self, db_path: str = "/Users/cstein/code/activation_function_agent/agent_logs.db"):
+    # Ordered schema migrations applied on top of the base tables.
+    # PRAGMA user_version records how many have been applied; append new
+    # entries, never reorder or remove existing ones.
+    MIGRATIONS = (
+        "_migration_add_indexes",
+        "_migration_prompt_blobs",
+        "_migration_agent_events",
+        "_migration_archived_runs",
+        "_migration_agent_statuses",
+    )
+    
+    # Allowed group_by values for the analytics API -> SQL expression
+    CALL_STATS_GROUPS = {
+        "workflow": "r.workflow_name",
+        "model": "c.model",
+        "agent_type": "c.agent_type"
+    }
+    RUN_STATS_GROUPS = {
+        "workflow": "r.workflow_name",
+        "project": "r.project_name",
+        "model": "r.model"
+    }
+    
+    def __init__(self, db_path: str = "/Users/cstein/code/activation_function_agent/agent_logs.db",
+                 synchronous: str = "NORMAL", flush_size: int = 100,
+                 flush_interval: float = 1.0, busy_timeout_ms: int = 5000,
+                 async_writes: bool = False, queue_size: int = 10000,
+                 overflow: str = "block"):
+        """
+        Args:
+            db_path: SQLite database file
+            synchronous: SQLite sync level (OFF, NORMAL, FULL, EXTRA). NORMAL is
+                durable against application crashes in WAL mode.
+            flush_size: Commit once this many writes are pending
+            flush_interval: Commit pending writes at least this often (seconds).
+                0 disables the background flusher.
+            busy_timeout_ms: How long to wait on a lock held by another process
+            async_writes: Hand writes to a background writer thread
+            queue_size: Maximum number of queued writes in async mode
+            overflow: What to do when the queue is full (block, drop_new, drop_oldest)
+        """
+        synchronous = synchronous.upper()
+        if synchronous not in SYNCHRONOUS_LEVELS:
+            raise ValueError(f"Unknown synchronous level: {synchronous}")
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        
         self.db_path = db_path
+        self.synchronous = synchronous
+        self.flush_size = max(1, flush_size)
+        self.flush_interval = flush_interval
+        self.async_writes = async_writes
+        self.overflow = overflow
+        
+        # One shared connection, serialized by a re-entrant lock. Transactions
+        # are managed explicitly (isolation_level=None).
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute(f"PRAGMA busy_timeout = {int(busy_timeout_ms)}")
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute(f"PRAGMA synchronous = {synchronous}")
+        self._conn.create_function("decompress_prompt", 2, decompress_prompt, deterministic=True)
+        
+        self._pending = []
+        self.failed_writes = 0
+        self._first_pending_at = 0.0
+        self._batch_depth = 0
+        self._closed = False
+        self._local = threading.local()
+        self._vacuum_after_init = False
+        
         self._init_db()
+        if self._vacuum_after_init:
+            # Reclaim the space freed by a one-shot data migration
+            self._conn.execute("VACUUM")
+        
+        self._stop_flusher = threading.Event()
+        self._flusher = None
+        self._writer = None
+        self._stats_lock = threading.Lock()
+        self.dropped_writes = 0
+        
+        if async_writes:
+            self._queue = queue.Queue(maxsize=queue_size)
+            self._writer = threading.Thread(
+                target=self._writer_loop, name="agent-log-writer", daemon=True
+            )
+            self._writer.start()
+        elif flush_interval > 0:
+            self._flusher = threading.Thread(
+                target=self._flush_loop, name="agent-log-flusher", daemon=True
+            )
+            self._flusher.start()
+        
+        atexit.register(self.close)
     
     def _init_db(self):
         """Initialize database schema if it doesn't exist."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = self._conn.cursor()
+        # IMMEDIATE so concurrent processes don't race on migrations
+        cursor.execute("BEGIN IMMEDIATE")
         
         # Workflow runs table
         cursor.execute("""
@@ -67,16 +379,450 @@ class AgentWorkflowLogger:
             )
         """)
         
-        conn.commit()
-        conn.close()
+        self._migrate(cursor)
+        cursor.execute("COMMIT")
+    
+    def _migrate(self, cursor) -> None:
+        """Apply pending schema migrations (inside the _init_db transaction)."""
+        version = cursor.execute("PRAGMA user_version").fetchone()[0]
+        for number in range(version, len(self.MIGRATIONS)):
+            getattr(self, self.MIGRATIONS[number])(cursor)
+            cursor.execute(f"PRAGMA user_version = {number + 1}")
+    
+    def _migration_add_indexes(self, cursor) -> None:
+        """Indexes for run listing, per-run lookups and time-bounded analytics."""
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_workflow_runs_started
+            ON workflow_runs(started_at, run_id)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_workflow_runs_project
+            ON workflow_runs(project_name, started_at, run_id)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_agent_calls_run
+            ON agent_calls(run_id)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_agent_calls_started
+            ON agent_calls(started_at)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_artifacts_run
+            ON artifacts(run_id)
+        """)
+    
+    def _migration_prompt_blobs(self, cursor) -> None:
+        """
+        Move prompt text out of agent_calls into content-addressed blobs.
+        
+        agent_calls is rebuilt with a prompt_hash column in place of prompt;
+        existing prompts are hashed, compressed and deduplicated on the way.
+        """
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS prompt_blobs (
+                prompt_hash TEXT PRIMARY KEY,
+                codec TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                data BLOB NOT NULL
+            )
+        """)
+        
+        cursor.execute("""
+            CREATE TABLE agent_calls_new (
+                call_id TEXT PRIMARY KEY,
+                run_id TEXT,
+                agent_type TEXT NOT NULL,
+                prompt_hash TEXT NOT NULL,
+                started_at TEXT NOT NULL,
+                completed_at TEXT,
+                status TEXT NOT NULL,
+                model TEXT,
+                output_summary TEXT,
+                error_message TEXT,
+                duration_ms INTEGER,
+                FOREIGN KEY (run_id) REFERENCES workflow_runs(run_id),
+                FOREIGN KEY (prompt_hash) REFERENCES prompt_blobs(prompt_hash)
+            )
+        """)
+        
+        rows = self._conn.execute("""
+            SELECT call_id, run_id, agent_type, prompt, started_at, completed_at,
+                   status, model, output_summary, error_message, duration_ms
+            FROM agent_calls
+        """)
+        migrated = 0
+        for row in rows:
+            key = self._store_prompt(row[3], cursor)
+            cursor.execute(
+                "INSERT INTO agent_calls_new VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (*row[:3], key, *row[4:])
+            )
+            migrated += 1
+        
+        cursor.execute("DROP TABLE agent_calls")
+        cursor.execute("ALTER TABLE agent_calls_new RENAME TO agent_calls")
+        cursor.execute("CREATE INDEX idx_agent_calls_run ON agent_calls(run_id)")
+        cursor.execute("CREATE INDEX idx_agent_calls_started ON agent_calls(started_at)")
+        
+        if migrated:
+            print(f"Migrated {migrated} agent call prompts to prompt_blobs", file=sys.stderr)
+            self._vacuum_after_init = True
+    
+    def _migration_agent_events(self, cursor) -> None:
+        """
+        Tables for parsed cursor-agent stream-json events.
+        
+        Events are keyed by (source file, byte offset of the line), which
+        makes re-ingesting a file region idempotent.
+        """
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS agent_events (
+                source_path TEXT NOT NULL,
+                byte_offset INTEGER NOT NULL,
+                run_id TEXT,
+                call_id TEXT,
+                event_type TEXT NOT NULL,
+                subtype TEXT,
+                session_id TEXT,
+                ingested_at TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                PRIMARY KEY (source_path, byte_offset),
+                FOREIGN KEY (run_id) REFERENCES workflow_runs(run_id),
+                FOREIGN KEY (call_id) REFERENCES agent_calls(call_id)
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_agent_events_run ON agent_events(run_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_agent_events_call ON agent_events(call_id)")
+        
+        # Resume points for incremental ingestion
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS ingest_offsets (
+                source_path TEXT PRIMARY KEY,
+                byte_offset INTEGER NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+        """)
+    
+    def _migration_archived_runs(self, cursor) -> None:
+        """Index of runs moved to archive files by archive_runs()."""
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS archived_runs (
+                run_id TEXT PRIMARY KEY,
+                workflow_name TEXT NOT NULL,
+                project_name TEXT NOT NULL,
+                started_at TEXT NOT NULL,
+                status TEXT NOT NULL,
+                archive_path TEXT NOT NULL,
+                archived_at TEXT NOT NULL
+            )
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_archived_runs_started
+            ON archived_runs(started_at, run_id)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_archived_runs_project
+            ON archived_runs(project_name, started_at, run_id)
+        """)
+        # Needed to find prompt blobs no longer referenced after archiving
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_agent_calls_prompt
+            ON agent_calls(prompt_hash)
+        """)
+    
+    def _migration_agent_statuses(self, cursor) -> None:
+        """
+        Cold tier for the status tracker: finished agents flushed from Redis.
+        
+        `data` holds the full agent record as JSON; the other columns are
+        copies for filtering. started_ts (epoch seconds) matches the Redis
+        index scores so both tiers page with the same cursors.
+        """
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS agent_statuses (
+                agent_id TEXT PRIMARY KEY,
+                agent_type TEXT,
+                workflow TEXT,
+                project TEXT,
+                status TEXT,
+                started_at TEXT,
+                started_ts REAL NOT NULL,
+                completed_at TEXT,
+                data TEXT NOT NULL
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_agent_statuses_started ON agent_statuses(started_ts)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_agent_statuses_workflow ON agent_statuses(workflow, started_ts)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_agent_statuses_project ON agent_statuses(project, started_ts)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_agent_statuses_status ON agent_statuses(status, started_ts)")
+    
+    def _store_prompt(self, prompt: str, cursor=None) -> str:
+        """Insert a prompt blob unless it is already stored. Returns its hash."""
+        cursor = cursor or self._conn
+        key = prompt_hash(prompt)
+        exists = cursor.execute(
+            "SELECT 1 FROM prompt_blobs WHERE prompt_hash = ?", (key,)
+        ).fetchone()
+        if not exists:
+            codec, data = compress_prompt(prompt)
+            cursor.execute(
+                "INSERT INTO prompt_blobs (prompt_hash, codec, size, data) VALUES (?, ?, ?, ?)",
+                (key, codec, len(prompt), data)
+            )
+        return key
+    
+    def _insert_agent_call(self, params: tuple) -> None:
+        """
+        Commit-time half of log_agent_call.
+        
+        The prompt blob and the call row are written under one savepoint, so
+        a rejected row (e.g. duplicate call_id) leaves no orphaned blob.
+        """
+        call_id, run_id, agent_type, prompt = params[:4]
+        self._conn.execute("SAVEPOINT agent_call")
+        try:
+            key = self._store_prompt(prompt)
+            self._conn.execute("""
+                INSERT INTO agent_calls 
+                (call_id, run_id, agent_type, prompt_hash, started_at, status, model)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (call_id, run_id, agent_type, key, *params[4:]))
+        except Exception:
+            self._conn.execute("ROLLBACK TO agent_call")
+            self._conn.execute("RELEASE agent_call")
+            raise
+        self._conn.execute("RELEASE agent_call")
+    
+    # ------------------------------------------------------------------
+    # Transaction handling
+    # ------------------------------------------------------------------
+    
+    def _write(self, sql: str, params: tuple) -> None:
+        """Queue a write; it is committed with the next flush."""
+        if self.async_writes:
+            if self._closed:
+                raise RuntimeError("AgentWorkflowLogger is closed")
+            buffer = getattr(self._local, "batch", None)
+            if buffer is not None:
+                buffer.append((sql, params))
+            else:
+                self._enqueue([(sql, params)])
+            return
+        
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("AgentWorkflowLogger is closed")
+            if not self._pending:
+                self._first_pending_at = time.monotonic()
+            self._pending.append((sql, params))
+            
+            if self._batch_depth == 0 and len(self._pending) >= self.flush_size:
+                self._commit()
+    
+    def _commit(self) -> None:
+        """
+        Write all pending statements in one short transaction.
+
+        Statements are buffered in memory between flushes, so the database
+        write lock is only held while a flush runs, never while the caller
+        is idle. Caller must hold the lock.
+        """
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        
+        try:
+            self._conn.execute("BEGIN IMMEDIATE")
+        except sqlite3.OperationalError:
+            # Database locked past busy_timeout: keep the writes for next time
+            self._pending = pending + self._pending
+            raise
+        
+        try:
+            for sql, params in pending:
+                try:
+                    if sql is _INSERT_AGENT_CALL:
+                        self._insert_agent_call(params)
+                    else:
+                        self._conn.execute(sql, params)
+                except sqlite3.IntegrityError as e:
+                    # One bad row (e.g. duplicate id) must not drop the batch
+                    self.failed_writes += 1
+                    print(f"Warning: agent log write failed: {e}", file=sys.stderr)
+            self._conn.execute("COMMIT")
+        except Exception:
+            if self._conn.in_transaction:
+                self._conn.execute("ROLLBACK")
+            raise
+    
+    def flush(self) -> None:
+        """Commit all pending writes (waiting for the writer queue to drain)."""
+        if self.async_writes and self._writer is not None:
+            self._queue.join()
+        with self._lock:
+            if not self._closed:
+                self._commit()
+    
+    def _enqueue(self, statements: list) -> None:
+        """Put a group of statements on the writer queue, applying the overflow policy."""
+        if self.overflow == "block":
+            self._queue.put(statements)
+            return
+        
+        while True:
+            try:
+                self._queue.put_nowait(statements)
+                return
+            except queue.Full:
+                if self.overflow == "drop_new":
+                    self._count_dropped(len(statements))
+                    return
+            
+            # drop_oldest: evict one queued group and retry
+            try:
+                evicted = self._queue.get_nowait()
+            except queue.Empty:
+                continue
+            self._queue.task_done()
+            if evicted is _STOP:
+                # Never lose the shutdown signal
+                self._queue.put(evicted)
+                return
+            self._count_dropped(len(evicted))
+    
+    def _count_dropped(self, n: int) -> None:
+        with self._stats_lock:
+            self.dropped_writes += n
+    
+    def _writer_loop(self) -> None:
+        """Background thread draining the queue into batched transactions."""
+        # Wake up periodically so writes left pending by a locked database
+        # are retried even when no new records arrive.
+        retry_interval = self.flush_interval or 1.0
+        stopping = False
+        
+        while not stopping:
+            try:
+                groups = [self._queue.get(timeout=retry_interval)]
+            except queue.Empty:
+                groups = []
+            
+            # Drain whatever else is already queued, up to flush_size statements
+            drained = sum(len(g) for g in groups if g is not _STOP)
+            while drained < self.flush_size:
+                try:
+                    group = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                groups.append(group)
+                if group is not _STOP:
+                    drained += len(group)
+            
+            with self._lock:
+                for group in groups:
+                    if group is _STOP:
+                        stopping = True
+                    else:
+                        self._pending.extend(group)
+                try:
+                    self._commit()
+                except sqlite3.Error as e:
+                    print(f"Warning: agent log write failed: {e}", file=sys.stderr)
+            
+            for _ in groups:
+                self._queue.task_done()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Return writer statistics (queue depth, dropped and failed writes)."""
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            "async_writes": self.async_writes,
+            "queued": self._queue.qsize() if self.async_writes else 0,
+            "pending": pending,
+            "dropped_writes": self.dropped_writes,
+            "failed_writes": self.failed_writes
+        }
+    
+    def _flush_loop(self) -> None:
+        """Background thread enforcing the time-based flush."""
+        interval = self.flush_interval
+        while not self._stop_flusher.wait(interval / 2):
+            with self._lock:
+                if self._closed or self._batch_depth or not self._pending:
+                    continue
+                if time.monotonic() - self._first_pending_at >= interval:
+                    try:
+                        self._commit()
+                    except sqlite3.Error as e:
+                        print(f"Warning: agent log flush failed: {e}", file=sys.stderr)
+    
+    @contextmanager
+    def batch(self):
+        """
+        Group all writes made inside the block into a single transaction.
+
+        Batches nest; the writes are committed when the outermost block exits.
+        The logger lock is held for the duration of the block, so other
+        threads' writes wait rather than interleave. In async mode the block's
+        writes are collected per thread and queued as one group on exit.
+        """
+        if self.async_writes:
+            outermost = getattr(self._local, "batch", None) is None
+            if outermost:
+                self._local.batch = []
+            try:
+                yield self
+            finally:
+                if outermost:
+                    statements, self._local.batch = self._local.batch, None
+                    if statements:
+                        self._enqueue(statements)
+            return
+        
+        with self._lock:
+            self._batch_depth += 1
+            try:
+                yield self
+            finally:
+                self._batch_depth -= 1
+                if self._batch_depth == 0 and not self._closed:
+                    self._commit()
+    
+    def close(self) -> None:
+        """Flush pending writes and close the connection."""
+        if self._writer is not None:
+            # Always enqueue the stop signal, even under a drop policy
+            self._queue.put(_STOP)
+            self._writer.join()
+            self._writer = None
+        if self._flusher is not None:
+            self._stop_flusher.set()
+            self._flusher.join()
+            self._flusher = None
+        with self._lock:
+            if self._closed:
+                return
+            self._commit()
+            self._conn.close()
+            self._closed = True
+        atexit.unregister(self.close)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+    
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
     
     def start_workflow_run(self, run_id: str, workflow_name: str, project_name: str, 
                           model: Optional[str] = None, flags: Optional[Dict] = None) -> None:
         """Log the start of a workflow run."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
+        self._write("""
             INSERT INTO workflow_runs 
             (run_id, workflow_name, project_name, started_at, status, model, flags)
             VALUES (?, ?, ?, ?, ?, ?, ?)
@@ -89,18 +835,12 @@ class AgentWorkflowLogger:
             model,
             json.dumps(flags) if flags else None
         ))
-        
-        conn.commit()
-        conn.close()
     
     def complete_workflow_run(self, run_id: str, status: str, 
                              error_message: Optional[str] = None,
                              notes: Optional[str] = None) -> None:
         """Mark a workflow run as completed."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
+        self._write("""
             UPDATE workflow_runs 
             SET completed_at = ?, status = ?, error_message = ?, notes = ?
             WHERE run_id = ?
@@ -111,21 +851,13 @@ class AgentWorkflowLogger:
             notes,
             run_id
         ))
-        
-        conn.commit()
-        conn.close()
     
     def log_agent_call(self, call_id: str, agent_type: str, prompt: str,
                       run_id: Optional[str] = None, model: Optional[str] = None) -> None:
         """Log the start of an agent call."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            INSERT INTO agent_calls 
-            (call_id, run_id, agent_type, prompt, started_at, status, model)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (
+        # Hashing and compression happen at commit time (on the writer
+        # thread in async mode), not on the caller's thread.
+        self._write(_INSERT_AGENT_CALL, (
             call_id,
             run_id,
             agent_type,
@@ -134,19 +866,13 @@ class AgentWorkflowLogger:
             "running",
             model
         ))
-        
-        conn.commit()
-        conn.close()
     
     def complete_agent_call(self, call_id: str, status: str,
                            output_summary: Optional[str] = None,
                            error_message: Optional[str] = None,
                            duration_ms: Optional[int] = None) -> None:
         """Mark an agent call as completed."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
+        self._write("""
             UPDATE agent_calls 
             SET completed_at = ?, status = ?, output_summary = ?, error_message = ?, duration_ms = ?
             WHERE call_id = ?
@@ -158,16 +884,10 @@ class AgentWorkflowLogger:
             duration_ms,
             call_id
         ))
-        
-        conn.commit()
-        conn.close()
     
     def log_artifact(self, run_id: str, file_path: str, action: str, notes: Optional[str] = None) -> None:
         """Log a file artifact created/modified during a run."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
+        self._write("""
             INSERT INTO artifacts 
             (run_id, file_path, action, created_at, notes)
             VALUES (?, ?, ?, ?, ?)
@@ -178,59 +898,578 @@ class AgentWorkflowLogger:
             datetime.utcnow().isoformat(),
             notes
         ))
+    
+    def log_event(self, source_path: str, byte_offset: int, event_type: str,
+                  payload: str, run_id: Optional[str] = None, call_id: Optional[str] = None,
+                  subtype: Optional[str] = None, session_id: Optional[str] = None) -> None:
+        """Log one parsed agent stream event (ignored if already ingested)."""
+        self._write("""
+            INSERT OR IGNORE INTO agent_events
+            (source_path, byte_offset, run_id, call_id, event_type, subtype,
+             session_id, ingested_at, payload)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            source_path,
+            byte_offset,
+            run_id,
+            call_id,
+            event_type,
+            subtype,
+            session_id,
+            datetime.utcnow().isoformat(),
+            payload
+        ))
+    
+    def set_ingest_offset(self, source_path: str, byte_offset: int) -> None:
+        """Record how far a stream file has been ingested."""
+        self._write("""
+            INSERT OR REPLACE INTO ingest_offsets (source_path, byte_offset, updated_at)
+            VALUES (?, ?, ?)
+        """, (source_path, byte_offset, datetime.utcnow().isoformat()))
+    
+    def reset_ingest(self, source_path: str) -> None:
+        """Forget a stream file's events and offset (e.g. after it was truncated)."""
+        with self.batch():
+            self._write("DELETE FROM agent_events WHERE source_path = ?", (source_path,))
+            self._write("DELETE FROM ingest_offsets WHERE source_path = ?", (source_path,))
+    
+    def save_agent_statuses(self, agents: List[Dict[str, Any]], started_ts: List[float]) -> None:
+        """
+        Store finished agent records from the status tracker (replacing any
+        earlier copy), in one transaction.
         
-        conn.commit()
-        conn.close()
+        Args:
+            agents: Decoded agent records
+            started_ts: Their started_at as epoch seconds (index scores)
+        """
+        with self.batch():
+            for agent, ts in zip(agents, started_ts):
+                self._write("""
+                    INSERT OR REPLACE INTO agent_statuses
+                    (agent_id, agent_type, workflow, project, status, started_at,
+                     started_ts, completed_at, data)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, (
+                    agent["agent_id"],
+                    agent.get("agent_type"),
+                    agent.get("workflow"),
+                    agent.get("project"),
+                    agent.get("status"),
+                    agent.get("started_at"),
+                    ts,
+                    agent.get("completed_at"),
+                    json.dumps(agent)
+                ))
     
-    def get_workflow_runs(self, project_name: Optional[str] = None, limit: int = 50):
-        """Retrieve workflow runs, optionally filtered by project."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    # ------------------------------------------------------------------
+    # Reads (always see this logger's own pending and queued writes)
+    # ------------------------------------------------------------------
+    
+    def get_workflow_runs(self, project_name: Optional[str] = None, limit: int = 50,
+                          before: Optional[Tuple[str, str]] = None,
+                          include_archived: bool = False):
+        """
+        Retrieve workflow runs, newest first, optionally filtered by project.
         
+        Uses keyset pagination: pass the cursor of the last row of the
+        previous page (see `page_cursor`) as `before` to get the next page.
+        Each page is an index range scan, however deep into history it is.
+        With include_archived, runs moved to archive files are merged in.
+        """
+        conditions = []
+        params = []
         if project_name:
-            cursor.execute("""
+            conditions.append("project_name = ?")
+            params.append(project_name)
+        if before:
+            conditions.append("(started_at, run_id) < (?, ?)")
+            params.extend(before)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        
+        self.flush()
+        with self._lock:
+            cursor = self._conn.cursor()
+            cursor.execute(f"""
                 SELECT * FROM workflow_runs 
-                WHERE project_name = ?
-                ORDER BY started_at DESC
+                {where}
+                ORDER BY started_at DESC, run_id DESC
                 LIMIT ?
-            """, (project_name, limit))
-        else:
-            cursor.execute("""
-                SELECT * FROM workflow_runs 
-                ORDER BY started_at DESC
+            """, (*params, limit))
+            rows = cursor.fetchall()
+            
+            if not include_archived:
+                return rows
+            
+            cursor.execute(f"""
+                SELECT run_id, archive_path FROM archived_runs
+                {where}
+                ORDER BY started_at DESC, run_id DESC
                 LIMIT ?
-            """, (limit,))
+            """, (*params, limit))
+            archived = cursor.fetchall()
         
-        rows = cursor.fetchall()
-        conn.close()
+        for archive_path, run_ids in self._group_by_archive(archived).items():
+            for run_id in run_ids:
+                rows.extend(read_archived_run(archive_path, run_id, ("workflow_runs",))["workflow_runs"][1])
         
-        return rows
+        rows.sort(key=self.page_cursor, reverse=True)
+        return rows[:limit]
+    
+    @staticmethod
+    def _group_by_archive(archived: List[tuple]) -> Dict[str, set]:
+        """{archive_path: {run_id, ...}} for (run_id, archive_path) rows."""
+        groups = {}
+        for run_id, archive_path in archived:
+            groups.setdefault(archive_path, set()).add(run_id)
+        return groups
+    
+    @staticmethod
+    def page_cursor(row) -> Tuple[str, str]:
+        """Keyset cursor (started_at, run_id) for a `workflow_runs` row."""
+        return (row[3], row[0])
+    
+    def iter_workflow_runs(self, project_name: Optional[str] = None,
+                           page_size: int = 500) -> Iterator[tuple]:
+        """Iterate over all workflow runs, newest first, one page at a time."""
+        before = None
+        while True:
+            rows = self.get_workflow_runs(project_name, limit=page_size, before=before)
+            yield from rows
+            if len(rows) < page_size:
+                return
+            before = self.page_cursor(rows[-1])
     
     def get_run_details(self, run_id: str):
         """Get full details for a specific run including agent calls and artifacts."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Get workflow run
-        cursor.execute("SELECT * FROM workflow_runs WHERE run_id = ?", (run_id,))
-        workflow = cursor.fetchone()
-        
-        # Get agent calls
-        cursor.execute("SELECT * FROM agent_calls WHERE run_id = ?", (run_id,))
-        agent_calls = cursor.fetchall()
-        
-        # Get artifacts
-        cursor.execute("SELECT * FROM artifacts WHERE run_id = ?", (run_id,))
-        artifacts = cursor.fetchall()
+        self.flush()
+        with self._lock:
+            cursor = self._conn.cursor()
+            
+            # Get workflow run
+            cursor.execute("SELECT * FROM workflow_runs WHERE run_id = ?", (run_id,))
+            workflow = cursor.fetchone()
+            
+            # Get agent calls (prompts resolved from prompt_blobs)
+            cursor.execute(f"""
+                SELECT {AGENT_CALL_COLUMNS}
+                FROM agent_calls c
+                LEFT JOIN prompt_blobs b ON b.prompt_hash = c.prompt_hash
+                WHERE c.run_id = ?
+            """, (run_id,))
+            agent_calls = cursor.fetchall()
+            
+            # Get artifacts
+            cursor.execute("SELECT * FROM artifacts WHERE run_id = ?", (run_id,))
+            artifacts = cursor.fetchall()
+            
+            archive_path = None
+            if workflow is None:
+                archive_path = self._archive_path_for(run_id)
         
-        conn.close()
+        if archive_path:
+            tables = read_archived_run(archive_path, run_id, ("workflow_runs", "agent_calls", "artifacts"))
+            workflow = next(iter(tables["workflow_runs"][1]), None)
+            agent_calls = tables["agent_calls"][1]
+            artifacts = tables["artifacts"][1]
         
         return {
             "workflow": workflow,
             "agent_calls": agent_calls,
             "artifacts": artifacts
         }
-
+    
+    def _archive_path_for(self, run_id: str) -> Optional[str]:
+        """Archive file holding a run, if it was archived. Caller holds the lock."""
+        row = self._conn.execute(
+            "SELECT archive_path FROM archived_runs WHERE run_id = ?", (run_id,)
+        ).fetchone()
+        return row[0] if row else None
+    
+    
+    def get_ingest_offset(self, source_path: str) -> int:
+        """Byte offset up to which a stream file has been ingested (0 if never)."""
+        self.flush()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT byte_offset FROM ingest_offsets WHERE source_path = ?", (source_path,)
+            ).fetchone()
+        return row[0] if row else 0
+    
+    def get_events(self, run_id: Optional[str] = None, call_id: Optional[str] = None,
+                   event_type: Optional[str] = None, limit: int = 1000):
+        """Retrieve ingested agent events in stream order."""
+        conditions = []
+        params = []
+        if run_id:
+            conditions.append("run_id = ?")
+            params.append(run_id)
+        if call_id:
+            conditions.append("call_id = ?")
+            params.append(call_id)
+        if event_type:
+            conditions.append("event_type = ?")
+            params.append(event_type)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        
+        self.flush()
+        with self._lock:
+            events = self._conn.execute(f"""
+                SELECT * FROM agent_events
+                {where}
+                ORDER BY source_path, byte_offset
+                LIMIT ?
+            """, (*params, limit)).fetchall()
+            archive_path = self._archive_path_for(run_id) if run_id and not events else None
+        
+        if archive_path:
+            events = [
+                event for event in read_archived_run(archive_path, run_id, ("agent_events",))["agent_events"][1]
+                if (not call_id or event[3] == call_id) and (not event_type or event[4] == event_type)
+            ][:limit]
+        
+        return events
+    
+    def get_agent_status(self, agent_id: str) -> Optional[Dict[str, Any]]:
+        """A finished agent's record from the cold tier."""
+        self.flush()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM agent_statuses WHERE agent_id = ?", (agent_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+    
+    def get_agent_statuses(self, limit: int = 100, before: Optional[float] = None,
+                           after: Optional[float] = None, workflow: Optional[str] = None,
+                           project: Optional[str] = None,
+                           status: Optional[str] = None) -> List[Tuple[float, Dict[str, Any]]]:
+        """
+        Finished agents from the cold tier, newest first.
+        
+        Returns:
+            (started_ts, record) pairs; before/after are exclusive epoch bounds
+        """
+        conditions = []
+        params = []
+        for column, value in (("workflow", workflow), ("project", project), ("status", status)):
+            if value:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if before is not None:
+            conditions.append("started_ts < ?")
+            params.append(before)
+        if after is not None:
+            conditions.append("started_ts > ?")
+            params.append(after)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        
+        self.flush()
+        with self._lock:
+            rows = self._conn.execute(f"""
+                SELECT started_ts, data FROM agent_statuses
+                {where}
+                ORDER BY started_ts DESC
+                LIMIT ?
+            """, (*params, limit)).fetchall()
+        return [(ts, json.loads(data)) for ts, data in rows]
+    
+    def count_agent_statuses(self) -> Dict[str, int]:
+        """Number of cold-tier agents per status."""
+        self.flush()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) FROM agent_statuses GROUP BY status"
+            ).fetchall()
+        return {status or "unknown": count for status, count in rows}
+    
+    def get_prompt(self, key: str) -> Optional[str]:
+        """Return the prompt text stored under a hash."""
+        self.flush()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT codec, data FROM prompt_blobs WHERE prompt_hash = ?", (key,)
+            ).fetchone()
+        return decompress_prompt(*row) if row else None
+    
+    
+    # ------------------------------------------------------------------
+    # Retention
+    # ------------------------------------------------------------------
+    
+    def find_runs(self, started_before: Optional[str] = None,
+                  statuses: Optional[List[str]] = None,
+                  project_name: Optional[str] = None,
+                  workflow_name: Optional[str] = None,
+                  limit: int = 1000) -> List[str]:
+        """
+        Find finished runs matching a retention policy, oldest first.
+        
+        Runs still marked running are never returned.
+        """
+        conditions = ["status != 'running'"]
+        params = []
+        if started_before:
+            conditions.append("started_at < ?")
+            params.append(started_before)
+        if statuses:
+            conditions.append(f"status IN ({', '.join('?' for _ in statuses)})")
+            params.extend(statuses)
+        if project_name:
+            conditions.append("project_name = ?")
+            params.append(project_name)
+        if workflow_name:
+            conditions.append("workflow_name = ?")
+            params.append(workflow_name)
+        
+        self.flush()
+        with self._lock:
+            rows = self._conn.execute(f"""
+                SELECT run_id FROM workflow_runs
+                WHERE {' AND '.join(conditions)}
+                ORDER BY started_at, run_id
+                LIMIT ?
+            """, (*params, limit)).fetchall()
+        return [row[0] for row in rows]
+    
+    def archive_runs(self, run_ids: List[str], archive_dir: str) -> Optional[str]:
+        """
+        Move runs (with their agent calls, artifacts and events) to an archive file.
+        
+        The archive is written and fsynced before the hot rows are deleted,
+        in the same transaction that records the runs in archived_runs.
+        Prompt blobs no longer referenced by any hot agent call are dropped;
+        archived agent calls keep their prompt text inline.
+        
+        Returns:
+            Path of the archive file, or None if there was nothing to archive
+        """
+        if not run_ids:
+            return None
+        
+        Path(archive_dir).mkdir(parents=True, exist_ok=True)
+        archive_path = str(
+            Path(archive_dir).resolve() / f"runs_{datetime.utcnow().strftime('%Y%m%d_%H%M%S_%f')}.awla"
+        )
+        selects = {
+            "workflow_runs": "SELECT * FROM workflow_runs WHERE run_id IN (SELECT run_id FROM temp.archive_ids)",
+            "agent_calls": f"""
+                SELECT {AGENT_CALL_COLUMNS}
+                FROM agent_calls c
+                LEFT JOIN prompt_blobs b ON b.prompt_hash = c.prompt_hash
+                WHERE c.run_id IN (SELECT run_id FROM temp.archive_ids)
+            """,
+            "artifacts": "SELECT * FROM artifacts WHERE run_id IN (SELECT run_id FROM temp.archive_ids)",
+            "agent_events": "SELECT * FROM agent_events WHERE run_id IN (SELECT run_id FROM temp.archive_ids)"
+        }
+        
+        self.flush()
+        with self._lock:
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("CREATE TEMP TABLE IF NOT EXISTS archive_ids (run_id TEXT PRIMARY KEY)")
+                conn.execute("DELETE FROM temp.archive_ids")
+                conn.executemany(
+                    "INSERT OR IGNORE INTO temp.archive_ids VALUES (?)", ((r,) for r in run_ids)
+                )
+                
+                tables = {}
+                for table in ARCHIVED_TABLES:
+                    cursor = conn.execute(selects[table])
+                    tables[table] = ([d[0] for d in cursor.description], cursor.fetchall())
+                if not tables["workflow_runs"][1]:
+                    conn.execute("ROLLBACK")
+                    return None
+                
+                write_archive(archive_path, tables)
+                
+                conn.execute("""
+                    INSERT OR REPLACE INTO archived_runs
+                    (run_id, workflow_name, project_name, started_at, status, archive_path, archived_at)
+                    SELECT run_id, workflow_name, project_name, started_at, status, ?, ?
+                    FROM workflow_runs WHERE run_id IN (SELECT run_id FROM temp.archive_ids)
+                """, (archive_path, datetime.utcnow().isoformat()))
+                
+                conn.execute("CREATE TEMP TABLE IF NOT EXISTS archive_hashes (prompt_hash TEXT PRIMARY KEY)")
+                conn.execute("DELETE FROM temp.archive_hashes")
+                conn.execute("""
+                    INSERT OR IGNORE INTO temp.archive_hashes
+                    SELECT prompt_hash FROM agent_calls
+                    WHERE run_id IN (SELECT run_id FROM temp.archive_ids)
+                """)
+                
+                for table in reversed(ARCHIVED_TABLES):
+                    conn.execute(
+                        f"DELETE FROM {table} WHERE run_id IN (SELECT run_id FROM temp.archive_ids)"
+                    )
+                conn.execute("""
+                    DELETE FROM prompt_blobs
+                    WHERE prompt_hash IN (SELECT prompt_hash FROM temp.archive_hashes)
+                    AND NOT EXISTS (
+                        SELECT 1 FROM agent_calls c WHERE c.prompt_hash = prompt_blobs.prompt_hash
+                    )
+                """)
+                conn.execute("COMMIT")
+            except Exception:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                if os.path.exists(archive_path):
+                    os.remove(archive_path)
+                raise
+        
+        return archive_path
+    
+    def vacuum(self) -> None:
+        """
+        Return pages freed by archiving to the filesystem.
+        
+        The first call switches the database to incremental auto-vacuum
+        (which needs one full VACUUM); later calls are incremental.
+        """
+        self.flush()
+        with self._lock:
+            mode = self._conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+            if mode == 2:
+                self._conn.execute("PRAGMA incremental_vacuum")
+            else:
+                self._conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                self._conn.execute("VACUUM")
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    
+    # ------------------------------------------------------------------
+    # Analytics
+    # ------------------------------------------------------------------
+    
+    def get_call_stats(self, group_by: str = "model", since: Optional[str] = None,
+                       until: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Aggregate agent calls per workflow, model or agent_type.
+        
+        Args:
+            group_by: One of CALL_STATS_GROUPS (workflow, model, agent_type)
+            since: Optional ISO timestamp lower bound on started_at
+            until: Optional ISO timestamp upper bound on started_at
+        
+        Returns:
+            One dict per group with counts, success rate and duration
+            percentiles (p50/p95/p99, ms), largest groups first
+        """
+        if group_by not in self.CALL_STATS_GROUPS:
+            raise ValueError(f"Unknown group_by: {group_by}")
+        return self._aggregate(
+            group_expr=self.CALL_STATS_GROUPS[group_by],
+            duration_expr="c.duration_ms",
+            from_clause="agent_calls c LEFT JOIN workflow_runs r ON r.run_id = c.run_id",
+            time_column="c.started_at",
+            status_column="c.status",
+            since=since,
+            until=until
+        )
+    
+    def get_run_stats(self, group_by: str = "workflow", since: Optional[str] = None,
+                      until: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Aggregate workflow runs per workflow, project or model.
+        
+        Durations are derived from started_at/completed_at; runs still in
+        progress are counted but excluded from the percentiles.
+        """
+        if group_by not in self.RUN_STATS_GROUPS:
+            raise ValueError(f"Unknown group_by: {group_by}")
+        return self._aggregate(
+            group_expr=self.RUN_STATS_GROUPS[group_by],
+            duration_expr=(
+                "CAST((julianday(r.completed_at) - julianday(r.started_at)) "
+                "* 86400000 AS INTEGER)"
+            ),
+            from_clause="workflow_runs r",
+            time_column="r.started_at",
+            status_column="r.status",
+            since=since,
+            until=until
+        )
+    
+    def _aggregate(self, group_expr: str, duration_expr: str, from_clause: str,
+                   time_column: str, status_column: str,
+                   since: Optional[str], until: Optional[str]) -> List[Dict[str, Any]]:
+        """
+        Counts, success rate and nearest-rank duration percentiles, all in SQL.
+        
+        Percentiles use window functions: rows are ranked by duration within
+        each group and the row at rank ceil(p * n / 100) is picked.
+        """
+        conditions = []
+        params = []
+        if since:
+            conditions.append(f"{time_column} >= ?")
+            params.append(since)
+        if until:
+            conditions.append(f"{time_column} < ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        
+        success = ", ".join(f"'{s}'" for s in SUCCESS_STATUSES)
+        failure = ", ".join(f"'{s}'" for s in FAILURE_STATUSES)
+        percentile_columns = ", ".join(
+            f"MAX(CASE WHEN rn = (n * {p} + 99) / 100 THEN duration_ms END) AS p{p}"
+            for p in PERCENTILES
+        )
+        percentile_select = ", ".join(f"p.p{p}" for p in PERCENTILES)
+        
+        query = f"""
+            WITH base AS (
+                SELECT COALESCE({group_expr}, 'unknown') AS grp,
+                       {status_column} AS status,
+                       {duration_expr} AS duration_ms
+                FROM {from_clause}
+                {where}
+            ),
+            ranked AS (
+                SELECT grp, duration_ms,
+                       ROW_NUMBER() OVER (PARTITION BY grp ORDER BY duration_ms) AS rn,
+                       COUNT(*) OVER (PARTITION BY grp) AS n
+                FROM base
+                WHERE duration_ms IS NOT NULL
+            ),
+            percentiles AS (
+                SELECT grp, {percentile_columns}
+                FROM ranked
+                GROUP BY grp
+            )
+            SELECT b.grp,
+                   COUNT(*) AS total,
+                   SUM(b.status IN ({success})) AS succeeded,
+                   SUM(b.status IN ({failure})) AS failed,
+                   SUM(b.status = 'running') AS running,
+                   AVG(b.duration_ms) AS avg_ms,
+                   {percentile_select}
+            FROM base b
+            LEFT JOIN percentiles p ON p.grp = b.grp
+            GROUP BY b.grp
+            ORDER BY total DESC, b.grp
+        """
+        
+        self.flush()
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        
+        stats = []
+        for row in rows:
+            group, total, succeeded, failed, running, avg_ms = row[:6]
+            finished = total - running
+            entry = {
+                "group": group,
+                "total": total,
+                "succeeded": succeeded,
+                "failed": failed,
+                "running": running,
+                "success_rate": succeeded / finished if finished else None,
+                "avg_ms": avg_ms
+            }
+            for p, value in zip(PERCENTILES, row[6:]):
+                entry[f"p{p}_ms"] = value
+            stats.append(entry)
+        
+        return stats
 
 if __name__ == "__main__":
     # Test the logger
@@ -238,21 +1477,22 @@ if __name__ == "__main__":
     
     test_run_id = f"test_run_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}"
     
-    logger.start_workflow_run(
-        run_id=test_run_id,
-        workflow_name="kb_creation",
-        project_name="test_project",
-        model="sonnet-4.5-thinking",
-        flags={"browser": True}
-    )
-    
-    logger.log_agent_call(
-        call_id=f"{test_run_id}_call_1",
-        agent_type="cursor-agent",
-        prompt="Test prompt",
-        run_id=test_run_id,
-        model="sonnet-4.5-thinking"
-    )
+    with logger.batch():
+        logger.start_workflow_run(
+            run_id=test_run_id,
+            workflow_name="kb_creation",
+            project_name="test_project",
+            model="sonnet-4.5-thinking",
+            flags={"browser": True}
+        )
+        
+        logger.log_agent_call(
+            call_id=f"{test_run_id}_call_1",
+            agent_type="cursor-agent",
+            prompt="Test prompt",
+            run_id=test_run_id,
+            model="sonnet-4.5-thinking"
+        )
     
     logger.complete_agent_call(
         call_id=f"{test_run_id}_call_1",
@@ -273,6 +1513,7 @@ if __name__ == "__main__":
         notes="Test completed successfully"
     )
     
+    logger.close()
+    
     print(f"Test run logged: {test_run_id}")
     print(f"Database: {logger.db_path}")
-
@@ -14,6 +14,13 @@ GCS_BUCKET="gs://ncl-agent-workflow-backups/${PROJECT_NAME}"
 LOG_FILE="${BASE_DIR}/backup.log"
 TIMESTAMP=$(date '+%Y%m%d_%H%M%S')
 
+# Retention (0 = keep forever)
+# LOCAL_RETENTION_DAYS: delete local logs/{run_id}/ dirs older than N days once they are in GCS
+# DB_RETENTION_DAYS: archive agent_logs.db runs older than N days (see agent_log_retention.py)
+LOCAL_RETENTION_DAYS="${LOCAL_RETENTION_DAYS:-0}"
+DB_RETENTION_DAYS="${DB_RETENTION_DAYS:-0}"
+INFRA_DIR="${INFRA_DIR:-/Users/cstein/code/agent-workflows/infrastructure}"
+
 # Create log file directory if needed
 mkdir -p "$(dirname "$LOG_FILE")"
 
@@ -150,6 +157,34 @@ else
     log "⚠️  WARNING: Failed to upload manifest"
 fi
 
+# Prune local run directories that are safely in GCS
+if [ "$LOCAL_RETENTION_DAYS" -gt 0 ]; then
+    log "🧹 Pruning local run directories older than $LOCAL_RETENTION_DAYS days"
+    find "$LOGS_DIR" -mindepth 1 -maxdepth 1 -type d -mtime +"$LOCAL_RETENTION_DAYS" | while read -r run_dir; do
+        run_id=$(basename "$run_dir")
+        if gcloud storage ls "${GCS_BUCKET}/runs/${run_id}/" &>/dev/null; then
+            rm -rf "$run_dir"
+            log "🗑️  Removed local copy of $run_id"
+        else
+            log "⚠️  Keeping $run_id (not found in GCS)"
+        fi
+    done
+fi
+
+# Archive old runs out of the workflow log database
+if [ "$DB_RETENTION_DAYS" -gt 0 ] && [ -f "${BASE_DIR}/agent_logs.db" ]; then
+    log "🗄️  Archiving agent_logs.db runs older than $DB_RETENTION_DAYS days"
+    if python3 "${INFRA_DIR}/agent_log_retention.py" \
+        --db "${BASE_DIR}/agent_logs.db" \
+        --archive-dir "${BASE_DIR}/log_archive" \
+        --max-age-days "$DB_RETENTION_DAYS" 2>&1 | tee -a "$LOG_FILE"; then
+        gcloud storage cp -r "${BASE_DIR}/log_archive" "${GCS_BUCKET}/" 2>&1 | tee -a "$LOG_FILE" || \
+            log "⚠️  WARNING: Failed to upload log archives"
+    else
+        log "⚠️  WARNING: Log database retention failed"
+    fi
+fi
+
 # Final stats
 GCS_RUN_COUNT=$(gcloud storage ls "${GCS_BUCKET}/runs/" 2>/dev/null | grep -c "/" || echo "0")
 log "☁️  Total runs in GCS: $GCS_RUN_COUNT"
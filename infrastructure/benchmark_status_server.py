@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+Load test for agent_status_server.py.
+
+Runs the app in-process (httpx ASGI transport, no sockets) against fakeredis,
+a real Redis or the embedded backend, or drives an already running server over HTTP. For each
+concurrency level, workers issue a weighted random mix of register / update /
+heartbeat / complete / get / list / active / bulk requests for a fixed time.
+Reports throughput and p50/p95/p99 latency per operation as JSON; pass a
+previous result with --compare to see regressions.
+
+Examples:
+    benchmark_status_server.py --concurrency 1,8,32 --duration 10 --output before.json
+    benchmark_status_server.py --redis-url redis://localhost:6379/15 --compare before.json
+    benchmark_status_server.py --embedded --compare before.json
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import platform
+import tempfile
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+
+import httpx
+
+
+DEFAULT_MIX = "register=1,update=10,heartbeat=2,complete=1,get=2,list=1,active=1,bulk=0"
+OPERATIONS = ("register", "update", "heartbeat", "complete", "get", "list", "active", "bulk")
+PERCENTILES = (50, 95, 99)
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    """"register=1,update=10,..." -> {op: weight} (weight 0 disables an op)."""
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f"Unknown operation {name!r} (choose from {', '.join(OPERATIONS)})")
+        mix[name] = float(weight or 1)
+    if not any(mix.values()):
+        raise ValueError("Mix has no operation with a positive weight")
+    return mix
+
+
+def percentile(sorted_values: List[float], p: int) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[rank - 1]
+
+
+class LoadGenerator:
+    """Issues the operation mix against one status server and records latencies."""
+    
+    def __init__(self, http: httpx.AsyncClient, mix: Dict[str, float], seed: int,
+                 run_id: str, bulk_size: int = 50):
+        self.http = http
+        self.names = [name for name, weight in mix.items() if weight > 0]
+        self.weights = [mix[name] for name in self.names]
+        self.seed = seed
+        self.run_id = run_id
+        self.bulk_size = bulk_size
+        self.live: List[str] = []
+        self.known: List[str] = []
+        self.counter = 0
+    
+    def _new_agent_id(self) -> str:
+        self.counter += 1
+        return f"bench-{self.run_id}-{self.counter}"
+    
+    async def seed_agents(self, count: int) -> None:
+        """Register count agents up front (in bulk) so reads have data."""
+        for start in range(0, count, 1000):
+            ops = []
+            for _ in range(min(1000, count - start)):
+                agent_id = self._new_agent_id()
+                ops.append({"op": "register", "agent_id": agent_id,
+                            "workflow": "benchmark", "project": self.run_id})
+            response = await self.http.post("/agents/bulk", json={"operations": ops})
+            response.raise_for_status()
+            ids = [op["agent_id"] for op in ops]
+            self.live.extend(ids)
+            self.known.extend(ids)
+    
+    async def _request(self, op: str, rng: random.Random) -> httpx.Response:
+        if op == "register":
+            agent_id = self._new_agent_id()
+            self.live.append(agent_id)
+            self.known.append(agent_id)
+            return await self.http.post("/agents/register", json={
+                "agent_id": agent_id, "workflow": "benchmark", "project": self.run_id
+            })
+        if op == "update":
+            agent_id = rng.choice(self.live)
+            return await self.http.put(f"/agents/{agent_id}/status", json={
+                "status": "running", "current_task": "benchmark", "progress": {"step": rng.randint(0, 1000)}
+            })
+        if op == "heartbeat":
+            return await self.http.post(f"/agents/{rng.choice(self.live)}/heartbeat")
+        if op == "complete":
+            agent_id = self.live.pop(rng.randrange(len(self.live)))
+            return await self.http.post(f"/agents/{agent_id}/complete", json={"result_summary": "ok"})
+        if op == "get":
+            return await self.http.get(f"/agents/{rng.choice(self.known)}" if self.known else "/agents/none")
+        if op == "list":
+            return await self.http.get("/agents/all", params={"limit": 50})
+        if op == "active":
+            return await self.http.get("/agents/active")
+        # bulk: a batch of updates
+        ops = [
+            {"op": "update", "agent_id": rng.choice(self.live), "status": "running"}
+            for _ in range(self.bulk_size)
+        ]
+        return await self.http.post("/agents/bulk", json={"operations": ops})
+    
+    async def _worker(self, worker: int, deadline: float,
+                      latencies: Dict[str, List[float]], errors: Dict[str, int]) -> None:
+        rng = random.Random(self.seed * 1000 + worker)
+        while time.perf_counter() < deadline:
+            op = rng.choices(self.names, self.weights)[0]
+            if op in ("update", "heartbeat", "complete", "bulk") and not self.live:
+                op = "register"
+            start = time.perf_counter()
+            try:
+                response = await self._request(op, rng)
+                # 404 on get/heartbeat is a valid answer (agent flushed or unknown)
+                failed = response.status_code >= 500 or (
+                    response.status_code >= 400 and op not in ("get", "heartbeat")
+                )
+            except httpx.HTTPError:
+                failed = True
+            latencies.setdefault(op, []).append(time.perf_counter() - start)
+            if failed:
+                errors[op] = errors.get(op, 0) + 1
+    
+    async def run_level(self, concurrency: int, duration: float) -> Dict[str, Any]:
+        """Run the mix at one concurrency level and summarize it."""
+        latencies: Dict[str, List[float]] = {}
+        errors: Dict[str, int] = {}
+        start = time.perf_counter()
+        deadline = start + duration
+        await asyncio.gather(*(
+            self._worker(worker, deadline, latencies, errors) for worker in range(concurrency)
+        ))
+        elapsed = time.perf_counter() - start
+        
+        endpoints = {}
+        for op, values in sorted(latencies.items()):
+            values.sort()
+            entry = {
+                "requests": len(values),
+                "errors": errors.get(op, 0),
+                "throughput_rps": round(len(values) / elapsed, 1),
+                "mean_ms": round(sum(values) / len(values) * 1000, 3),
+                "max_ms": round(values[-1] * 1000, 3)
+            }
+            for p in PERCENTILES:
+                entry[f"p{p}_ms"] = round(percentile(values, p) * 1000, 3)
+            endpoints[op] = entry
+        
+        everything = sorted(v for values in latencies.values() for v in values)
+        summary = {
+            "concurrency": concurrency,
+            "duration_s": round(elapsed, 3),
+            "requests": len(everything),
+            "errors": sum(errors.values()),
+            "throughput_rps": round(len(everything) / elapsed, 1),
+            "endpoints": endpoints
+        }
+        for p in PERCENTILES:
+            value = percentile(everything, p)
+            summary[f"p{p}_ms"] = round(value * 1000, 3) if value is not None else None
+        return summary
+
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Lines describing throughput/p95 changes beyond threshold (fraction) vs a baseline."""
+    lines = []
+    base_levels = {level["concurrency"]: level for level in baseline.get("levels", [])}
+    for level in result["levels"]:
+        base = base_levels.get(level["concurrency"])
+        if not base:
+            continue
+        for op, entry in level["endpoints"].items():
+            old = base["endpoints"].get(op)
+            if not old:
+                continue
+            for key, worse_if_higher in (("throughput_rps", False), ("p95_ms", True)):
+                if not old[key]:
+                    continue
+                change = (entry[key] - old[key]) / old[key]
+                if abs(change) < threshold:
+                    continue
+                worse = change > 0 if worse_if_higher else change < 0
+                marker = "❌" if worse else "✅"
+                lines.append(f"{marker} c={level['concurrency']} {op} {key}: "
+                             f"{old[key]} -> {entry[key]} ({change:+.0%})")
+    return lines
+
+
+async def run_benchmark(args) -> Dict[str, Any]:
+    mix = parse_mix(args.mix)
+    levels = [int(c) for c in args.concurrency.split(",")]
+    run_id = uuid.uuid4().hex[:8]
+    
+    if args.server_url:
+        backend = f"http:{args.server_url}"
+        http = httpx.AsyncClient(base_url=args.server_url, timeout=30.0,
+                                 limits=httpx.Limits(max_connections=max(levels)))
+        lifespan = None
+    else:
+        if args.embedded:
+            # Read when the server module creates its tracker
+            os.environ["AGENT_STATUS_BACKEND"] = "memory://"
+        import agent_status_server as srv
+        from agent_workflow_logger import AgentWorkflowLogger
+        
+        if args.embedded:
+            backend = "embedded"
+        elif args.redis_url:
+            backend = f"redis:{args.redis_url}"
+            srv.tracker.redis_url = args.redis_url
+        else:
+            try:
+                import fakeredis
+            except ImportError:
+                sys.exit("❌ fakeredis is not installed; pass --redis-url or --server-url")
+            backend = "fakeredis"
+            srv.tracker.client = srv.tracker.instrument(fakeredis.FakeAsyncRedis())
+        if not args.embedded:
+            # Keep benchmark data apart from real agents
+            srv.tracker.prefix = f"bench:{run_id}:"
+        srv.tracker.cold_store = AgentWorkflowLogger(
+            db_path=str(Path(tempfile.mkdtemp(prefix="status_bench_")) / "agent_logs.db")
+        )
+        http = httpx.AsyncClient(transport=httpx.ASGITransport(app=srv.app),
+                                 base_url="http://benchmark", timeout=30.0)
+        lifespan = srv.app.router.lifespan_context(srv.app)
+    
+    result = {
+        "config": {
+            "backend": backend,
+            "mix": mix,
+            "concurrency": levels,
+            "duration_s": args.duration,
+            "seed": args.seed,
+            "seed_agents": args.seed_agents
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        },
+        "levels": []
+    }
+    
+    try:
+        if lifespan is not None:
+            await lifespan.__aenter__()
+        generator = LoadGenerator(http, mix, args.seed, run_id, bulk_size=args.bulk_size)
+        if args.seed_agents:
+            await generator.seed_agents(args.seed_agents)
+        
+        for concurrency in levels:
+            print(f"🏃 concurrency={concurrency} for {args.duration:g}s...", file=sys.stderr)
+            level = await generator.run_level(concurrency, args.duration)
+            print(f"   {level['throughput_rps']} req/s, p50 {level['p50_ms']}ms, "
+                  f"p99 {level['p99_ms']}ms, {level['errors']} errors", file=sys.stderr)
+            result["levels"].append(level)
+    finally:
+        if lifespan is not None:
+            if args.redis_url:
+                await _cleanup(srv.tracker)
+            await lifespan.__aexit__(None, None, None)
+        await http.aclose()
+    
+    return result
+
+
+async def _cleanup(tracker) -> None:
+    """Delete the benchmark's keys from a real Redis."""
+    keys = [key async for key in tracker.client.scan_iter(match=f"{tracker.prefix}*", count=1000)]
+    for start in range(0, len(keys), 1000):
+        await tracker.client.delete(*keys[start:start + 1000])
+
+
+def main():
+    """CLI for the status server benchmark."""
+    parser = argparse.ArgumentParser(description="Load-test agent_status_server.py")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--redis-url", help="Run the app in-process against this Redis (default: fakeredis)")
+    target.add_argument("--server-url", help="Benchmark an already running server instead")
+    target.add_argument("--embedded", action="store_true",
+                        help="Run the app in-process with the embedded (in-memory) backend")
+    parser.add_argument("--concurrency", default="1,4,16,64", help="Comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per concurrency level")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Operation weights (default: {DEFAULT_MIX})")
+    parser.add_argument("--seed-agents", type=int, default=500, help="Agents registered before measuring")
+    parser.add_argument("--bulk-size", type=int, default=50, help="Operations per bulk request")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the operation sequence")
+    parser.add_argument("--output", help="Write the JSON result here (default: stdout)")
+    parser.add_argument("--compare", help="Previous JSON result to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="Report changes larger than this fraction with --compare")
+    
+    args = parser.parse_args()
+    try:
+        parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+    
+    result = asyncio.run(run_benchmark(args))
+    
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        result["comparison"] = compare(result, baseline, args.threshold)
+        for line in result["comparison"] or ["✅ No changes beyond threshold"]:
+            print(line, file=sys.stderr)
+    
+    output = json.dumps(result, indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+        print(f"✅ Results written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+Shared-prefix prompts and context caching for the Gemini tools.
+
+Tools that send the same large context (paper, KB summary, style guide,
+strategic goals) in many calls build their messages as
+
+    system: SHARED_SYSTEM_PROMPT
+    user:   [paper block] [supporting context block] [task block]
+
+so every call starts with a byte-identical prefix and only the short task
+differs. The paper block comes first and is formatted the same way by every
+tool, so e.g. the strategic assessment and the analyses share it too.
+
+ContextCache registers each prefix once per run and tracks its reuse. The
+default "local" mode sends the blocks as plain text parts. "provider" mode
+(opt-in with LLM_CONTEXT_CACHE=provider, for models that support it) adds
+LiteLLM cache_control breakpoints to the prefix blocks, which Vertex
+AI/Gemini (context caching) and Anthropic use to reuse the prefix instead
+of re-processing it; check that your llm_lib passes list content with
+cache_control through before enabling it. "off" sends a single plain-text
+user message.
+
+Papers over the token budget are processed map-reduce style: paper_budget()
+gives the room left for paper text next to the context, and part_block()
+formats one section-aligned chunk (latex_sections.budget_chunks).
+"""
+
+import os
+import hashlib
+import threading
+from typing import Optional, Dict, Any, List
+
+from latex_sections import estimate_tokens
+
+
+SHARED_SYSTEM_PROMPT = """You are an expert reviewer and scientific writing editor for top-tier ML conferences (NeurIPS, ICML, ICLR).
+You are given a research paper and supporting context, followed by a specific task.
+Follow the task's instructions and output format exactly."""
+
+# LiteLLM model prefixes whose providers support cache_control breakpoints
+PROVIDER_CACHING_PREFIXES = ("vertex_ai/", "gemini/", "anthropic/", "bedrock/anthropic", "claude")
+
+PROMPT_OVERHEAD = 2000  # tokens for the system prompt and task instructions
+MIN_PAPER_BUDGET = 4000
+MAP_WORKERS = 4  # concurrent calls per map step
+
+
+def paper_block(paper_tex: str) -> str:
+    """The paper as every tool sends it (keep identical across tools)."""
+    return f"PAPER:\n```latex\n{paper_tex}\n```"
+
+
+def sections_block(units: List[Dict[str, Any]], changed: List[Dict[str, Any]]) -> str:
+    """
+    Outline of the paper plus the full text of the changed sections only
+    (incremental runs, see latex_sections.py).
+    """
+    changed_keys = {unit["key"] for unit in changed}
+    outline = "\n".join(
+        f"- {unit['title']}" + (" (changed)" if unit["key"] in changed_keys else "") for unit in units
+    )
+    texts = "\n\n".join(f"SECTION: {unit['title']}\n```latex\n{unit['text']}\n```" for unit in changed)
+    return (f"PAPER OUTLINE (sections marked changed were revised since the last analysis; "
+            f"the others are unchanged):\n{outline}\n\nCHANGED SECTIONS:\n{texts}")
+
+
+def context_block(
+    kb_summary: Optional[str] = None,
+    style_guide: Optional[str] = None,
+    strategic_goals: Optional[str] = None
+) -> Optional[str]:
+    """Supporting context, most stable first (None if there is none)."""
+    parts = []
+    if kb_summary:
+        parts.append(f"KNOWLEDGE BASE SUMMARY:\n{kb_summary}\n")
+    if style_guide:
+        parts.append(f"STYLE GUIDELINES (from top papers):\n{style_guide}\n")
+    if strategic_goals:
+        parts.append(f"STRATEGIC GOALS:\n{strategic_goals}\n")
+    return "\n".join(parts) if parts else None
+
+
+def paper_budget(token_budget: int, *blocks: Optional[str], reserved: int = 0) -> int:
+    """
+    Tokens left for paper text in a prompt that also carries blocks (and
+    reserved tokens of non-text parts, e.g. an attached PDF).
+    """
+    used = PROMPT_OVERHEAD + reserved + sum(estimate_tokens(block) for block in blocks if block)
+    return max(token_budget - used, MIN_PAPER_BUDGET)
+
+
+def part_block(chunks: List[Dict[str, Any]], index: int) -> str:
+    """One chunk of a paper too long for a single prompt."""
+    chunk = chunks[index]
+    return (f"PAPER PART {index + 1} OF {len(chunks)} (sections: {', '.join(chunk['titles'])}):\n"
+            f"```latex\n{chunk['text']}\n```")
+
+
+class ContextCache:
+    """Build shared-prefix messages and track (or enable) prefix reuse."""
+    
+    MODES = ("provider", "local", "off")
+    
+    def __init__(self, model: str, mode: Optional[str] = None):
+        """
+        Args:
+            model: LiteLLM model name (provider mode needs one that supports it)
+            mode: provider, local or off (default: LLM_CONTEXT_CACHE, else
+                local); provider falls back to local for other models
+        """
+        mode = mode or os.environ.get("LLM_CONTEXT_CACHE") or "local"
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown context cache mode: {mode}")
+        if mode == "provider" and not model.startswith(PROVIDER_CACHING_PREFIXES):
+            mode = "local"
+        self.model = model
+        self.mode = mode
+        self._lock = threading.Lock()
+        # prefix hash -> estimated prefix tokens
+        self.registered: Dict[str, int] = {}
+        self.stats = {"registered": 0, "reused": 0, "tokens_reused": 0}
+    
+    @staticmethod
+    def prefix_id(system: str, blocks: List[str]) -> str:
+        digest = hashlib.sha256(system.encode("utf-8"))
+        for block in blocks:
+            digest.update(b"\0" + block.encode("utf-8"))
+        return digest.hexdigest()[:16]
+    
+    def is_registered(self, blocks: List[str], system: str = SHARED_SYSTEM_PROMPT) -> bool:
+        """Whether this prefix was already sent in this run."""
+        with self._lock:
+            return self.prefix_id(system, blocks) in self.registered
+    
+    def build(
+        self,
+        blocks: List[Optional[str]],
+        task: str,
+        system: str = SHARED_SYSTEM_PROMPT
+    ) -> List[Dict[str, Any]]:
+        """
+        Messages for one call: the shared prefix (system + blocks) then the task.
+
+        Args:
+            blocks: Shared context blocks in order (None entries are skipped)
+            task: Call-specific instructions (sent last)
+            system: System prompt (keep it the same across calls)
+        """
+        blocks = [b for b in blocks if b]
+        key = self.prefix_id(system, blocks)
+        with self._lock:
+            if key in self.registered:
+                self.stats["reused"] += 1
+                self.stats["tokens_reused"] += self.registered[key]
+            else:
+                self.registered[key] = estimate_tokens(system) + sum(estimate_tokens(b) for b in blocks)
+                self.stats["registered"] += 1
+        
+        if self.mode == "off":
+            return [
+                {"role": "system", "content": system},
+                {"role": "user", "content": "\n\n".join(blocks + [task])}
+            ]
+        
+        content = [{"type": "text", "text": block} for block in blocks]
+        if self.mode == "provider":
+            # A breakpoint per block: the paper alone is also a reusable prefix
+            for part in content:
+                part["cache_control"] = {"type": "ephemeral"}
+        content.append({"type": "text", "text": task})
+        return [
+            {"role": "system", "content": system},
+            {"role": "user", "content": content}
+        ]
+    
+    def summary(self) -> str:
+        """One-line reuse report for CLI output."""
+        return (f"🧩 Context cache ({self.mode}): {self.stats['registered']} prefixes registered, "
+                f"reused {self.stats['reused']}x (~{self.stats['tokens_reused']:,} tokens)")
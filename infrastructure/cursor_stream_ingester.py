@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Incremental ingester for cursor-agent stream-json logs.
+
+Tails a (possibly still growing) `cursor_agent.jsonl` file and writes each
+event into the `agent_events` table of the workflow log database, linked to
+a workflow run and/or agent call. Progress is stored as a byte offset, so
+re-running (or resuming after a crash) only reads what was appended since.
+Only one line is held in memory at a time, so file size does not matter.
+"""
+
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+from typing import Optional, Dict, Any
+
+from agent_workflow_logger import AgentWorkflowLogger
+
+
+class CursorStreamIngester:
+    """Parse cursor-agent stream-json events into AgentWorkflowLogger."""
+    
+    def __init__(
+        self,
+        logger: AgentWorkflowLogger,
+        path: str,
+        run_id: Optional[str] = None,
+        call_id: Optional[str] = None,
+        batch_size: int = 500,
+        complete_call: bool = False
+    ):
+        """
+        Args:
+            logger: Logger whose database receives the events
+            path: stream-json file to ingest
+            run_id: Workflow run the events belong to
+            call_id: Agent call the events belong to
+            batch_size: Events committed per transaction (with the offset)
+            complete_call: Mark `call_id` completed when the result event arrives
+        """
+        self.logger = logger
+        self.path = Path(path)
+        self.source_path = str(self.path.resolve())
+        self.run_id = run_id
+        self.call_id = call_id
+        self.batch_size = batch_size
+        self.complete_call = complete_call
+        self.offset = logger.get_ingest_offset(self.source_path)
+        self.events_ingested = 0
+    
+    def ingest(self) -> int:
+        """
+        Ingest all complete lines appended since the stored offset.
+
+        A trailing line without a newline is still being written and is left
+        for the next call.
+
+        Returns:
+            Number of events ingested
+        """
+        if not self.path.exists():
+            return 0
+        
+        size = self.path.stat().st_size
+        if size < self.offset:
+            print(f"⚠️  {self.path} was truncated, re-ingesting from the start", file=sys.stderr)
+            self.logger.reset_ingest(self.source_path)
+            self.offset = 0
+        
+        count = 0
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            while True:
+                n = self._ingest_batch(f)
+                count += n
+                if n < self.batch_size:
+                    break
+        
+        self.events_ingested += count
+        return count
+    
+    def _ingest_batch(self, f) -> int:
+        """Read up to batch_size lines and commit them together with the new offset."""
+        count = 0
+        with self.logger.batch():
+            while count < self.batch_size:
+                line = f.readline()
+                if not line.endswith(b"\n"):
+                    # EOF or partial line: rewind and wait for the rest
+                    f.seek(self.offset)
+                    break
+                
+                if line.strip():
+                    self._log_line(self.offset, line)
+                    count += 1
+                self.offset += len(line)
+            
+            self.logger.set_ingest_offset(self.source_path, self.offset)
+        return count
+    
+    def _log_line(self, offset: int, line: bytes) -> None:
+        """Parse one line and log it as an event."""
+        text = line.decode("utf-8", errors="replace").strip()
+        
+        try:
+            event = json.loads(text)
+        except json.JSONDecodeError:
+            event = None
+        
+        if not isinstance(event, dict):
+            # stderr is redirected into the same file, so keep plain lines too
+            self.logger.log_event(
+                self.source_path, offset, "raw", text,
+                run_id=self.run_id, call_id=self.call_id
+            )
+            return
+        
+        self.logger.log_event(
+            self.source_path,
+            offset,
+            str(event.get("type", "unknown")),
+            text,
+            run_id=self.run_id,
+            call_id=self.call_id,
+            subtype=event.get("subtype"),
+            session_id=event.get("session_id")
+        )
+        
+        if self.complete_call and self.call_id and event.get("type") == "result":
+            self._complete_call(event)
+    
+    def _complete_call(self, event: Dict[str, Any]) -> None:
+        """Close the linked agent call from the final result event."""
+        failed = event.get("is_error") or event.get("subtype") not in (None, "success")
+        result = event.get("result")
+        self.logger.complete_agent_call(
+            self.call_id,
+            status="failed" if failed else "success",
+            output_summary=result[:1000] if isinstance(result, str) else None,
+            error_message=str(event.get("subtype")) if failed else None,
+            duration_ms=event.get("duration_ms")
+        )
+    
+    def follow(self, poll_interval: float = 1.0, idle_timeout: Optional[float] = None) -> int:
+        """
+        Keep ingesting as the file grows.
+
+        Args:
+            poll_interval: Seconds between checks for new data
+            idle_timeout: Stop after this many seconds without new events
+                (None: run until interrupted)
+
+        Returns:
+            Number of events ingested
+        """
+        total = 0
+        last_activity = time.monotonic()
+        try:
+            while True:
+                n = self.ingest()
+                total += n
+                if n:
+                    last_activity = time.monotonic()
+                elif idle_timeout is not None and time.monotonic() - last_activity >= idle_timeout:
+                    break
+                time.sleep(poll_interval)
+        except KeyboardInterrupt:
+            pass
+        return total
+
+
+def main():
+    """CLI for stream-json ingestion."""
+    parser = argparse.ArgumentParser(description="Ingest cursor-agent stream-json logs into agent_logs.db")
+    parser.add_argument("jsonl_file", help="cursor-agent --output-format stream-json output")
+    parser.add_argument("--db", default="/Users/cstein/code/activation_function_agent/agent_logs.db",
+                        help="Workflow log database")
+    parser.add_argument("--run-id", help="Workflow run the events belong to")
+    parser.add_argument("--call-id", help="Agent call the events belong to")
+    parser.add_argument("--complete-call", action="store_true",
+                        help="Mark --call-id completed from the result event")
+    parser.add_argument("--follow", "-f", action="store_true", help="Keep tailing the file")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds between polls with --follow")
+    parser.add_argument("--idle-timeout", type=float, help="Stop --follow after this many idle seconds")
+    
+    args = parser.parse_args()
+    
+    logger = AgentWorkflowLogger(db_path=args.db)
+    ingester = CursorStreamIngester(
+        logger,
+        args.jsonl_file,
+        run_id=args.run_id,
+        call_id=args.call_id,
+        complete_call=args.complete_call
+    )
+    
+    print(f"📥 Ingesting {args.jsonl_file} from byte {ingester.offset}...", file=sys.stderr)
+    
+    if args.follow:
+        count = ingester.follow(poll_interval=args.poll_interval, idle_timeout=args.idle_timeout)
+    else:
+        count = ingester.ingest()
+    
+    logger.close()
+    
+    print(f"✅ Ingested {count} events (offset {ingester.offset})", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,632 @@
+"""
+In-process agent status tracker (no Redis).
+
+EmbeddedStatusTracker implements the StatusTracker interface with plain
+Python structures, so a status call is a few dict/bisect operations instead
+of a network round trip. Semantics match the Redis backend: started_at-
+ordered indexes per workflow/project/status, heartbeat reaping, a capped
+event log with live subscriptions, capped progress history, and flushing
+finished agents to the SQLite cold tier.
+
+State belongs to one process. With a db_path, live agents are also written
+to SQLite (write-behind: on every flush pass and on disconnect) and loaded
+again on connect, so a restarted server picks up the agents it was
+tracking. Events and progress history are not persisted.
+
+Usage:
+    tracker = EmbeddedStatusTracker()  # or EmbeddedStatusTracker("status.db")
+    await tracker.register_agent("a1", "cursor-agent", "kb_creation", "my_project")
+
+or serve it with agent_status_server.py --backend memory:// (or sqlite:///status.db).
+"""
+
+import asyncio
+import bisect
+import json
+import math
+import sqlite3
+import time
+from collections import deque
+from datetime import datetime, timezone
+from itertools import dropwhile, islice
+from typing import Optional, Dict, Any, List, Union, AsyncIterator, Tuple, Deque, Set
+
+from agent_workflow_logger import AgentWorkflowLogger
+from status_metrics import MetricsRegistry
+from status_tracker import (
+    StatusTracker, timed, timestamp_score, event_id_key,
+    HEARTBEAT_TTL, EVENT_STREAM_MAXLEN, COMPLETED_TTL, PROGRESS_MAXLEN, PROGRESS_MAX_AGE
+)
+
+
+def _utcnow() -> Tuple[str, float]:
+    """Current UTC time as (naive ISO string, index score)."""
+    now = datetime.utcnow()
+    return now.isoformat(), now.replace(tzinfo=timezone.utc).timestamp()
+
+
+class EmbeddedStatusTracker(StatusTracker):
+    """Track agent status in process memory, optionally persisted to SQLite."""
+    
+    def __init__(self, db_path: Optional[str] = None,
+                 heartbeat_ttl: float = HEARTBEAT_TTL,
+                 cold_store: Optional[AgentWorkflowLogger] = None,
+                 completed_ttl: float = COMPLETED_TTL,
+                 metrics: Optional[MetricsRegistry] = None):
+        """
+        Args:
+            db_path: SQLite file live agents are persisted to (None: memory only)
+            heartbeat_ttl, cold_store, completed_ttl, metrics: See StatusTracker
+        """
+        super().__init__(heartbeat_ttl, cold_store, completed_ttl, metrics)
+        self.db_path = db_path
+        self._db: Optional[sqlite3.Connection] = None
+        self._persist_lock = asyncio.Lock()
+        self._dirty: Set[str] = set()
+        
+        self.agents: Dict[str, Dict[str, Any]] = {}
+        # (kind, value) -> sorted [(started score, agent_id)]; (None, None) is the global index
+        self.indexes: Dict[Tuple[Optional[str], Optional[str]], List[Tuple[float, str]]] = {}
+        self.scores: Dict[str, float] = {}
+        self.active: Set[str] = set()
+        self.heartbeats: Dict[str, float] = {}
+        self.flush_queue: Dict[str, None] = {}  # finished agents to flush, in order (an ordered set)
+        self.expiring: Dict[str, float] = {}  # flushed agent -> monotonic expiry time
+        self.progress: Dict[str, Deque[Dict[str, Any]]] = {}
+        self.events: Deque[Dict[str, Any]] = deque(maxlen=EVENT_STREAM_MAXLEN)
+        self.reaped_total = 0
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._last_id = (0, 0)
+    
+    # Lifecycle
+    
+    async def connect(self):
+        """Open the persistence database (if any) and load the agents it holds."""
+        if self.db_path and self._db is None:
+            self._db, rows = await asyncio.to_thread(self._open_db)
+            for agent_id, data, active, heartbeat, queued in rows:
+                self._load(agent_id, json.loads(data), active, heartbeat, queued)
+    
+    def _open_db(self) -> Tuple[sqlite3.Connection, List[tuple]]:
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS live_agents (
+                agent_id TEXT PRIMARY KEY,
+                data JSON NOT NULL,
+                active INTEGER NOT NULL DEFAULT 0,
+                heartbeat REAL,
+                queued INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        conn.commit()
+        rows = conn.execute("SELECT agent_id, data, active, heartbeat, queued FROM live_agents").fetchall()
+        return conn, rows
+    
+    def _load(self, agent_id: str, agent: Dict[str, Any], active: int,
+              heartbeat: Optional[float], queued: int) -> None:
+        self.agents[agent_id] = agent
+        if agent.get("started_at"):
+            score = timestamp_score(agent["started_at"])
+            self.scores[agent_id] = score
+            self._index_add(None, None, agent_id, score)
+            for kind in ("workflow", "project", "status"):
+                if agent.get(kind):
+                    self._index_add(kind, agent[kind], agent_id, score)
+        if active:
+            self.active.add(agent_id)
+            if heartbeat is not None:
+                self.heartbeats[agent_id] = heartbeat
+        if queued:
+            self.flush_queue[agent_id] = None
+    
+    async def disconnect(self):
+        """Persist pending changes and close the database."""
+        if self._db is not None:
+            await self.persist()
+            await asyncio.to_thread(self._db.close)
+            self._db = None
+    
+    async def persist(self) -> int:
+        """
+        Write agents changed since the last call to the persistence database.
+        
+        Returns:
+            Number of agents written or deleted
+        """
+        if self._db is None or not self._dirty:
+            return 0
+        
+        async with self._persist_lock:
+            dirty, self._dirty = self._dirty, set()
+            queued = self.flush_queue
+            upserts, deletes = [], []
+            for agent_id in dirty:
+                agent = self.agents.get(agent_id)
+                # Flushed agents live on in the cold store
+                if agent is None or agent_id in self.expiring:
+                    deletes.append((agent_id,))
+                else:
+                    upserts.append((
+                        agent_id, json.dumps(agent), int(agent_id in self.active),
+                        self.heartbeats.get(agent_id), int(agent_id in queued)
+                    ))
+            try:
+                await asyncio.to_thread(self._write_db, upserts, deletes)
+            except Exception:
+                self._dirty |= dirty
+                raise
+        return len(dirty)
+    
+    def _write_db(self, upserts: List[tuple], deletes: List[tuple]) -> None:
+        with self._db:
+            self._db.executemany("""
+                INSERT OR REPLACE INTO live_agents (agent_id, data, active, heartbeat, queued)
+                VALUES (?, ?, ?, ?, ?)
+            """, upserts)
+            self._db.executemany("DELETE FROM live_agents WHERE agent_id = ?", deletes)
+    
+    # Indexes
+    
+    def _index_add(self, kind: Optional[str], value: Optional[str], agent_id: str, score: float) -> None:
+        bisect.insort(self.indexes.setdefault((kind, value), []), (score, agent_id))
+    
+    def _index_remove(self, kind: Optional[str], value: Optional[str], agent_id: str, score: float) -> None:
+        entries = self.indexes.get((kind, value))
+        if not entries:
+            return
+        i = bisect.bisect_left(entries, (score, agent_id))
+        if i < len(entries) and entries[i] == (score, agent_id):
+            del entries[i]
+            if not entries:
+                del self.indexes[(kind, value)]
+    
+    def _unindex(self, agent_id: str) -> None:
+        """Drop an agent from every index it is in."""
+        score = self.scores.pop(agent_id, None)
+        if score is None:
+            return
+        agent = self.agents.get(agent_id, {})
+        self._index_remove(None, None, agent_id, score)
+        for kind in ("workflow", "project", "status"):
+            if agent.get(kind):
+                self._index_remove(kind, agent[kind], agent_id, score)
+    
+    def _move_status(self, agent_id: str, agent: Dict[str, Any], status: str) -> None:
+        """Move an indexed agent between status indexes (before the status is written)."""
+        old = agent.get("status")
+        score = self.scores.get(agent_id)
+        if old == status or score is None:
+            return
+        if old:
+            self._index_remove("status", old, agent_id, score)
+        self._index_add("status", status, agent_id, score)
+    
+    # Events and progress
+    
+    def _next_id(self) -> str:
+        """Stream-style id ("<ms>-<seq>"), increasing within this tracker."""
+        ms = int(time.time() * 1000)
+        last_ms, seq = self._last_id
+        self._last_id = (last_ms, seq + 1) if ms <= last_ms else (ms, 0)
+        return f"{self._last_id[0]}-{self._last_id[1]}"
+    
+    def _publish(self, event_type: str, agent_id: str, data: Dict[str, Any]) -> None:
+        agent = self.agents.get(agent_id, {})
+        event = {
+            "id": self._next_id(),
+            "type": event_type,
+            "agent_id": agent_id,
+            "project": agent.get("project") or None,
+            "status": agent.get("status") or None,
+            "data": data
+        }
+        self.events.append(event)
+        for queue in self._subscribers:
+            queue.put_nowait(event)
+    
+    def _append_progress(self, agent_id: str, updates: Dict[str, str], ts: float,
+                         progress: Optional[Dict] = None) -> None:
+        """Append an update to the agent's progress history, capped by length and age."""
+        history = self.progress.get(agent_id)
+        if history is None:
+            history = self.progress[agent_id] = deque(maxlen=PROGRESS_MAXLEN)
+        history.append({
+            "id": self._next_id(),
+            "ts": ts,
+            "timestamp": updates["last_heartbeat"],
+            "status": updates.get("status"),
+            "current_task": updates.get("current_task"),
+            "progress": progress or None
+        })
+        while history[0]["ts"] < ts - PROGRESS_MAX_AGE:
+            history.popleft()
+    
+    # Writes
+    
+    def _register(self, agent_id: str, agent_type: str, workflow: str, project: str,
+                  metadata: Optional[Dict] = None) -> None:
+        now, score = _utcnow()
+        agent_data = {
+            "agent_id": agent_id,
+            "agent_type": agent_type,
+            "workflow": workflow,
+            "project": project,
+            "status": "starting",
+            "started_at": now,
+            "last_heartbeat": now,
+            "metadata": json.dumps(metadata or {})
+        }
+        
+        # A re-registration replaces the earlier run under this id
+        self._unindex(agent_id)
+        self.expiring.pop(agent_id, None)
+        self.progress.pop(agent_id, None)
+        self.agents[agent_id] = dict(agent_data, metadata=metadata or {})
+        self.scores[agent_id] = score
+        self._index_add(None, None, agent_id, score)
+        self._index_add("workflow", workflow, agent_id, score)
+        self._index_add("project", project, agent_id, score)
+        self._index_add("status", "starting", agent_id, score)
+        
+        self.active.add(agent_id)
+        self.heartbeats[agent_id] = score
+        self._dirty.add(agent_id)
+        self._publish("register", agent_id, agent_data)
+    
+    def _update(self, agent_id: str, status: str, current_task: Optional[str] = None,
+                progress: Optional[Dict] = None) -> bool:
+        agent = self.agents.get(agent_id)
+        if agent is None:
+            return False
+        now, score = _utcnow()
+        updates = {
+            "status": status,
+            "last_heartbeat": now
+        }
+        if current_task:
+            updates["current_task"] = current_task
+        if progress:
+            updates["progress"] = json.dumps(progress)
+        
+        self._move_status(agent_id, agent, status)
+        agent.update(updates)
+        if progress:
+            agent["progress"] = progress
+        if agent_id in self.heartbeats:
+            self.heartbeats[agent_id] = score
+        self._dirty.add(agent_id)
+        self._append_progress(agent_id, updates, score, progress)
+        self._publish("update", agent_id, updates)
+        return True
+    
+    def _refresh_heartbeat(self, agent_id: str) -> None:
+        now, score = _utcnow()
+        self.agents[agent_id]["last_heartbeat"] = now
+        self.heartbeats[agent_id] = score
+        self._dirty.add(agent_id)
+    
+    def _complete(self, agent_id: str, status: str = "completed",
+                  result_summary: Optional[str] = None, error: Optional[str] = None) -> bool:
+        agent = self.agents.get(agent_id)
+        if agent is None:
+            return False
+        updates = {
+            "status": status,
+            "completed_at": datetime.utcnow().isoformat(),
+            "last_heartbeat": datetime.utcnow().isoformat()
+        }
+        if result_summary:
+            updates["result_summary"] = result_summary
+        if error:
+            updates["error"] = error
+        
+        self._move_status(agent_id, agent, status)
+        agent.update(updates)
+        self.active.discard(agent_id)
+        self.heartbeats.pop(agent_id, None)
+        self.flush_queue[agent_id] = None
+        self._dirty.add(agent_id)
+        self._publish("complete", agent_id, updates)
+        return True
+    
+    @timed
+    async def register_agent(self, agent_id: str, agent_type: str,
+                             workflow: str, project: str,
+                             metadata: Optional[Dict] = None) -> None:
+        """Register a new agent."""
+        self._register(agent_id, agent_type, workflow, project, metadata)
+        self._notify_write()
+    
+    @timed
+    async def update_status(self, agent_id: str, status: str,
+                            current_task: Optional[str] = None,
+                            progress: Optional[Dict] = None) -> bool:
+        """
+        Update agent status.
+        
+        Returns:
+            False if the agent is unknown (never registered or expired)
+        """
+        if not self._update(agent_id, status, current_task, progress):
+            return False
+        self._notify_write()
+        return True
+    
+    @timed
+    async def heartbeat(self, agent_id: str) -> bool:
+        """
+        Refresh an agent's heartbeat without changing its status.
+        
+        Returns:
+            False if the agent is not active (finished, lost or unknown)
+        """
+        if agent_id not in self.active:
+            return False
+        self._refresh_heartbeat(agent_id)
+        return True
+    
+    @timed
+    async def complete_agent(self, agent_id: str, status: str = "completed",
+                             result_summary: Optional[str] = None,
+                             error: Optional[str] = None) -> bool:
+        """
+        Mark agent as completed.
+        
+        Returns:
+            False if the agent is unknown (never registered or expired)
+        """
+        if not self._complete(agent_id, status, result_summary, error):
+            return False
+        self._notify_write()
+        return True
+    
+    @timed
+    async def apply_bulk(self, operations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Apply many register/update/heartbeat/complete operations.
+        
+        Same operation format and results as AgentStatusTracker.apply_bulk.
+        """
+        results = []
+        for op in operations:
+            agent_id = op.get("agent_id")
+            kind = op.get("op")
+            result = {"agent_id": agent_id, "op": kind, "ok": False}
+            results.append(result)
+            
+            try:
+                if not agent_id:
+                    result["error"] = "agent_id required"
+                elif kind == "register":
+                    self._register(
+                        agent_id,
+                        agent_type=op.get("agent_type", "cursor-agent"),
+                        workflow=op.get("workflow", "unknown"),
+                        project=op.get("project", "unknown"),
+                        metadata=op.get("metadata")
+                    )
+                elif kind == "update":
+                    if not self._update(
+                        agent_id,
+                        status=op.get("status", "running"),
+                        current_task=op.get("current_task"),
+                        progress=op.get("progress")
+                    ):
+                        result["error"] = "Agent not found"
+                elif kind == "heartbeat":
+                    if agent_id in self.active:
+                        self._refresh_heartbeat(agent_id)
+                    else:
+                        result["error"] = "Agent not active"
+                elif kind == "complete":
+                    if not self._complete(
+                        agent_id,
+                        status=op.get("status", "completed"),
+                        result_summary=op.get("result_summary"),
+                        error=op.get("error")
+                    ):
+                        result["error"] = "Agent not found"
+                else:
+                    result["error"] = f"unknown op: {kind}"
+            except Exception as e:
+                result["error"] = str(e)
+            result["ok"] = "error" not in result
+        
+        # Heartbeats don't change anything the listings show
+        if any(r["ok"] and r["op"] != "heartbeat" for r in results):
+            self._notify_write()
+        return results
+    
+    @timed
+    async def reap_stale_agents(self, batch_size: int = 500) -> List[str]:
+        """
+        Move active agents whose heartbeat is older than heartbeat_ttl to "lost".
+        
+        Args:
+            batch_size: Unused (kept for interface compatibility)
+        
+        Returns:
+            IDs of the reaped agents
+        """
+        now, score = _utcnow()
+        cutoff = score - self.heartbeat_ttl
+        reaped = [agent_id for agent_id, score in self.heartbeats.items() if score <= cutoff]
+        
+        for agent_id in reaped:
+            agent = self.agents.setdefault(agent_id, {})
+            self._move_status(agent_id, agent, "lost")
+            agent.update(status="lost", completed_at=now, error="heartbeat expired")
+            del self.heartbeats[agent_id]
+            self.active.discard(agent_id)
+            self.flush_queue[agent_id] = None
+            self._dirty.add(agent_id)
+        self.reaped_total += len(reaped)
+        
+        if reaped:
+            self._notify_write()
+            for agent_id in reaped:
+                self._publish("lost", agent_id, {"error": "heartbeat expired"})
+        return reaped
+    
+    @timed
+    async def flush_completed(self, batch_size: int = 500) -> int:
+        """
+        Move one batch of finished agents to the cold store.
+        
+        Flushed agents leave the indexes and are dropped from memory
+        completed_ttl seconds later; without a cold store they are dropped
+        the same way, unsaved. Also expires agents due for removal and
+        persists pending changes when a database is configured.
+        
+        Returns:
+            Number of agents taken off the queue
+        """
+        self._expire()
+        if not self.flush_queue:
+            await self.persist()
+            return 0
+        
+        ids = list(islice(self.flush_queue, batch_size))
+        for agent_id in ids:
+            del self.flush_queue[agent_id]
+        # Skip agents that are gone or were re-registered meanwhile
+        agents = [
+            dict(self.agents[i]) for i in ids
+            if i not in self.active and i in self.agents
+            and self.agents[i].get("agent_id") and self.agents[i].get("started_at")
+        ]
+        if self.cold_store is not None:
+            try:
+                await asyncio.to_thread(self._save_cold, agents)
+            except Exception:
+                self.flush_queue = {**dict.fromkeys(ids), **self.flush_queue}
+                raise
+        
+        expires_at = time.monotonic() + self.completed_ttl
+        for agent in agents:
+            agent_id = agent["agent_id"]
+            # Re-registered during the write: a new run under the same id
+            if agent_id in self.active or self.agents.get(agent_id, {}).get("started_at") != agent["started_at"]:
+                continue
+            self._unindex(agent_id)
+            self.expiring[agent_id] = expires_at
+            self._dirty.add(agent_id)
+        await self.persist()
+        return len(ids)
+    
+    def _expire(self) -> None:
+        """Drop flushed agents whose completed_ttl has passed."""
+        now = time.monotonic()
+        for agent_id, expires_at in list(self.expiring.items()):
+            if expires_at <= now:
+                del self.expiring[agent_id]
+                self.agents.pop(agent_id, None)
+                self.progress.pop(agent_id, None)
+                self._dirty.add(agent_id)
+    
+    # Reads
+    
+    @timed
+    async def get_agent_status(self, agent_id: str) -> Optional[Dict]:
+        """Get status for a specific agent."""
+        agent = self.agents.get(agent_id)
+        if agent is not None:
+            return dict(agent)
+        if self.cold_store is not None:
+            return await asyncio.to_thread(self.cold_store.get_agent_status, agent_id)
+        return None
+    
+    @timed
+    async def get_agents(self, agent_ids: List[str]) -> List[Dict]:
+        """Get status for many agents (unknown ones skipped), in order."""
+        return [dict(self.agents[i]) for i in agent_ids if i in self.agents]
+    
+    @timed
+    async def get_active_agents(self) -> List[Dict]:
+        """Get all active agents."""
+        return [dict(self.agents[i]) for i in self.active if i in self.agents]
+    
+    @timed
+    async def get_all_agents(self, limit: int = 100,
+                             before: Optional[Union[str, float]] = None,
+                             after: Optional[Union[str, float]] = None,
+                             workflow: Optional[str] = None,
+                             project: Optional[str] = None,
+                             status: Optional[str] = None) -> List[Dict]:
+        """
+        Get agents (active and completed), newest first.
+        
+        Same arguments and index selection as AgentStatusTracker.get_all_agents;
+        the range scan is a bisect on the driving index.
+        """
+        filters = {"status": status, "project": project, "workflow": workflow}
+        driver_kind = next((kind for kind, value in filters.items() if value), None)
+        entries = self.indexes.get((driver_kind, filters.get(driver_kind)), [])
+        remaining = {k: v for k, v in filters.items() if v and k != driver_kind}
+        
+        hi = bisect.bisect_left(entries, (timestamp_score(before),)) if before is not None else len(entries)
+        lo = (bisect.bisect_left(entries, (math.nextafter(timestamp_score(after), math.inf),))
+              if after is not None else 0)
+        
+        agents = []
+        for i in range(hi - 1, lo - 1, -1):
+            agent = self.agents[entries[i][1]]
+            if all(agent.get(k) == v for k, v in remaining.items()):
+                agents.append(dict(agent))
+                if len(agents) == limit:
+                    break
+        
+        return await self._merge_cold(agents, limit, before, after, workflow, project, status)
+    
+    @timed
+    async def get_progress_history(self, agent_id: str, limit: int = 100) -> List[Dict[str, Any]]:
+        """Recent status updates of an agent, oldest first."""
+        history = self.progress.get(agent_id, ())
+        return [dict(entry) for entry in islice(history, max(len(history) - limit, 0), None)]
+    
+    @timed
+    async def get_events_since(self, last_event_id: str, count: int = 1000) -> List[Dict[str, Any]]:
+        """Events after last_event_id still held in the log, oldest first."""
+        last = event_id_key(last_event_id)
+        newer = dropwhile(lambda event: event_id_key(event["id"]) <= last, self.events)
+        return list(islice(newer, count))
+    
+    async def subscribe_events(self) -> AsyncIterator[Dict[str, Any]]:
+        """Yield events as they are published."""
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.add(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._subscribers.discard(queue)
+    
+    # Stats
+    
+    async def get_storage_stats(self) -> Dict[str, Any]:
+        """Sizes of the hot tier (what this process holds)."""
+        return {
+            "active": len(self.active),
+            "indexed": len(self.scores),
+            "pending_flush": len(self.flush_queue),
+            "cold_store": self.cold_store.db_path if self.cold_store is not None else None,
+            "persisted_to": self.db_path
+        }
+    
+    async def get_status_counts(self) -> Dict[str, Dict[str, int]]:
+        """Agents per status in memory (hot) and in the cold store."""
+        hot = {value: len(entries) for (kind, value), entries in self.indexes.items() if kind == "status"}
+        cold = {}
+        if self.cold_store is not None:
+            cold = await asyncio.to_thread(self.cold_store.count_agent_statuses)
+        return {"hot": hot, "cold": cold}
+    
+    async def get_reaper_stats(self) -> Dict[str, Any]:
+        """Reaper counters."""
+        return {
+            "reaped_total": self.reaped_total,
+            "tracked_heartbeats": len(self.heartbeats),
+            "heartbeat_ttl": self.heartbeat_ttl
+        }
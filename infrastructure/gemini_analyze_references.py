@@ -13,13 +13,19 @@ from pathlib import Path
 sys.path.insert(0, '/Users/cstein/code/ncl_agents/src')
 
 from llm_lib.llm.manager import LLM
+from llm_cache import CachedLLM
 
 
 class ReferenceAnalyzer:
     """Extract style guidelines from reference papers."""
     
-    def __init__(self, model: str = "vertex_ai/gemini-2.5-pro"):
-        self.llm = LLM(model=model)
+    def __init__(self, model: str = "vertex_ai/gemini-2.5-pro", no_cache: bool = False):
+        """
+        Args:
+            model: Model to use
+            no_cache: Ignore cached responses (fresh ones are still cached)
+        """
+        self.llm = CachedLLM(LLM(model=model), model, bypass=no_cache)
         self.model = model
     
     def analyze_references(self, reference_info: str) -> str:
@@ -79,6 +85,8 @@ def main():
     parser.add_argument("--references-dir", required=True, help="Directory with reference papers")
     parser.add_argument("--output", "-o", required=True, help="Output markdown file")
     parser.add_argument("--model", default="vertex_ai/gemini-2.5-pro", help="Model to use")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Ignore cached LLM responses (set LLM_CACHE=off to disable caching)")
     
     args = parser.parse_args()
     
@@ -97,8 +105,9 @@ def main():
     print(f"🔍 Analyzing reference papers...", file=sys.stderr)
     
     # Analyze
-    analyzer = ReferenceAnalyzer(model=args.model)
+    analyzer = ReferenceAnalyzer(model=args.model, no_cache=args.no_cache)
     style_guide = analyzer.analyze_references(reference_info)
+    print(analyzer.llm.summary(), file=sys.stderr)
     
     # Write output
     output_path = Path(args.output)
@@ -34,6 +34,17 @@ ORCH_LOG="$LOG_DIR/orchestrator.log"
 # Gemini scripts location
 GEMINI_DIR="/Users/cstein/code/agent-workflows/infrastructure"
 
+# Gemini responses are cached on disk (llm_cache.py), so rerunning after a
+# failure skips calls whose inputs are unchanged. LLM_CACHE=off disables it.
+
+# Incremental state: assessment and recommendations per section of the last
+# analyzed version, so the next version only re-sends sections that changed.
+# Kept outside paper/ so the per-iteration commit doesn't pick them up.
+STATE_DIR="$PROJECT_DIR/.cache/gemini_improve"
+mkdir -p "$STATE_DIR"
+ASSESSMENT_STATE="$STATE_DIR/strategic_assessment_state.json"
+ANALYSIS_STATE="$STATE_DIR/analysis_state.json"
+
 # ============================================================================
 # LOGGING
 # ============================================================================
@@ -74,6 +85,7 @@ log "PHASE1" "Strategic assessment (Gemini)"
 python3 "$GEMINI_DIR/gemini_strategic_assessment.py" \
     "$INPUT_PAPER" \
     --output "$LOG_DIR/strategic_assessment.md" \
+    --state "$ASSESSMENT_STATE" \
     2>&1 | tee -a "$ORCH_LOG"
 
 log "INFO" "Strategic assessment complete"
@@ -111,19 +123,18 @@ if [ -d "/Users/cstein/vaults/projects/science/activation_function" ]; then
         | head -200 > "$KB_SUMMARY"
 fi
 
-# Generate recommendations for each improvement type
-for imp_type in align_sources sharpen_arguments improve_style restructure check_consistency; do
-    log "ANALYZE" "Analyzing for: $imp_type"
-    
-    python3 "$GEMINI_DIR/gemini_paper_analyzer.py" \
-        "$OUTPUT_PAPER" \
-        --type "$imp_type" \
-        --kb-summary "$KB_SUMMARY" \
-        --style-guide "$STYLE_GUIDE" \
-        --strategic-goals "$LOG_DIR/strategic_assessment.md" \
-        --output "$LOG_DIR/recommendations_${imp_type}.md" \
-        2>&1 | tee -a "$ORCH_LOG"
-done
+# Generate recommendations for all improvement types concurrently (one process)
+log "ANALYZE" "Analyzing for: align_sources sharpen_arguments improve_style restructure check_consistency"
+
+python3 "$GEMINI_DIR/gemini_paper_analyzer.py" \
+    "$OUTPUT_PAPER" \
+    --type all \
+    --kb-summary "$KB_SUMMARY" \
+    --style-guide "$STYLE_GUIDE" \
+    --strategic-goals "$LOG_DIR/strategic_assessment.md" \
+    --output-dir "$LOG_DIR" \
+    --state "$ANALYSIS_STATE" \
+    2>&1 | tee -a "$ORCH_LOG"
 
 log "INFO" "All recommendations generated"
 
@@ -175,6 +186,15 @@ log "EXECUTE" "Running cursor-agent to apply improvements"
 
 cd "$PROJECT_DIR"
 
+# Parse cursor-agent stream-json into the workflow log DB (non-critical)
+ingest_cursor_events() {
+    python3 "$GEMINI_DIR/cursor_stream_ingester.py" \
+        "$LOG_DIR/cursor_agent.jsonl" \
+        --db "$PROJECT_DIR/agent_logs.db" \
+        --run-id "$RUN_ID" \
+        2>&1 | tee -a "$ORCH_LOG" || log "WARN" "Event ingestion failed (non-critical)"
+}
+
 cursor-agent \
     --model sonnet-4.5-thinking \
     --print \
@@ -183,10 +203,12 @@ cursor-agent \
     < /dev/null \
     > "$LOG_DIR/cursor_agent.jsonl" 2>&1 || {
     log "ERROR" "cursor-agent failed with exit code $?"
+    ingest_cursor_events
     exit 1
 }
 
 log "INFO" "cursor-agent completed"
+ingest_cursor_events
 
 # Check if changes were made
 CHANGES=$(diff "$INPUT_PAPER" "$OUTPUT_PAPER" | wc -l)
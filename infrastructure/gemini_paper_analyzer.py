@@ -2,18 +2,40 @@
 """
 Gemini-based paper analyzer for improvement recommendations.
 Analyzes full paper with context and provides section-by-section recommendations.
+
+Several improvement types can be analyzed in one process, concurrently
+(`--type all --output-dir DIR`), so total time is close to the slowest call.
+All analyses share one prompt prefix (paper + KB/style/goals context, see
+context_cache.py), which the provider can cache after the first call
+(LLM_CONTEXT_CACHE=provider). Papers over
+the token budget (`--token-budget`) are analyzed in section-aligned parts
+in parallel and the results merged.
+
+With `--state FILE`, only sections that changed since the run recorded in
+FILE are sent; unchanged sections keep their previous recommendations (see
+latex_sections.py).
 """
 
 import sys
 import os
+import re
 import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Dict, Any, List, Tuple, Callable
 
 # Add ncl_agents to path
 sys.path.insert(0, '/Users/cstein/code/ncl_agents/src')
 
 from llm_lib.llm.manager import LLM
+from llm_cache import CachedLLM
+from context_cache import (
+    ContextCache, paper_block, context_block, sections_block, part_block, paper_budget, MAP_WORKERS
+)
+from latex_sections import (
+    read_paper, parse_sections, analysis_units, changed_units, fingerprint,
+    load_state, save_state, estimate_tokens, budget_chunks, DEFAULT_TOKEN_BUDGET
+)
 
 
 class PaperAnalyzer:
@@ -42,8 +64,22 @@ class PaperAnalyzer:
         }
     }
     
-    def __init__(self, model: str = "vertex_ai/gemini-2.5-pro"):
-        self.llm = LLM(model=model)
+    def __init__(
+        self,
+        model: str = "vertex_ai/gemini-2.5-pro",
+        no_cache: bool = False,
+        token_budget: int = DEFAULT_TOKEN_BUDGET
+    ):
+        """
+        Args:
+            model: Model to use
+            no_cache: Ignore cached responses (fresh ones are still cached)
+            token_budget: Max estimated prompt tokens; longer papers are
+                analyzed in section-aligned parts (map-reduce)
+        """
+        self.llm = CachedLLM(LLM(model=model), model, bypass=no_cache)
+        self.context_cache = ContextCache(model)
+        self.token_budget = token_budget
         self.model = model
     
     def analyze(
@@ -72,44 +108,40 @@ class PaperAnalyzer:
         
         imp_info = self.IMPROVEMENT_TYPES[improvement_type]
         
-        system_prompt = f"""You are an expert scientific writing editor for top-tier ML conferences.
-You are analyzing a paper for: {imp_info['name']}
-
-Focus: {imp_info['focus']}
-
-Your goal: Help this paper reach NeurIPS spotlight/oral quality."""
-
-        # Build context
-        context_parts = []
-        
-        if strategic_goals:
-            context_parts.append(f"STRATEGIC GOALS:\n{strategic_goals}\n")
-        
-        if style_guide:
-            context_parts.append(f"STYLE GUIDELINES (from top papers):\n{style_guide}\n")
+        context = context_block(kb_summary, style_guide, strategic_goals)
+        budget = paper_budget(self.token_budget, context)
+        if estimate_tokens(paper_tex) > budget:
+            return self._analyze_chunked(paper_tex, improvement_type, context, budget)
         
-        if kb_summary:
-            context_parts.append(f"KNOWLEDGE BASE SUMMARY:\n{kb_summary}\n")
+        # Shared prefix (paper, then context) first; only the task differs per type
+        task = self._task(imp_info)
+        messages = self.context_cache.build([paper_block(paper_tex), context], task)
         
-        context = "\n".join(context_parts) if context_parts else ""
-        
-        user_prompt = f"""{context}
+        response = self.llm.chat(messages, temperature=0.3, max_tokens=4000)
+        return response
+    
+    @staticmethod
+    def _task(
+        imp_info: Dict[str, str],
+        target: str = "the paper above",
+        scope: str = "current state",
+        sections: str = "For each major section (Abstract, Introduction, Methods, Results, Discussion, Conclusion):"
+    ) -> str:
+        """Analysis instructions for one improvement type (sent after the shared prefix)."""
+        return f"""TASK: Analyze {target} for {imp_info['name']}
 
-PAPER TO ANALYZE:
-```latex
-{paper_tex}
-```
+Focus: {imp_info['focus']}
 
-TASK: Analyze for {imp_info['name']}
+Your goal: Help this paper reach NeurIPS spotlight/oral quality.
 
 Provide:
 
 ## Overall Assessment
-Brief 2-3 sentence assessment of current state for this improvement dimension.
+Brief 2-3 sentence assessment of {scope} for this improvement dimension.
 
 ## Section-by-Section Recommendations
 
-For each major section (Abstract, Introduction, Methods, Results, Discussion, Conclusion):
+{sections}
 
 ### [Section Name]
 
@@ -124,14 +156,279 @@ For each major section (Abstract, Introduction, Methods, Results, Discussion, Co
 **Priority:** [High/Medium/Low]
 
 Be specific and actionable. Focus only on {imp_info['name']}."""
-
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ]
+    
+    def _analyze_chunked(
+        self,
+        paper_tex: str,
+        improvement_type: str,
+        context: Optional[str],
+        budget: int
+    ) -> str:
+        """
+        analyze() for papers over the token budget (map-reduce).
         
-        response = self.llm.chat(messages, temperature=0.3, max_tokens=4000)
-        return response
+        Section-aligned parts are analyzed in parallel; their per-section
+        recommendations are merged in paper order and one short call
+        combines the parts' overall assessments.
+        """
+        imp_info = self.IMPROVEMENT_TYPES[improvement_type]
+        chunks = budget_chunks(paper_tex, budget)
+        
+        def analyze_part(index: int) -> str:
+            task = self._task(
+                imp_info,
+                target=f"part {index + 1} of {len(chunks)} of the paper (above)",
+                scope="this part",
+                sections="For each section in this part, using its title as given:"
+            )
+            messages = self.context_cache.build([part_block(chunks, index), context], task)
+            return self.llm.chat(messages, temperature=0.3, max_tokens=4000)
+        
+        with ThreadPoolExecutor(max_workers=min(MAP_WORKERS, len(chunks))) as pool:
+            partials = list(pool.map(analyze_part, range(len(chunks))))
+        
+        overalls = []
+        merged: Dict[str, List[str]] = {}  # title key -> [heading, body]
+        for index, partial in enumerate(partials):
+            overall, sections = self._split_recommendations(partial)
+            if not sections and not overall:
+                sections = [(f"Part {index + 1} ({', '.join(chunks[index]['titles'])})", partial.strip())]
+            if overall:
+                overalls.append(f"PART {index + 1}: {overall}")
+            for heading, body in sections:
+                key = self._title_key(heading)
+                if key in merged:
+                    # A section split across parts
+                    merged[key][1] += "\n\n" + body
+                else:
+                    merged[key] = [heading.strip("#*[] \t"), body]
+        
+        overall = ""
+        if overalls:
+            task = (f"TASK: These are assessments of consecutive parts of one paper for {imp_info['name']}. "
+                    "Combine them into a single brief 2-3 sentence overall assessment of the paper. "
+                    "Output only the assessment.\n\n" + "\n\n".join(overalls))
+            overall = self.llm.chat(self.context_cache.build([], task), temperature=0.3, max_tokens=500).strip()
+        return self._render(overall, list(merged.values()))
+    
+    @staticmethod
+    def _render(overall: str, sections: List[Tuple[str, str]]) -> str:
+        """Recommendations markdown from an overall assessment and (title, recommendations) pairs."""
+        parts = [f"## Overall Assessment\n{overall}\n", "## Section-by-Section Recommendations\n"]
+        for title, body in sections:
+            parts.append(f"### {title}\n\n{body}\n")
+        return "\n".join(parts)
+    
+    def analyze_incremental(
+        self,
+        paper_tex: str,
+        improvement_type: str,
+        state: Dict[str, Any],
+        kb_summary: Optional[str] = None,
+        style_guide: Optional[str] = None,
+        strategic_goals: Optional[str] = None
+    ) -> str:
+        """
+        Analyze only the sections that changed since the run recorded in state.
+        
+        Unchanged sections keep their recommendations from that run; if the
+        KB summary, style guide or model changed, every section is
+        re-analyzed (strategic goals are updated every version, so they
+        only inform the sections being re-analyzed). A changed section the
+        response has no heading for keeps its previous recommendations and
+        is re-analyzed next run. Changed sections over the token budget are
+        analyzed in parts (map-reduce, as in analyze()). Falls back to
+        analyze() for papers without recognizable sections.
+        
+        Args:
+            paper_tex, improvement_type, kb_summary, style_guide, strategic_goals: As for analyze()
+            state: Per-type section fingerprints and recommendations from the
+                previous run (latex_sections.load_state); updated in place
+        
+        Returns:
+            Markdown recommendations for the whole paper
+        """
+        if improvement_type not in self.IMPROVEMENT_TYPES:
+            raise ValueError(f"Unknown improvement type: {improvement_type}")
+        
+        units = analysis_units(parse_sections(paper_tex))
+        if not units:
+            return self.analyze(paper_tex, improvement_type, kb_summary, style_guide, strategic_goals)
+        
+        imp_info = self.IMPROVEMENT_TYPES[improvement_type]
+        context = context_block(kb_summary, style_guide, strategic_goals)
+        context_fp = fingerprint(context_block(kb_summary, style_guide) or "")
+        entry = state.setdefault("types", {}).get(improvement_type)
+        if not entry or entry.get("context") != context_fp or entry.get("model") != self.model:
+            entry = {"context": context_fp, "model": self.model, "overall": "", "sections": {}}
+        sections = entry["sections"]
+        
+        changed = changed_units(units, {key: s["fingerprint"] for key, s in sections.items()})
+        unmatched: List[Tuple[str, str]] = []
+        if changed:
+            block = sections_block(units, changed)
+            budget = paper_budget(self.token_budget, context)
+            if estimate_tokens(block) > budget:
+                changed_tex = "".join(unit["text"] for unit in changed)
+                response = self._analyze_chunked(changed_tex, improvement_type, context, budget)
+            else:
+                task = self._task(
+                    imp_info,
+                    target="the changed sections above",
+                    scope="the changed sections",
+                    sections="For each changed section, using its title exactly as given:"
+                )
+                messages = self.context_cache.build([block, context], task)
+                response = self.llm.chat(messages, temperature=0.3, max_tokens=4000)
+            unmatched = self._merge_response(entry, changed, response, improvement_type)
+        
+        # Forget sections that no longer exist
+        entry["sections"] = {u["key"]: sections[u["key"]] for u in units if u["key"] in sections}
+        state["types"][improvement_type] = entry
+        
+        return self._render(entry["overall"], [
+            (unit["title"], entry["sections"][unit["key"]]["recommendations"])
+            for unit in units if unit["key"] in entry["sections"]
+        ] + unmatched)
+    
+    def _merge_response(
+        self,
+        entry: Dict[str, Any],
+        changed: List[Dict[str, Any]],
+        response: str,
+        improvement_type: str
+    ) -> List[Tuple[str, str]]:
+        """
+        Store the recommendations of the changed sections from a response.
+        
+        Only sections whose heading matches get their new fingerprint. The
+        others keep their previous recommendations (if any) and fingerprint,
+        so they are re-analyzed next run.
+        
+        Returns:
+            (heading, recommendations) pairs of the response that matched no
+            changed section (the raw response if it had no headings), to be
+            shown instead of dropped; empty when everything matched
+        """
+        overall, recommendations = self._split_recommendations(response)
+        by_title = {self._title_key(heading): body for heading, body in recommendations}
+        if overall:
+            entry["overall"] = overall
+        
+        matched = set()
+        missing = []
+        for unit in changed:
+            title_key = self._title_key(unit["title"])
+            body = by_title.get(title_key)
+            if body is None:
+                missing.append(unit["title"])
+                continue
+            matched.add(title_key)
+            entry["sections"][unit["key"]] = {
+                "fingerprint": unit["fingerprint"],
+                "title": unit["title"],
+                "recommendations": body
+            }
+        if not missing:
+            return []
+        
+        print(f"⚠️  {improvement_type}: no recommendations matched {', '.join(missing)}; "
+              f"keeping previous ones, re-analyzing next run", file=sys.stderr)
+        if not recommendations:
+            return [("Unmatched response", response.strip())]
+        return [(heading, body) for heading, body in recommendations
+                if self._title_key(heading) not in matched]
+    
+    @staticmethod
+    def _title_key(title: str) -> str:
+        """Comparable form of a section heading ("### 1. [Intro]" ~ "Intro")."""
+        title = re.sub(r"^[\s\d.]+", "", title.strip("#*[] \t"))
+        return " ".join(re.sub(r"[^\w\s]", " ", title.lower()).split())
+    
+    @staticmethod
+    def _split_recommendations(response: str) -> Tuple[str, List[Tuple[str, str]]]:
+        """(overall assessment, [(section heading, recommendations)]) from a markdown response."""
+        overall = ""
+        sections: List[Tuple[str, str]] = []
+        for block in re.split(r"^(?=#{2,3} )", response, flags=re.MULTILINE):
+            heading, _, body = block.partition("\n")
+            if heading.startswith("### "):
+                sections.append((heading[4:].strip(), body.strip()))
+            elif heading.startswith("## ") and "overall" in heading.lower():
+                overall = body.strip()
+        return overall, sections
+    
+    def analyze_many(
+        self,
+        paper_tex: str,
+        improvement_types: List[str],
+        kb_summary: Optional[str] = None,
+        style_guide: Optional[str] = None,
+        strategic_goals: Optional[str] = None,
+        max_workers: int = 5,
+        on_complete: Optional[Callable[[str, str], None]] = None,
+        state: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, str]:
+        """
+        Analyze the paper for several improvement types concurrently.
+        
+        Args:
+            paper_tex, kb_summary, style_guide, strategic_goals: As for analyze()
+            improvement_types: Types to analyze
+            max_workers: Max LLM calls in flight
+            on_complete: Called with (type, recommendations) as each finishes
+            state: Incremental state (see analyze_incremental); None analyzes
+                the whole paper
+        
+        With provider context caching, the first analysis of a new prefix runs
+        alone so the others hit the cached prefix instead of all paying for it.
+        
+        Returns:
+            Recommendations by improvement type
+        
+        Raises:
+            RuntimeError: If any analysis failed (after the others finished)
+        """
+        unknown = [t for t in improvement_types if t not in self.IMPROVEMENT_TYPES]
+        if unknown:
+            raise ValueError(f"Unknown improvement types: {', '.join(unknown)}")
+        
+        results = {}
+        errors = {}
+        
+        def record(imp_type: str, run: Callable[[], str]) -> None:
+            try:
+                results[imp_type] = run()
+            except Exception as e:
+                errors[imp_type] = e
+                return
+            if on_complete:
+                on_complete(imp_type, results[imp_type])
+        
+        if state is None:
+            run = lambda imp_type: self.analyze(paper_tex, imp_type, kb_summary, style_guide, strategic_goals)
+        else:
+            state.setdefault("types", {})
+            run = lambda imp_type: self.analyze_incremental(
+                paper_tex, imp_type, state, kb_summary, style_guide, strategic_goals
+            )
+        
+        pending = list(improvement_types)
+        prefix = [paper_block(paper_tex), context_block(kb_summary, style_guide, strategic_goals)]
+        if (state is None and self.context_cache.mode == "provider" and len(pending) > 1
+                and not self.context_cache.is_registered([b for b in prefix if b])):
+            first = pending.pop(0)
+            record(first, lambda: run(first))
+        
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(pending) or 1))) as pool:
+            futures = {pool.submit(run, imp_type): imp_type for imp_type in pending}
+            for future in as_completed(futures):
+                record(futures[future], future.result)
+        
+        if errors:
+            details = "; ".join(f"{t}: {e}" for t, e in errors.items())
+            raise RuntimeError(f"{len(errors)} of {len(improvement_types)} analyses failed: {details}")
+        return results
 
 
 def main():
@@ -141,41 +438,74 @@ def main():
     parser.add_argument(
         "--type",
         required=True,
-        choices=list(PaperAnalyzer.IMPROVEMENT_TYPES.keys()),
-        help="Type of improvement analysis"
+        help="Improvement type, comma-separated types, or 'all' "
+             f"({', '.join(PaperAnalyzer.IMPROVEMENT_TYPES)})"
     )
     parser.add_argument("--kb-summary", help="KB summary file")
     parser.add_argument("--style-guide", help="Style guide file")
     parser.add_argument("--strategic-goals", help="Strategic assessment file")
-    parser.add_argument("--output", "-o", required=True, help="Output markdown file")
+    parser.add_argument("--output", "-o", help="Output markdown file (single type)")
+    parser.add_argument("--output-dir", help="Write recommendations_{type}.md for each type here")
+    parser.add_argument("--jobs", "-j", type=int, default=5, help="Concurrent analyses")
+    parser.add_argument("--state", help="Incremental: reuse results for sections unchanged since the "
+                                        "run recorded in this JSON file, then update it")
     parser.add_argument("--model", default="vertex_ai/gemini-2.5-pro", help="Model to use")
+    parser.add_argument("--token-budget", type=int, default=DEFAULT_TOKEN_BUDGET,
+                        help="Max estimated prompt tokens before splitting the paper (env LLM_TOKEN_BUDGET)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Ignore cached LLM responses (set LLM_CACHE=off to disable caching)")
     
     args = parser.parse_args()
     
+    if args.type == "all":
+        imp_types = list(PaperAnalyzer.IMPROVEMENT_TYPES)
+    else:
+        imp_types = [t.strip() for t in args.type.split(",") if t.strip()]
+    unknown = [t for t in imp_types if t not in PaperAnalyzer.IMPROVEMENT_TYPES]
+    if unknown or not imp_types:
+        parser.error(f"unknown improvement type(s): {', '.join(unknown) or args.type}")
+    if args.output_dir is None and (args.output is None or len(imp_types) > 1):
+        parser.error("--output-dir is required for several types (--output for a single one)")
+    
     # Read inputs
-    paper_tex = Path(args.paper_file).read_text()
+    paper_tex = read_paper(args.paper_file)
     kb_summary = Path(args.kb_summary).read_text() if args.kb_summary else None
     style_guide = Path(args.style_guide).read_text() if args.style_guide else None
     strategic_goals = Path(args.strategic_goals).read_text() if args.strategic_goals else None
     
-    print(f"🔍 Analyzing paper for {args.type}...", file=sys.stderr)
-    
-    # Analyze
-    analyzer = PaperAnalyzer(model=args.model)
-    recommendations = analyzer.analyze(
-        paper_tex,
-        args.type,
-        kb_summary=kb_summary,
-        style_guide=style_guide,
-        strategic_goals=strategic_goals
-    )
+    print(f"🔍 Analyzing paper for {', '.join(imp_types)}...", file=sys.stderr)
     
-    # Write output
-    output_path = Path(args.output)
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    output_path.write_text(recommendations)
+    def write_output(imp_type: str, recommendations: str) -> None:
+        if args.output_dir:
+            output_path = Path(args.output_dir) / f"recommendations_{imp_type}.md"
+        else:
+            output_path = Path(args.output)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        output_path.write_text(recommendations)
+        print(f"✅ {imp_type} recommendations written to {output_path}", file=sys.stderr)
     
-    print(f"✅ Recommendations written to {args.output}", file=sys.stderr)
+    # Analyze (each result is written as soon as it arrives)
+    analyzer = PaperAnalyzer(model=args.model, no_cache=args.no_cache, token_budget=args.token_budget)
+    state = load_state(args.state) if args.state else None
+    try:
+        analyzer.analyze_many(
+            paper_tex,
+            imp_types,
+            kb_summary=kb_summary,
+            style_guide=style_guide,
+            strategic_goals=strategic_goals,
+            max_workers=args.jobs,
+            on_complete=write_output,
+            state=state
+        )
+    except RuntimeError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        if state is not None:
+            save_state(args.state, state)
+        print(analyzer.llm.summary(), file=sys.stderr)
+        print(analyzer.context_cache.summary(), file=sys.stderr)
 
 
 if __name__ == "__main__":
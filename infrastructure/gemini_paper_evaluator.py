@@ -2,13 +2,20 @@
 """
 Gemini-based paper quality evaluator.
 Provides structured assessment for research papers targeting top-tier venues.
+
+The full LaTeX source is sent alongside the PDF; a paper over the token
+budget (after an estimate of the PDF's own tokens) is read in
+section-aligned parts in parallel and summarized for the evaluation instead.
 """
 
 import sys
 import os
+import re
 import json
 import argparse
 import base64
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
 from typing import Dict, Any, List
@@ -17,13 +24,58 @@ from typing import Dict, Any, List
 sys.path.insert(0, '/Users/cstein/code/ncl_agents/src')
 
 from llm_lib.llm.manager import LLM
+from llm_cache import CachedLLM
+from context_cache import part_block, paper_budget, MAP_WORKERS
+from latex_sections import estimate_tokens, budget_chunks, DEFAULT_TOKEN_BUDGET
+
+
+PDF_TOKENS_PER_PAGE = 258  # Gemini's per-page cost for PDF input
+PDF_BYTES_PER_PAGE = 50_000  # page estimate when no page objects are found
+PDF_PAGE_RE = re.compile(rb"/Type\s*/Page\b")
+
+
+def pdf_pages(data: bytes) -> int:
+    """Page objects in a PDF, including those inside compressed object streams."""
+    pages = len(PDF_PAGE_RE.findall(data))
+    for match in re.finditer(rb"(?<!end)stream\r?\n", data):
+        header = data[max(0, match.start() - 300):match.start()]
+        if b"/ObjStm" not in header[header.rfind(b"<<"):]:
+            continue
+        try:
+            pages += len(PDF_PAGE_RE.findall(zlib.decompressobj().decompress(data[match.end():])))
+        except zlib.error:
+            pass
+    return pages
+
+
+def pdf_tokens(pdf_path: str) -> int:
+    """Rough prompt tokens of an attached PDF (0 if it can't be read)."""
+    try:
+        data = Path(pdf_path).read_bytes()
+    except OSError:
+        return 0
+    pages = pdf_pages(data) or -(-len(data) // PDF_BYTES_PER_PAGE)
+    return pages * PDF_TOKENS_PER_PAGE
 
 
 class PaperEvaluator:
     """Evaluate research paper quality with structured scores."""
     
-    def __init__(self, model: str = "vertex_ai/gemini-2.5-pro"):
-        self.llm = LLM(model=model)
+    def __init__(
+        self,
+        model: str = "vertex_ai/gemini-2.5-pro",
+        no_cache: bool = False,
+        token_budget: int = DEFAULT_TOKEN_BUDGET
+    ):
+        """
+        Args:
+            model: Model to use
+            no_cache: Ignore cached responses (fresh ones are still cached)
+            token_budget: Max estimated prompt tokens including the PDF;
+                longer LaTeX sources are summarized part by part (map-reduce)
+        """
+        self.llm = CachedLLM(LLM(model=model), model, bypass=no_cache)
+        self.token_budget = token_budget
         self.model = model
     
     def evaluate(
@@ -65,6 +117,15 @@ Provide scores on a 1-10 scale where:
 
 DEFAULT TO LOWER SCORES. Be harsh. Most papers are 4-6."""
 
+        budget = paper_budget(self.token_budget, reserved=pdf_tokens(paper_pdf_path))
+        if estimate_tokens(paper_tex) > budget:
+            latex_reference = self._part_summaries(paper_tex, budget)
+            reference_note = ("The LaTeX source is too long to include, so reviewer notes on each of "
+                              "its parts are provided instead.")
+        else:
+            latex_reference = f"PAPER (LaTeX source for reference):\n```latex\n{paper_tex}\n```"
+            reference_note = "Also provided is the LaTeX source for reference."
+        
         user_prompt = f"""Evaluate this research paper for submission to a top-tier ML conference (NeurIPS/ICML).
 
 You are evaluating the RENDERED PDF, not just the LaTeX source. Assess:
@@ -73,12 +134,9 @@ You are evaluating the RENDERED PDF, not just the LaTeX source. Assess:
 - Whether claims are supported by results
 - Overall paper "feel" and professionalism
 
-The PDF is attached. Also provided is the LaTeX source for reference.
+The PDF is attached. {reference_note}
 
-PAPER (LaTeX source for reference):
-```latex
-{paper_tex[:5000]}... [truncated for brevity]
-```
+{latex_reference}
 
 Provide a structured evaluation in JSON format with the following fields:
 
@@ -149,6 +207,8 @@ Output ONLY the JSON, no other text."""
             
             evaluation = json.loads(response_clean.strip())
         except json.JSONDecodeError as e:
+            # Don't replay an unusable response on the next run
+            self.llm.invalidate(messages, temperature=0.2, max_tokens=4000)
             print(f"Warning: Failed to parse JSON response: {e}", file=sys.stderr)
             print(f"Raw response: {response}", file=sys.stderr)
             # Return minimal structure
@@ -165,6 +225,35 @@ Output ONLY the JSON, no other text."""
         evaluation["model"] = self.model
         
         return evaluation
+    
+    def _part_summaries(self, paper_tex: str, budget: int) -> str:
+        """
+        Stand-in for a LaTeX source over the budget: reviewer-oriented
+        summaries of each section-aligned part, written in parallel.
+        """
+        chunks = budget_chunks(paper_tex, budget)
+        system_prompt = "You are a meticulous reviewer for NeurIPS/ICML taking notes on part of a long paper."
+        task = """Summarize the paper part above for the area chair who will score the whole paper:
+- Claims made and how strongly they are supported
+- Experiments: datasets, baselines, ablations, statistical significance
+- Missing evidence, weaknesses and overclaims
+- Notable strengths
+
+Be concise and specific. Output markdown only."""
+        
+        def summarize(index: int) -> str:
+            messages = [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": f"{part_block(chunks, index)}\n\n{task}"}
+            ]
+            return self.llm.chat(messages, temperature=0.2, max_tokens=1500)
+        
+        with ThreadPoolExecutor(max_workers=min(MAP_WORKERS, len(chunks))) as pool:
+            parts = list(pool.map(summarize, range(len(chunks))))
+        return (f"PAPER NOTES (the LaTeX source is too long to include, so it was read in {len(chunks)} "
+                "section-aligned parts; reviewer notes on each, in order):\n\n"
+                + "\n\n".join(f"### Part {i + 1} ({', '.join(chunks[i]['titles'])})\n{part.strip()}"
+                                for i, part in enumerate(parts)))
 
 
 def main():
@@ -176,6 +265,10 @@ def main():
     parser.add_argument("--run-id", required=True, help="Unique run identifier")
     parser.add_argument("--output", "-o", required=True, help="Output JSON file")
     parser.add_argument("--model", default="vertex_ai/gemini-2.5-pro", help="Model to use")
+    parser.add_argument("--token-budget", type=int, default=DEFAULT_TOKEN_BUDGET,
+                        help="Max estimated prompt tokens before summarizing the LaTeX in parts (env LLM_TOKEN_BUDGET)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Ignore cached LLM responses (set LLM_CACHE=off to disable caching)")
     
     args = parser.parse_args()
     
@@ -196,8 +289,9 @@ def main():
     print(f"🔍 Evaluating paper (version {args.version}) with PDF attachment...", file=sys.stderr)
     
     # Evaluate
-    evaluator = PaperEvaluator(model=args.model)
+    evaluator = PaperEvaluator(model=args.model, no_cache=args.no_cache, token_budget=args.token_budget)
     evaluation = evaluator.evaluate(paper_tex, pdf_path, args.version, args.run_id)
+    print(evaluator.llm.summary(), file=sys.stderr)
     
     # Write output
     output_path = Path(args.output)
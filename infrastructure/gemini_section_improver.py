@@ -2,25 +2,54 @@
 """
 Gemini-based section improver for research papers.
 Uses Vertex AI Gemini API via LiteLLM for high-quality rewriting.
+
+With `--paper`, the input is a whole paper: its sections are improved
+concurrently (with retries) and reassembled in order, leaving the preamble,
+front matter and bibliography untouched.
 """
 
 import sys
 import os
+import re
+import time
 import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Dict, List, Tuple, Callable
 
 # Add ncl_agents to path
 sys.path.insert(0, '/Users/cstein/code/ncl_agents/src')
 
 from llm_lib.llm.manager import LLM
+from llm_cache import CachedLLM
+from latex_sections import parse_sections, normalize_text, plain_title, estimate_tokens, HEADING_RE
+
+
+MIN_OUTPUT_TOKENS = 4000
+MAX_OUTPUT_TOKENS = 65536
+OUTPUT_HEADROOM = 1.5  # output budget relative to the section's estimated tokens
+MIN_LENGTH_RATIO = 0.5  # shorter responses are treated as truncated
+ENVIRONMENT_RE = re.compile(r"\\(begin|end)\{([^}]*)\}")
+
+
+def environment_balance(text: str) -> Dict[str, int]:
+    """\\begin minus \\end count per environment (nonzero entries only)."""
+    balance: Dict[str, int] = {}
+    for kind, name in ENVIRONMENT_RE.findall(text):
+        balance[name] = balance.get(name, 0) + (1 if kind == "begin" else -1)
+    return {name: count for name, count in balance.items() if count}
 
 
 class GeminiSectionImprover:
     """Improve research paper sections using Gemini API."""
     
-    def __init__(self, model: str = "vertex_ai/gemini-2.5-pro"):
-        self.llm = LLM(model=model)
+    def __init__(self, model: str = "vertex_ai/gemini-2.5-pro", no_cache: bool = False):
+        """
+        Args:
+            model: Model to use
+            no_cache: Ignore cached responses (fresh ones are still cached)
+        """
+        self.llm = CachedLLM(LLM(model=model), model, bypass=no_cache)
         self.model = model
     
     def improve_section(
@@ -41,19 +70,149 @@ class GeminiSectionImprover:
         Returns:
             Improved section text
         """
-        system_prompt = self._get_system_prompt(improvement_type)
-        user_prompt = self._get_user_prompt(section_text, improvement_type, context)
+        messages = self._get_messages(section_text, improvement_type, context)
+        response = self.llm.chat(messages, temperature=self._get_temperature(improvement_type),
+                                 max_tokens=self._max_tokens(section_text))
+        return response
+    
+    @staticmethod
+    def _max_tokens(section_text: str) -> int:
+        """Output budget large enough for a rewrite of the whole section."""
+        needed = int(estimate_tokens(section_text) * OUTPUT_HEADROOM)
+        return min(max(needed, MIN_OUTPUT_TOKENS), MAX_OUTPUT_TOKENS)
+    
+    def improve_paper(
+        self,
+        paper_tex: str,
+        improvement_type: str,
+        context: Optional[dict] = None,
+        max_workers: int = 5,
+        retries: int = 2,
+        on_complete: Optional[Callable[[str, Optional[str]], None]] = None
+    ) -> Tuple[str, Dict[str, str]]:
+        """
+        Improve every section of a paper concurrently and reassemble it.
+        
+        The abstract and each section/subsection are improved separately;
+        everything else (preamble, \\begin{document}, title block,
+        bibliography, \\end{document}) is kept verbatim, and the parts are
+        joined in their original order. A section whose improvement still
+        fails after its retries (including responses that look truncated:
+        unbalanced environments or much shorter than the original) keeps its
+        original text.
+        
+        Args:
+            paper_tex: Full LaTeX paper (\\input files are left as they are)
+            improvement_type: As for improve_section()
+            context: As for improve_section()
+            max_workers: Max LLM calls in flight
+            retries: Extra attempts per section after a failed or unusable response
+            on_complete: Called with (section key, error or None) as each finishes
         
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
+        Returns:
+            (improved paper, {section key: error} for sections left unchanged)
+        """
+        chunks = parse_sections(paper_tex)
+        # Headings directly followed by a subsection have nothing to improve
+        targets = [
+            i for i, chunk in enumerate(chunks)
+            if chunk["kind"] in ("abstract", "section")
+            and normalize_text(paper_tex[chunk["body_start"]:chunk["end"]])
         ]
         
-        # Lower temperature for more focused improvements
-        temperature = 0.3 if improvement_type in ["align_sources", "check_consistency"] else 0.5
+        texts = [chunk["text"] for chunk in chunks]
+        failed: Dict[str, str] = {}
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(targets) or 1))) as pool:
+            futures = {
+                pool.submit(self._improve_chunk, chunks[i], improvement_type, context, retries): i
+                for i in targets
+            }
+            for future in as_completed(futures):
+                i = futures[future]
+                key = chunks[i]["key"]
+                try:
+                    texts[i] = future.result()
+                except Exception as e:
+                    failed[key] = str(e)
+                if on_complete:
+                    on_complete(key, failed.get(key))
         
-        response = self.llm.chat(messages, temperature=temperature, max_tokens=4000)
-        return response
+        return "".join(texts), failed
+    
+    def _improve_chunk(
+        self,
+        chunk: Dict,
+        improvement_type: str,
+        context: Optional[dict],
+        retries: int
+    ) -> str:
+        """Improved text for one parsed chunk, keeping its surrounding whitespace."""
+        text = chunk["text"]
+        body = text.strip()
+        leading = text[:len(text) - len(text.lstrip())]
+        trailing = text[len(text.rstrip()):]
+        
+        for attempt in range(retries + 1):
+            try:
+                improved = self._strip_fences(self.improve_section(body, improvement_type, context))
+                self._check_structure(chunk, improved)
+                return leading + improved + trailing
+            except Exception as e:
+                if isinstance(e, ValueError):
+                    # Don't replay an unusable response on the retry
+                    self.llm.invalidate(
+                        self._get_messages(body, improvement_type, context),
+                        temperature=self._get_temperature(improvement_type), max_tokens=self._max_tokens(body)
+                    )
+                if attempt == retries:
+                    raise
+                print(f"Warning: {chunk['key']} attempt {attempt + 1} failed ({e}), retrying", file=sys.stderr)
+                time.sleep(2 ** attempt)
+    
+    @staticmethod
+    def _strip_fences(response: str) -> str:
+        """Response without a surrounding ```latex code block."""
+        response = (response or "").strip()
+        match = re.fullmatch(r"```[a-zA-Z]*\n(.*?)\n?```", response, flags=re.DOTALL)
+        return match.group(1).strip() if match else response
+    
+    @staticmethod
+    def _check_structure(chunk: Dict, improved: str) -> None:
+        """Raise ValueError if the response would break the document's structure."""
+        if not improved:
+            raise ValueError("empty response")
+        if chunk["kind"] == "abstract":
+            if "\\begin{abstract}" not in improved or "\\end{abstract}" not in improved:
+                raise ValueError("response dropped the abstract environment")
+        elif len(HEADING_RE.findall(improved)) != 1:
+            raise ValueError(f"response does not keep exactly one heading for '{plain_title(chunk['title'])}'")
+        if "\\end{document}" in improved or "\\begin{document}" in improved:
+            raise ValueError("response contains document delimiters")
+        
+        # A response cut off by the output limit still has its heading
+        original = normalize_text(chunk["text"])
+        rewritten = normalize_text(improved)
+        if environment_balance(rewritten) != environment_balance(original):
+            raise ValueError("response leaves \\begin/\\end environments unbalanced (truncated?)")
+        if len(rewritten) < MIN_LENGTH_RATIO * len(original):
+            raise ValueError(f"response is {len(rewritten)} characters for a {len(original)}-character section "
+                             f"(truncated?)")
+    
+    def _get_messages(
+        self,
+        section_text: str,
+        improvement_type: str,
+        context: Optional[dict]
+    ) -> List[dict]:
+        return [
+            {"role": "system", "content": self._get_system_prompt(improvement_type)},
+            {"role": "user", "content": self._get_user_prompt(section_text, improvement_type, context)}
+        ]
+    
+    @staticmethod
+    def _get_temperature(improvement_type: str) -> float:
+        # Lower temperature for more focused improvements
+        return 0.3 if improvement_type in ["align_sources", "check_consistency"] else 0.5
     
     def _get_system_prompt(self, improvement_type: str) -> str:
         """Get system prompt for specific improvement type."""
@@ -152,7 +311,11 @@ Improved Section:"""
 def main():
     """CLI for testing section improvement."""
     parser = argparse.ArgumentParser(description="Improve paper sections with Gemini API")
-    parser.add_argument("section_file", help="File containing section text")
+    parser.add_argument("section_file", help="File containing section text (or a whole paper with --paper)")
+    parser.add_argument("--paper", action="store_true",
+                        help="Input is a whole paper: improve all sections concurrently and reassemble it")
+    parser.add_argument("--jobs", "-j", type=int, default=5, help="Concurrent sections (--paper)")
+    parser.add_argument("--retries", type=int, default=2, help="Retries per section (--paper)")
     parser.add_argument(
         "--type",
         choices=["align_sources", "sharpen_arguments", "improve_style", "restructure", "check_consistency"],
@@ -161,17 +324,34 @@ def main():
     )
     parser.add_argument("--output", "-o", help="Output file (default: stdout)")
     parser.add_argument("--model", default="vertex_ai/gemini-2.5-pro", help="Model to use")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Ignore cached LLM responses (set LLM_CACHE=off to disable caching)")
     
     args = parser.parse_args()
     
     # Read section text
     section_text = Path(args.section_file).read_text()
     
-    print(f"🔄 Improving section with Gemini ({args.type})...", file=sys.stderr)
-    
-    # Improve section
-    improver = GeminiSectionImprover(model=args.model)
-    improved = improver.improve_section(section_text, args.type)
+    improver = GeminiSectionImprover(model=args.model, no_cache=args.no_cache)
+    failed = {}
+    if args.paper:
+        print(f"🔄 Improving all sections with Gemini ({args.type}, {args.jobs} at a time)...", file=sys.stderr)
+        
+        def report(key: str, error: Optional[str]) -> None:
+            if error:
+                print(f"❌ {key}: {error} (kept original)", file=sys.stderr)
+            else:
+                print(f"✅ {key}", file=sys.stderr)
+        
+        improved, failed = improver.improve_paper(
+            section_text, args.type, max_workers=args.jobs, retries=args.retries, on_complete=report
+        )
+    else:
+        print(f"🔄 Improving section with Gemini ({args.type})...", file=sys.stderr)
+        
+        # Improve section
+        improved = improver.improve_section(section_text, args.type)
+    print(improver.llm.summary(), file=sys.stderr)
     
     # Output
     if args.output:
@@ -182,6 +362,10 @@ def main():
         print("IMPROVED SECTION:", file=sys.stderr)
         print("=" * 80, file=sys.stderr)
         print(improved)
+    
+    if failed:
+        print(f"⚠️  {len(failed)} sections could not be improved: {', '.join(failed)}", file=sys.stderr)
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -2,24 +2,55 @@
 """
 Strategic assessment of paper quality and improvement goals.
 High-level analysis focused on NeurIPS acceptance and impact.
+
+The paper is sent as the same cacheable prefix the analyzer uses (see
+context_cache.py), so the analyses that follow reuse it. Papers over the
+token budget are read in section-aligned parts in parallel, and the
+assessment is written from the notes on each part.
+
+With `--state FILE`, a paper whose sections are unchanged since the run
+recorded in FILE reuses that assessment, and an edited one is assessed by
+updating it from the changed sections only (see latex_sections.py).
 """
 
 import sys
 import os
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Dict, Any
 
 # Add ncl_agents to path
 sys.path.insert(0, '/Users/cstein/code/ncl_agents/src')
 
 from llm_lib.llm.manager import LLM
+from llm_cache import CachedLLM
+from context_cache import ContextCache, paper_block, sections_block, part_block, paper_budget, MAP_WORKERS
+from latex_sections import (
+    read_paper, parse_sections, analysis_units, changed_units, load_state, save_state,
+    estimate_tokens, budget_chunks, DEFAULT_TOKEN_BUDGET
+)
 
 
 class StrategicAssessor:
     """Provide strategic assessment of paper quality and goals."""
     
-    def __init__(self, model: str = "vertex_ai/gemini-2.5-pro"):
-        self.llm = LLM(model=model)
+    def __init__(
+        self,
+        model: str = "vertex_ai/gemini-2.5-pro",
+        no_cache: bool = False,
+        token_budget: int = DEFAULT_TOKEN_BUDGET
+    ):
+        """
+        Args:
+            model: Model to use
+            no_cache: Ignore cached responses (fresh ones are still cached)
+            token_budget: Max estimated prompt tokens; longer papers are read
+                in section-aligned parts (map-reduce)
+        """
+        self.llm = CachedLLM(LLM(model=model), model, bypass=no_cache)
+        self.context_cache = ContextCache(model)
+        self.token_budget = token_budget
         self.model = model
     
     def assess(self, paper_tex: str) -> str:
@@ -32,21 +63,17 @@ class StrategicAssessor:
         Returns:
             Strategic assessment as markdown
         """
-        system_prompt = """You are a NeurIPS area chair with deep expertise in machine learning.
+        # The area-chair role lives in the task so the paper prefix stays shared
+        task = """TASK: Assess the paper above strategically for NeurIPS submission.
+
+Act as a NeurIPS area chair with deep expertise in machine learning.
 Your goal: Identify what would make this paper a spotlight or oral presentation.
 
 Think about:
 - What makes papers memorable at NeurIPS?
 - What gets people excited in talks?
 - What drives high citation counts?
-- What makes reviewers advocate for acceptance?"""
-
-        user_prompt = f"""Assess this paper strategically for NeurIPS submission.
-
-PAPER:
-```latex
-{paper_tex}
-```
+- What makes reviewers advocate for acceptance?
 
 Provide a strategic assessment covering:
 
@@ -77,13 +104,88 @@ Provide a strategic assessment covering:
 
 Be honest and strategic. Think like an area chair deciding between 100 papers."""
 
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ]
+        budget = paper_budget(self.token_budget)
+        if estimate_tokens(paper_tex) > budget:
+            paper = self._part_notes(paper_tex, budget)
+        else:
+            paper = paper_block(paper_tex)
+        messages = self.context_cache.build([paper], task)
         
         response = self.llm.chat(messages, temperature=0.4, max_tokens=2000)
         return response
+    
+    def _part_notes(self, paper_tex: str, budget: int) -> str:
+        """
+        Stand-in for the paper when it exceeds the budget: notes on each
+        section-aligned part, written in parallel (the map step).
+        """
+        chunks = budget_chunks(paper_tex, budget)
+        task = """TASK: The paper is too long for one prompt, so it is read in parts; the part above is one of them.
+Write concise notes on this part for a strategic NeurIPS assessment of the whole paper:
+- Main claims and contributions it makes
+- Strengths (novelty, rigor, clarity, results)
+- Weaknesses, gaps and missing evidence
+- Anything that raises or lowers the paper's chances of a spotlight/oral
+
+Output markdown notes only."""
+        
+        def notes(index: int) -> str:
+            messages = self.context_cache.build([part_block(chunks, index)], task)
+            return self.llm.chat(messages, temperature=0.3, max_tokens=1500)
+        
+        with ThreadPoolExecutor(max_workers=min(MAP_WORKERS, len(chunks))) as pool:
+            parts = list(pool.map(notes, range(len(chunks))))
+        return (f"PAPER NOTES (the paper was read in {len(chunks)} section-aligned parts; notes on each, in order):\n\n"
+                + "\n\n".join(f"### Part {i + 1} ({', '.join(chunks[i]['titles'])})\n{part.strip()}"
+                                for i, part in enumerate(parts)))
+    
+    def assess_incremental(self, paper_tex: str, state: Dict[str, Any]) -> str:
+        """
+        Update the assessment recorded in state from the changed sections only.
+        
+        The paper is assessed afresh with assess() (which reads papers over
+        the token budget in parts) when there is no usable previous
+        assessment or the changed sections don't fit the budget.
+        
+        Args:
+            paper_tex: Full LaTeX paper content
+            state: Section fingerprints and assessment from the previous run
+                (latex_sections.load_state); updated in place
+        
+        Returns:
+            Strategic assessment as markdown
+        """
+        units = analysis_units(parse_sections(paper_tex))
+        previous = state.get("assessment")
+        block = None
+        if units and previous and state.get("model") == self.model:
+            changed = changed_units(units, state.get("sections", {}))
+            if not changed:
+                return previous
+            block = sections_block(units, changed)
+        
+        if block is None or estimate_tokens(block) > paper_budget(self.token_budget, previous):
+            assessment = self.assess(paper_tex)
+        else:
+            task = f"""TASK: Update the strategic assessment below for the revised paper.
+
+Only the sections marked changed in the outline above were revised since this
+assessment was written; their new text is given above. Act as a NeurIPS area
+chair: revise every part of the assessment the changes affect (positioning,
+path to spotlight/oral, leverage points, strategy) and keep the rest.
+
+PREVIOUS ASSESSMENT:
+{previous}
+
+Output the complete updated assessment in the same format and headings."""
+
+            messages = self.context_cache.build([block], task)
+            assessment = self.llm.chat(messages, temperature=0.4, max_tokens=2000)
+        
+        state["model"] = self.model
+        state["assessment"] = assessment
+        state["sections"] = {unit["key"]: unit["fingerprint"] for unit in units}
+        return assessment
 
 
 def main():
@@ -92,17 +194,30 @@ def main():
     parser.add_argument("paper_file", help="LaTeX paper file")
     parser.add_argument("--output", "-o", required=True, help="Output markdown file")
     parser.add_argument("--model", default="vertex_ai/gemini-2.5-pro", help="Model to use")
+    parser.add_argument("--token-budget", type=int, default=DEFAULT_TOKEN_BUDGET,
+                        help="Max estimated prompt tokens before splitting the paper (env LLM_TOKEN_BUDGET)")
+    parser.add_argument("--state", help="Incremental: update the assessment recorded in this JSON "
+                                        "file from the changed sections only")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Ignore cached LLM responses (set LLM_CACHE=off to disable caching)")
     
     args = parser.parse_args()
     
     # Read paper
-    paper_tex = Path(args.paper_file).read_text()
+    paper_tex = read_paper(args.paper_file)
     
     print(f"🎯 Performing strategic assessment...", file=sys.stderr)
     
     # Assess
-    assessor = StrategicAssessor(model=args.model)
-    assessment = assessor.assess(paper_tex)
+    assessor = StrategicAssessor(model=args.model, no_cache=args.no_cache, token_budget=args.token_budget)
+    if args.state:
+        state = load_state(args.state)
+        assessment = assessor.assess_incremental(paper_tex, state)
+        save_state(args.state, state)
+    else:
+        assessment = assessor.assess(paper_tex)
+    print(assessor.llm.summary(), file=sys.stderr)
+    print(assessor.context_cache.summary(), file=sys.stderr)
     
     # Write output
     output_path = Path(args.output)
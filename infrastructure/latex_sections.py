@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Section-aware view of a LaTeX paper.
+
+parse_sections() splits a paper into consecutive chunks (preamble, front
+matter, abstract, each \\section/\\subsection/\\subsubsection, bibliography,
+end) whose texts concatenate back to the input exactly. Every chunk gets a
+stable key (from its heading path, e.g. "method/training-setup") and a
+fingerprint of its normalized text, so comment- or whitespace-only edits do
+not count as changes.
+
+Tools use this to work incrementally: analysis_units() groups the chunks
+into the sections worth analyzing, changed_units() compares them with the
+fingerprints recorded in a JSON state file (load_state/save_state) from the
+previous version, and only the changed ones are sent to the model.
+
+budget_chunks() packs the body into section-aligned chunks under a token
+budget (estimate_tokens) for map-reduce over papers too long for one prompt.
+
+read_paper() inlines \\input/\\include files so tools see the whole paper.
+
+CLI:
+    latex_sections.py paper.tex               # outline with fingerprints
+    latex_sections.py paper.tex --diff old.tex
+"""
+
+import sys
+import os
+import re
+import json
+import hashlib
+import argparse
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+
+
+STATE_VERSION = 1
+
+# Max estimated prompt tokens per call; Gemini 2.5 Pro bills prompts above 200K at a higher rate
+DEFAULT_TOKEN_BUDGET = int(os.environ.get("LLM_TOKEN_BUDGET", "150000"))
+
+SECTION_LEVELS = {"section": 1, "subsection": 2, "subsubsection": 3}
+
+HEADING_RE = re.compile(r"\\(section|subsection|subsubsection)\*?\s*(?:\[[^\]]*\])?\s*\{")
+INPUT_RE = re.compile(r"\\(?:input|include)\s*\{([^}]+)\}")
+BIBLIOGRAPHY_RE = re.compile(r"\\bibliography\s*\{|\\begin\{thebibliography\}|\\printbibliography")
+COMMENT_RE = re.compile(r"(?<!\\)%.*")
+TOKEN_RE = re.compile(r"[A-Za-z]{1,6}|\d{1,3}|[^\sA-Za-z\d]")
+
+
+def _is_commented(tex: str, pos: int) -> bool:
+    """Whether pos lies after an unescaped % on its line."""
+    line_start = tex.rfind("\n", 0, pos) + 1
+    return COMMENT_RE.search(tex[line_start:pos]) is not None
+
+
+def _braced(tex: str, open_pos: int) -> int:
+    """Index just past the brace group opening at open_pos."""
+    depth = 0
+    for i in range(open_pos, len(tex)):
+        char = tex[i]
+        if char == "{" and tex[i - 1] != "\\":
+            depth += 1
+        elif char == "}" and tex[i - 1] != "\\":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    return len(tex)
+
+
+def normalize_text(text: str) -> str:
+    """Text without comments and with whitespace collapsed."""
+    return " ".join(COMMENT_RE.sub("", text).split())
+
+
+def fingerprint(text: str) -> str:
+    """Stable hash of a chunk's normalized text."""
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()[:16]
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Token count estimate without a tokenizer, on the high side for LaTeX.
+    
+    Counts letter runs (up to 6 letters), digit groups and each symbol as
+    one token; plain len/4 badly underestimates symbol-heavy LaTeX.
+    """
+    return len(TOKEN_RE.findall(text))
+
+
+def plain_title(title: str) -> str:
+    """Heading text without LaTeX markup (e.g. "\\emph{Fast} Training" -> "Fast Training")."""
+    title = re.sub(r"\\[a-zA-Z]+\*?", " ", title)
+    return " ".join(re.sub(r"[{}$~]", " ", title).split())
+
+
+def slugify(title: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", plain_title(title).lower()).strip("-") or "untitled"
+
+
+def resolve_inputs(tex: str, base_dir: Path, _depth: int = 0) -> str:
+    """
+    Inline \\input{...} and \\include{...} files (relative to the main file's directory).
+
+    Missing files and commented-out commands are left as they are.
+    """
+    if _depth > 20:
+        return tex
+    
+    def inline(match: re.Match) -> str:
+        if _is_commented(tex, match.start()):
+            return match.group(0)
+        path = base_dir / match.group(1).strip()
+        if not path.suffix:
+            path = path.with_suffix(".tex")
+        if not path.is_file():
+            print(f"Warning: {match.group(0)} not found at {path}", file=sys.stderr)
+            return match.group(0)
+        return resolve_inputs(path.read_text(), base_dir, _depth + 1)
+    
+    return INPUT_RE.sub(inline, tex)
+
+
+def read_paper(path: str) -> str:
+    """Paper source with \\input/\\include files inlined."""
+    path = Path(path)
+    return resolve_inputs(path.read_text(), path.parent)
+
+
+def parse_sections(tex: str) -> List[Dict[str, Any]]:
+    """
+    Split a paper into consecutive chunks.
+
+    Args:
+        tex: LaTeX source (with or without \\input files inlined)
+
+    Returns:
+        Chunks in document order, each a dict with key, kind (preamble,
+        front, abstract, section, bibliography, end), level (1-3 for
+        sections, else 0), title, start, end, body_start (end of the
+        heading; start for other kinds), text and fingerprint.
+        "".join(chunk["text"] for chunk in chunks) == tex.
+    """
+    doc = re.search(r"\\begin\{document\}", tex)
+    body_start = doc.end() if doc else 0
+    
+    # (position, kind, level, title, heading end) for every place a new chunk starts
+    boundaries = [(body_start, "front", 0, "", body_start)]
+    for match in HEADING_RE.finditer(tex, body_start):
+        if _is_commented(tex, match.start()):
+            continue
+        title_end = _braced(tex, match.end() - 1)
+        level = SECTION_LEVELS[match.group(1)]
+        boundaries.append((match.start(), "section", level, tex[match.end():title_end - 1].strip(), title_end))
+    for pattern, kind in ((r"\\begin\{abstract\}", "abstract"), (r"\\end\{abstract\}", "front"),
+                          (BIBLIOGRAPHY_RE.pattern, "bibliography"), (r"\\end\{document\}", "end")):
+        for match in re.finditer(pattern, tex[body_start:]):
+            position = body_start + match.start()
+            if _is_commented(tex, position):
+                continue
+            if kind == "front":
+                # The abstract chunk includes its \end{abstract}
+                position = body_start + match.end()
+            boundaries.append((position, kind, 0, "", position))
+    # A "front" boundary at the same position as a heading yields an empty chunk
+    boundaries.sort(key=lambda b: (b[0], b[1] != "front"))
+    
+    chunks = []
+    if body_start:
+        chunks.append({"kind": "preamble", "level": 0, "title": "", "start": 0, "end": body_start, "body_start": 0})
+    for i, (start, kind, level, title, heading_end) in enumerate(boundaries):
+        end = boundaries[i + 1][0] if i + 1 < len(boundaries) else len(tex)
+        if end > start:
+            chunks.append({
+                "kind": kind, "level": level, "title": title,
+                "start": start, "end": end, "body_start": min(heading_end, end)
+            })
+    
+    # Keys from the heading path; repeats get a numeric suffix
+    path: List[str] = []
+    seen: Dict[str, int] = {}
+    for chunk in chunks:
+        chunk["text"] = tex[chunk["start"]:chunk["end"]]
+        chunk["fingerprint"] = fingerprint(chunk["text"])
+        if chunk["kind"] == "section":
+            path = path[:chunk["level"] - 1] + [slugify(chunk["title"])]
+            key = "/".join(path)
+        else:
+            key = chunk["kind"]
+        seen[key] = seen.get(key, 0) + 1
+        chunk["key"] = key if seen[key] == 1 else f"{key}-{seen[key]}"
+    return chunks
+
+
+def analysis_units(chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    The parts of a paper worth analyzing: the abstract and each top-level
+    section together with its subsections.
+
+    Returns:
+        Units in document order with key, title, text and fingerprint
+    """
+    units: List[Dict[str, Any]] = []
+    for chunk in chunks:
+        if chunk["kind"] == "abstract":
+            units.append({"key": chunk["key"], "title": "Abstract", "parts": [chunk]})
+        elif chunk["kind"] == "section":
+            if chunk["level"] > 1 and units and units[-1]["key"] != "abstract":
+                units[-1]["parts"].append(chunk)
+            else:
+                units.append({"key": chunk["key"], "title": plain_title(chunk["title"]), "parts": [chunk]})
+    for unit in units:
+        parts = unit.pop("parts")
+        unit["text"] = "".join(part["text"] for part in parts)
+        unit["fingerprint"] = fingerprint(unit["text"])
+    return units
+
+
+def changed_units(units: List[Dict[str, Any]], previous: Dict[str, str]) -> List[Dict[str, Any]]:
+    """Units that are new or whose fingerprint differs from previous[key]."""
+    return [unit for unit in units if previous.get(unit["key"]) != unit["fingerprint"]]
+
+
+def _split_to_budget(text: str, budget: int) -> List[str]:
+    """Split text at paragraph breaks (then lines) into pieces of at most ~budget tokens."""
+    pieces = [""]
+    for separator in (r"(?<=\n)(?=[ \t]*\n)", r"(?<=\n)"):
+        pieces = []
+        for part in re.split(separator, text):
+            if pieces and estimate_tokens(pieces[-1] + part) <= budget:
+                pieces[-1] += part
+            else:
+                pieces.append(part)
+        if all(estimate_tokens(piece) <= budget for piece in pieces):
+            return pieces
+    # A single line over budget: cut it by characters
+    result = []
+    for piece in pieces:
+        tokens = estimate_tokens(piece)
+        if tokens <= budget:
+            result.append(piece)
+            continue
+        step = max(1, len(piece) * budget // tokens)
+        result.extend(piece[i:i + step] for i in range(0, len(piece), step))
+    return result
+
+
+def budget_chunks(tex: str, budget: int) -> List[Dict[str, Any]]:
+    """
+    Split a paper into section-aligned chunks of at most ~budget tokens each.
+    
+    Consecutive top-level sections (with their subsections) are packed
+    together while they fit; a larger one is split at its subsections, and
+    a single oversized (sub)section at paragraph breaks. Only the preamble,
+    bibliography and \\end{document} are left out, so map-reduce over the
+    chunks covers the whole text, appendices included.
+    
+    Returns:
+        Chunks in document order, each with titles (sections it covers),
+        text and tokens
+    """
+    groups: List[List[Dict[str, Any]]] = []
+    for chunk in parse_sections(tex):
+        if chunk["kind"] in ("preamble", "bibliography", "end") or not normalize_text(chunk["text"]):
+            continue
+        if chunk["kind"] == "section" and chunk["level"] > 1 and groups and groups[-1][0]["kind"] == "section":
+            groups[-1].append(chunk)
+        else:
+            groups.append([chunk])
+    
+    def label(chunk: Dict[str, Any]) -> str:
+        return plain_title(chunk["title"]) or chunk["kind"].capitalize()
+    
+    pieces = []
+    for group in groups:
+        text = "".join(chunk["text"] for chunk in group)
+        if estimate_tokens(text) <= budget:
+            pieces.append((label(group[0]), text))
+            continue
+        for chunk in group:
+            pieces.extend((label(chunk), part) for part in _split_to_budget(chunk["text"], budget))
+    
+    chunks: List[Dict[str, Any]] = []
+    for title, text in pieces:
+        tokens = estimate_tokens(text)
+        if chunks and chunks[-1]["tokens"] + tokens <= budget:
+            chunks[-1]["text"] += text
+            chunks[-1]["tokens"] += tokens
+            if title not in chunks[-1]["titles"]:
+                chunks[-1]["titles"].append(title)
+        else:
+            chunks.append({"titles": [title], "text": text, "tokens": tokens})
+    return chunks
+
+
+def load_state(path: str) -> Dict[str, Any]:
+    """Incremental state saved by a previous run ({} if missing or unusable)."""
+    try:
+        state = json.loads(Path(path).read_text())
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(state, dict) or state.get("version") != STATE_VERSION:
+        return {}
+    return state
+
+
+def save_state(path: str, state: Dict[str, Any]) -> None:
+    """Write state atomically (a crash never leaves a half-written file)."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    state["version"] = STATE_VERSION
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(json.dumps(state, indent=2))
+    os.replace(tmp_path, path)
+
+
+def main():
+    """CLI for inspecting a paper's sections."""
+    parser = argparse.ArgumentParser(description="Show a LaTeX paper's sections and fingerprints")
+    parser.add_argument("paper_file", help="LaTeX paper file")
+    parser.add_argument("--diff", metavar="OLD_FILE", help="Mark sections changed since this version")
+    parser.add_argument("--budget", type=int, help="Show the section-aligned chunks for this token budget")
+    
+    args = parser.parse_args()
+    
+    paper_tex = read_paper(args.paper_file)
+    if args.budget:
+        for i, chunk in enumerate(budget_chunks(paper_tex, args.budget)):
+            print(f"{i + 1:>3}  {chunk['tokens']:>7}  {', '.join(chunk['titles'])}")
+        print(f"📏 ~{estimate_tokens(paper_tex):,} tokens in total", file=sys.stderr)
+        return
+    
+    chunks = parse_sections(paper_tex)
+    previous = {}
+    if args.diff:
+        previous = {c["key"]: c["fingerprint"] for c in parse_sections(read_paper(args.diff))}
+    
+    for chunk in chunks:
+        mark = ""
+        if args.diff:
+            mark = " " if previous.get(chunk["key"]) == chunk["fingerprint"] else "*"
+        indent = "  " * max(chunk["level"] - 1, 0)
+        label = plain_title(chunk["title"]) or chunk["kind"]
+        print(f"{mark}{chunk['fingerprint']}  {len(chunk['text']):>7}  {indent}{label}  [{chunk['key']}]")
+    if args.diff:
+        changed = sum(1 for c in chunks if previous.get(c["key"]) != c["fingerprint"])
+        print(f"📝 {changed} of {len(chunks)} chunks changed", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
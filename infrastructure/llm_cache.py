@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Disk-backed cache of LLM responses, shared by the Gemini tools.
+
+Responses are stored in SQLite keyed by a SHA-256 of model + messages +
+sampling params, so rerunning a pipeline step with identical inputs (e.g.
+gemini_improve_orchestrator.sh after a compile failure) returns the earlier
+response without an API call. Entries expire after a TTL and the least
+recently used ones are evicted once the cache exceeds its size bound.
+
+Tools wrap their LLM in CachedLLM; `--no-cache` makes them ignore cached
+responses (fresh ones are still stored), LLM_CACHE=off disables the cache
+entirely. LLM_CACHE_DB, LLM_CACHE_TTL_DAYS and LLM_CACHE_MAX_MB override
+the defaults.
+
+CLI:
+    llm_cache.py stats
+    llm_cache.py prune
+    llm_cache.py clear
+"""
+
+import sys
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+import threading
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+
+
+DEFAULT_CACHE_DB = os.environ.get(
+    "LLM_CACHE_DB", os.path.expanduser("~/.cache/agent-workflows/llm_cache.db")
+)
+DEFAULT_TTL_DAYS = float(os.environ.get("LLM_CACHE_TTL_DAYS", "30"))
+DEFAULT_MAX_MB = float(os.environ.get("LLM_CACHE_MAX_MB", "500"))
+
+
+def cache_enabled() -> bool:
+    """False when LLM_CACHE is set to off/0/false/no."""
+    return os.environ.get("LLM_CACHE", "on").lower() not in ("off", "0", "false", "no")
+
+
+def cache_key(model: str, messages: List[Dict[str, Any]], **params) -> str:
+    """Stable hash of everything that determines a response."""
+    payload = json.dumps(
+        {"model": model, "messages": messages, "params": params},
+        sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """SQLite response store with TTL expiry and size-bounded LRU eviction."""
+    
+    def __init__(
+        self,
+        db_path: str = DEFAULT_CACHE_DB,
+        ttl_days: float = DEFAULT_TTL_DAYS,
+        max_mb: float = DEFAULT_MAX_MB
+    ):
+        """
+        Args:
+            db_path: SQLite file (created with its directory if missing)
+            ttl_days: Entries older than this are treated as missing
+            max_mb: Evict least recently used entries above this total size
+        """
+        self.db_path = db_path
+        self.ttl = ttl_days * 86400
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._lock = threading.Lock()
+        
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        # Several tools (and threads) may share the file
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses(last_used);
+            CREATE TABLE IF NOT EXISTS counters (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL DEFAULT 0
+            );
+        """)
+    
+    def _count(self, name: str, amount: int = 1) -> None:
+        self._conn.execute("""
+            INSERT INTO counters (name, value) VALUES (?, ?)
+            ON CONFLICT(name) DO UPDATE SET value = value + excluded.value
+        """, (name, amount))
+    
+    def get(self, key: str) -> Optional[str]:
+        """Cached response for key, or None if missing or expired."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and now - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self._count("misses")
+                return None
+            self._conn.execute(
+                "UPDATE responses SET last_used = ?, hits = hits + 1 WHERE key = ?", (now, key)
+            )
+            self._count("hits")
+            return row[0]
+    
+    def put(self, key: str, response: str, model: Optional[str] = None) -> None:
+        """Store a response, then evict LRU entries beyond the size bound."""
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("""
+                    INSERT OR REPLACE INTO responses (key, model, response, size, created_at, last_used)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, (key, model, response, size, now, now))
+                self._evict()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+    
+    def _evict(self) -> int:
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        evicted = 0
+        if total <= self.max_bytes:
+            return 0
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM responses ORDER BY last_used"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        self._count("evictions", evicted)
+        return evicted
+    
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+    
+    def prune(self) -> int:
+        """Delete expired entries; returns how many."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl,)
+            )
+            return cursor.rowcount
+    
+    def clear(self) -> int:
+        """Delete all entries and counters; returns the number of entries."""
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM responses")
+            self._conn.execute("DELETE FROM counters")
+            return cursor.rowcount
+    
+    def stats(self) -> Dict[str, Any]:
+        """Entry count, size and lifetime hit/miss/eviction totals."""
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+            counters = dict(self._conn.execute("SELECT name, value FROM counters").fetchall())
+        lookups = counters.get("hits", 0) + counters.get("misses", 0)
+        return {
+            "db_path": self.db_path,
+            "entries": entries,
+            "size_mb": round(size / 1024 / 1024, 2),
+            "max_mb": round(self.max_bytes / 1024 / 1024, 2),
+            "hits": counters.get("hits", 0),
+            "misses": counters.get("misses", 0),
+            "evictions": counters.get("evictions", 0),
+            "hit_rate": round(counters.get("hits", 0) / lookups, 3) if lookups else None
+        }
+    
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class CachedLLM:
+    """
+    Drop-in wrapper for an llm_lib LLM whose chat() goes through LLMCache.
+    
+    Only successful string responses are cached; errors propagate uncached.
+    """
+    
+    def __init__(
+        self,
+        llm,
+        model: str,
+        cache: Optional[LLMCache] = None,
+        bypass: bool = False
+    ):
+        """
+        Args:
+            llm: Object with chat(messages, temperature=..., max_tokens=...)
+            model: Model name (part of the cache key)
+            cache: Response store (default: the shared on-disk cache, unless
+                LLM_CACHE=off)
+            bypass: Ignore cached responses but still store fresh ones
+        """
+        self.llm = llm
+        self.model = model
+        if cache is None and cache_enabled():
+            cache = LLMCache()
+        self.cache = cache
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+    
+    def chat(self, messages: List[Dict[str, Any]], **params) -> str:
+        if self.cache is None:
+            return self.llm.chat(messages, **params)
+        
+        key = cache_key(self.model, messages, **params)
+        if not self.bypass:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.hits += 1
+                return cached
+        
+        self.misses += 1
+        response = self.llm.chat(messages, **params)
+        if isinstance(response, str) and response:
+            self.cache.put(key, response, model=self.model)
+        return response
+    
+    def invalidate(self, messages: List[Dict[str, Any]], **params) -> None:
+        """Drop the cached response for this call (e.g. one that failed to parse)."""
+        if self.cache is not None:
+            self.cache.delete(cache_key(self.model, messages, **params))
+    
+    def summary(self) -> str:
+        """One-line hit/miss report for CLI output."""
+        if self.cache is None:
+            return "💾 LLM cache disabled"
+        return f"💾 LLM cache: {self.hits} hits, {self.misses} misses ({self.cache.db_path})"
+
+
+def main():
+    """CLI for inspecting and maintaining the LLM cache."""
+    parser = argparse.ArgumentParser(description="Inspect or maintain the LLM response cache")
+    parser.add_argument("command", choices=["stats", "prune", "clear"],
+                        help="stats: print totals; prune: drop expired entries; clear: drop everything")
+    parser.add_argument("--db", default=DEFAULT_CACHE_DB, help="Cache database (env LLM_CACHE_DB)")
+    parser.add_argument("--ttl-days", type=float, default=DEFAULT_TTL_DAYS,
+                        help="Entry lifetime used by prune (env LLM_CACHE_TTL_DAYS)")
+    
+    args = parser.parse_args()
+    
+    cache = LLMCache(db_path=args.db, ttl_days=args.ttl_days)
+    if args.command == "stats":
+        print(json.dumps(cache.stats(), indent=2))
+    elif args.command == "prune":
+        print(f"🧹 Removed {cache.prune()} expired entries", file=sys.stderr)
+    else:
+        print(f"🗑️  Removed {cache.clear()} entries", file=sys.stderr)
+    cache.close()
+
+
+if __name__ == "__main__":
+    main()
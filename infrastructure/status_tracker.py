@@ -0,0 +1,249 @@
+"""
+Backend interface shared by the agent status trackers.
+
+StatusTracker defines the operations agent_status_server.py needs
+(register/update/heartbeat/complete, bulk writes, reaping, indexed
+listings, events, progress history, cold-tier flushing) plus the plumbing
+every backend shares: latency metrics, write listeners and the merge with
+the SQLite cold tier. Two backends implement it:
+
+- AgentStatusTracker (agent_status_server.py): Redis, shared by any number
+  of server processes
+- EmbeddedStatusTracker (embedded_status_tracker.py): in-process, optionally
+  persisted to SQLite; no external services
+
+Use agent_status_server.create_tracker(url) to pick one from a URL.
+"""
+
+import asyncio
+import functools
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List, Union, AsyncIterator, Tuple, Callable
+
+from agent_workflow_logger import AgentWorkflowLogger
+from status_metrics import MetricsRegistry
+
+
+HEARTBEAT_TTL = 300.0  # seconds without a heartbeat before an agent is lost
+EVENT_STREAM_MAXLEN = 10000  # approximate number of events kept for resume
+COMPLETED_TTL = 300.0  # seconds a finished agent's hash lives on after its flush
+PROGRESS_MAXLEN = 500  # approximate progress entries kept per agent
+PROGRESS_MAX_AGE = 24 * 3600  # seconds of progress history kept per agent
+
+
+def event_id_key(event_id: str) -> Tuple[int, int]:
+    """Sortable form of a stream id ("<ms>-<seq>")."""
+    ms, _, seq = event_id.partition("-")
+    return int(ms), int(seq or 0)
+
+
+def timestamp_score(value: Union[str, float, int]) -> float:
+    """Sorted-set score for an ISO timestamp (naive = UTC) or epoch seconds."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def timed(method):
+    """Record an async tracker method's latency in tracker_seconds{method=...}."""
+    name = method.__name__
+    
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await method(self, *args, **kwargs)
+        finally:
+            self.tracker_seconds.observe(time.perf_counter() - start, name)
+    return wrapper
+
+
+class StatusTracker(ABC):
+    """
+    Agent status backend interface.
+    
+    Subclasses implement the abstract methods (the storage); agents are
+    returned as dicts with string fields plus parsed "metadata" and "progress".
+    """
+    
+    def __init__(self, heartbeat_ttl: float = HEARTBEAT_TTL,
+                 cold_store: Optional[AgentWorkflowLogger] = None,
+                 completed_ttl: float = COMPLETED_TTL,
+                 metrics: Optional[MetricsRegistry] = None):
+        """
+        Args:
+            heartbeat_ttl: Seconds without a heartbeat before the reaper
+                marks an active agent as lost
+            cold_store: Logger whose database keeps finished agents
+                (None: finished agents are not kept once flushed)
+            completed_ttl: Seconds a finished agent is kept in the hot tier
+                after it has been flushed
+            metrics: Registry for latency metrics (a private one if None)
+        """
+        self.heartbeat_ttl = heartbeat_ttl
+        self.cold_store = cold_store
+        self.completed_ttl = completed_ttl
+        self.write_listeners: List[Callable[[], None]] = []
+        
+        self.metrics = metrics or MetricsRegistry()
+        self.tracker_seconds = self.metrics.histogram(
+            "agent_status_tracker_seconds", "Status tracker method latency", ("method",)
+        )
+    
+    def _notify_write(self) -> None:
+        """Tell listeners (e.g. read caches) that agent data changed."""
+        for listener in self.write_listeners:
+            listener()
+    
+    # Lifecycle
+    
+    @abstractmethod
+    async def connect(self) -> None:
+        ...
+    
+    @abstractmethod
+    async def disconnect(self) -> None:
+        ...
+    
+    async def ensure_indexes(self) -> int:
+        """Rebuild missing indexes; returns the number of agents indexed."""
+        return 0
+    
+    async def ensure_heartbeats(self) -> int:
+        """Track heartbeats for active agents lacking one; returns the number added."""
+        return 0
+    
+    # Writes
+    
+    @abstractmethod
+    async def register_agent(self, agent_id: str, agent_type: str,
+                             workflow: str, project: str,
+                             metadata: Optional[Dict] = None) -> None:
+        ...
+    
+    @abstractmethod
+    async def update_status(self, agent_id: str, status: str,
+                            current_task: Optional[str] = None,
+                            progress: Optional[Dict] = None) -> bool:
+        """Returns False if the agent is unknown (never registered or expired)."""
+    
+    @abstractmethod
+    async def heartbeat(self, agent_id: str) -> bool:
+        """Returns False if the agent is not active."""
+    
+    @abstractmethod
+    async def complete_agent(self, agent_id: str, status: str = "completed",
+                             result_summary: Optional[str] = None,
+                             error: Optional[str] = None) -> bool:
+        """Returns False if the agent is unknown (never registered or expired)."""
+    
+    @abstractmethod
+    async def apply_bulk(self, operations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """One {"agent_id", "op", "ok"[, "error"]} result per operation, in order."""
+    
+    @abstractmethod
+    async def reap_stale_agents(self, batch_size: int = 500) -> List[str]:
+        """Move agents with expired heartbeats to "lost"; returns their IDs."""
+    
+    @abstractmethod
+    async def flush_completed(self, batch_size: int = 500) -> int:
+        """Move one batch of finished agents to the cold store; returns the batch size."""
+    
+    # Reads
+    
+    @abstractmethod
+    async def get_agent_status(self, agent_id: str) -> Optional[Dict]:
+        ...
+    
+    @abstractmethod
+    async def get_agents(self, agent_ids: List[str]) -> List[Dict]:
+        ...
+    
+    @abstractmethod
+    async def get_active_agents(self) -> List[Dict]:
+        ...
+    
+    @abstractmethod
+    async def get_all_agents(self, limit: int = 100,
+                             before: Optional[Union[str, float]] = None,
+                             after: Optional[Union[str, float]] = None,
+                             workflow: Optional[str] = None,
+                             project: Optional[str] = None,
+                             status: Optional[str] = None) -> List[Dict]:
+        """Agents from both tiers, newest first (see AgentStatusTracker)."""
+    
+    @abstractmethod
+    async def get_progress_history(self, agent_id: str, limit: int = 100) -> List[Dict[str, Any]]:
+        ...
+    
+    @abstractmethod
+    async def get_events_since(self, last_event_id: str, count: int = 1000) -> List[Dict[str, Any]]:
+        ...
+    
+    @abstractmethod
+    def subscribe_events(self) -> AsyncIterator[Dict[str, Any]]:
+        ...
+    
+    # Stats
+    
+    @abstractmethod
+    async def get_storage_stats(self) -> Dict[str, Any]:
+        ...
+    
+    async def get_pool_stats(self) -> Dict[str, int]:
+        """Connection pool usage (empty for backends without one)."""
+        return {}
+    
+    @abstractmethod
+    async def get_status_counts(self) -> Dict[str, Dict[str, int]]:
+        ...
+    
+    @abstractmethod
+    async def get_reaper_stats(self) -> Dict[str, Any]:
+        ...
+    
+    # Cold tier
+    
+    def _save_cold(self, agents: List[Dict]) -> None:
+        """Write agents to the cold store and make sure they are committed."""
+        if not agents:
+            return
+        self.cold_store.save_agent_statuses(
+            agents, [timestamp_score(agent["started_at"]) for agent in agents]
+        )
+        self.cold_store.flush()
+    
+    async def _merge_cold(self, agents: List[Dict], limit: int,
+                          before: Optional[Union[str, float]] = None,
+                          after: Optional[Union[str, float]] = None,
+                          workflow: Optional[str] = None,
+                          project: Optional[str] = None,
+                          status: Optional[str] = None) -> List[Dict]:
+        """Merge a page of hot agents with the same page from the cold store."""
+        if self.cold_store is None:
+            return agents
+        
+        cold = await asyncio.to_thread(
+            self.cold_store.get_agent_statuses,
+            limit=limit,
+            before=timestamp_score(before) if before is not None else None,
+            after=timestamp_score(after) if after is not None else None,
+            workflow=workflow,
+            project=project,
+            status=status
+        )
+        # An agent can briefly be in both tiers while it is being flushed
+        merged = {agent["agent_id"]: (timestamp_score(agent["started_at"]), agent) for agent in agents}
+        for score, agent in cold:
+            merged.setdefault(agent["agent_id"], (score, agent))
+        ordered = sorted(merged.values(), key=lambda entry: entry[0], reverse=True)
+        return [agent for _, agent in ordered[:limit]]